@@ -0,0 +1,195 @@
+"""
+Пропускная способность и пиковая память каждой стадии обработки на синтетических данных (gen_ejudge_dump.py):
+* read_runs - разбор dump runs в RunStore (Data.get_data)
+* fiter_data - группы по логинам и подсчет OK посылок (Data.encode_groups, Data.fiter_runs)
+* totals - студенты в группах и реальные имена задач (Data.count_totals_by_runs, Data.get_counted_probs)
+* read_standings - разбор standings (Data.get_data(..., statement_table=True))
+* parse_statement_table - подсчет по standings (Data.parse_statement_table)
+* progress_runs - count_ejudge_tasks.get_data_from_runs (чтение и подсчет построчно)
+* plot_all - все графики контеста (DataPlotter.plot_all), от количества посылок не зависит, rows/s - графиков в секунду
+
+Время меряется в одном проходе, пиковая память (tracemalloc) - во втором, чтобы tracemalloc не искажал время.
+
+python3 bench_pipeline.py --sizes 10000 100000 1000000
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import pathlib
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / 'ej_plot_contest'))
+sys.path.append(str(ROOT / 'ej_student_progress'))
+sys.path.append(str(ROOT / 'ej_common'))
+from ej_plot_contest import Data, Params
+from ej_groups import GroupResolver
+from ej_reader import open_table
+import count_ejudge_tasks
+from gen_ejudge_dump import generate
+
+STAGES = ('read_runs', 'fiter_data', 'totals', 'read_standings', 'parse_statement_table', 'progress_runs', 'plot_all')
+
+
+def new_data(cls, cfg):
+    """
+    Data (или DataPlotter) с конфигом, но без чтения файла данных: стадии подсчета запускаются по отдельности
+    """
+    data = cls.__new__(cls)
+    data.cfg = cfg
+    data.logins = None
+    data.groups = cfg.groups
+    data.resolver = GroupResolver.from_config(cfg)
+    return data
+
+
+def stage_read_runs(ctx):
+    ctx['runs'] = Data.get_data(ctx['cfg'].file_data)
+    return len(ctx['runs'])
+
+
+def stage_fiter_data(ctx):
+    data = ctx['data'] = new_data(ctx['cls'], ctx['cfg'])
+    runs = ctx['runs']
+    data.encode_groups(runs)
+    data.matrix, ctx['total'] = data.fiter_runs(runs, data.cfg.duration)
+    return len(runs)
+
+
+def stage_totals(ctx):
+    data = ctx['data']
+    data.totals = data.count_totals_by_runs(ctx['total'])
+    data.headers = data.get_counted_probs(data.data)
+    return None     # от количества посылок не зависит
+
+
+def stage_read_standings(ctx):
+    ctx['standings'] = Data.get_data(ctx['standings_file'], True, ctx['cfg'].probs)
+    return len(ctx['standings'])
+
+
+def stage_parse_statement_table(ctx):
+    with contextlib.redirect_stdout(io.StringIO()):     # parse_statement_table печатает результат
+        new_data(Data, ctx['cfg']).parse_statement_table(ctx['standings'])
+    return len(ctx['standings'])
+
+
+def stage_progress_runs(ctx):
+    with open_table(ctx['cfg'].file_data) as runs:
+        count_ejudge_tasks.get_data_from_runs('bench', runs, ctx['logins'], ctx['tasks'])
+    return ctx['size']
+
+
+def stage_plot_all(ctx):
+    ctx['data'].plot_all(show=False, jobs=1)
+    return len(ctx['data'].plot_specs())
+
+
+STAGE_FUNCTIONS = {name: globals()[f'stage_{name}'] for name in STAGES}
+
+
+def run_pipeline(ctx, stages, memory=False):
+    """
+    Запускает стадии по порядку
+    :return: {стадия: (секунды, обработано строк, пиковая память в байтах или None)}
+    """
+    results = {}
+    for name in stages:
+        if memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        rows = STAGE_FUNCTIONS[name](ctx)
+        elapsed = time.perf_counter() - start
+        peak = None
+        if memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        results[name] = (elapsed, rows, peak)
+    return results
+
+
+def bench_size(tmp, size, args):
+    """
+    Генерирует данные на size посылок и меряет все стадии
+    """
+    dump = tmp / f'dump_{size}.csv'
+    standings = tmp / f'standings_{size}.csv'
+    config = tmp / f'config_{size}.json'
+    start = time.perf_counter()
+    groups, logins, problems = generate(dump, size, args.logins, args.groups, args.problems,
+                                        standings=standings, config=config, seed=args.seed)
+    logging.info(f'{size} runs generated in {time.perf_counter() - start:.1f}s, {dump.stat().st_size >> 20} MB')
+
+    with open(config, encoding='utf8') as fh:
+        cfg_dict = json.load(fh)
+    cfg_dict['output_dir'] = str(tmp / 'res')
+
+    def context():
+        cfg = Params.from_dict(tmp, cfg_dict)
+        cls = Data
+        if not args.text_only:
+            from ej_plotter import DataPlotter
+            cls = DataPlotter
+        return {'cfg': cfg, 'cls': cls, 'size': size, 'standings_file': standings,
+                'logins': count_ejudge_tasks.LoginMatcher({'login': login} for login in logins),
+                'tasks': {f'{p}-{cfg.department}': 10 for p in problems}}
+
+    stages = [s for s in STAGES if s in args.stages and not (args.text_only and s == 'plot_all')]
+    timing = run_pipeline(context(), stages)
+    memory = run_pipeline(context(), stages, memory=True) if not args.no_memory else {}
+    return {name: {
+        'seconds': timing[name][0],
+        'rows': timing[name][1],
+        'rows_per_sec': timing[name][1] / timing[name][0] if timing[name][1] and timing[name][0] else None,
+        'peak_mb': memory[name][2] / 2**20 if name in memory else None,
+    } for name in stages}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure throughput and peak memory of every pipeline stage on synthetic ejudge dumps',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--sizes", help="numbers of runs", type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument("--logins", help="number of logins", type=int, default=300)
+    parser.add_argument("--groups", help="number of groups", type=int, default=10)
+    parser.add_argument("--problems", help="number of problems", type=int, default=8)
+    parser.add_argument("--stages", help="stages to measure", nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument("--text_only", help="skip plot_all (no matplotlib)", default=False, action="store_true")
+    parser.add_argument("--no_memory", help="do not measure peak memory (one pass instead of two)",
+                        default=False, action="store_true")
+    parser.add_argument("--json", help="also save results into json file", default=None)
+    parser.add_argument("--seed", help="random seed of generated data", type=int, default=1)
+    args = parser.parse_args()
+
+    # предупреждения о каждой посылке (невидимые пользователи, дорешивание) не печатаем
+    logging.basicConfig(level=logging.ERROR)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            results[size] = bench_size(pathlib.Path(tmp), size, args)
+            for f in pathlib.Path(tmp).glob(f'*_{size}.*'):
+                os.remove(f)
+
+    print('\t'.join(['runs', 'stage', 'seconds', 'rows/s', 'peak, MB']))
+    for size, stages in results.items():
+        for name, r in stages.items():
+            rows_per_sec = f'{r["rows_per_sec"]:.0f}' if r['rows_per_sec'] is not None else '-'
+            peak = f'{r["peak_mb"]:.1f}' if r['peak_mb'] is not None else '-'
+            print('\t'.join([str(size), name, f'{r["seconds"]:.3f}', rows_per_sec, peak]))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf8') as fh:
+            json.dump(results, fh, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Время рисования одного графика в разных режимах Renderer:
+* today - как раньше: новый рисунок на каждый график, bbox_inches='tight'
+* default - рисунок переиспользуется, bbox_inches='tight' (файлы такие же, как today)
+* fast - рисунок переиспользуется, фиксированная разметка (можно указать dpi и svg)
+
+python3 bench_render.py --plots 20 --groups 8 --probs 10
+"""
+
+import argparse
+import logging
+import os
+import pathlib
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'ej_plot_contest'))
+from ej_render import Renderer
+
+
+def make_specs(output_dir, plots, groups, probs, seed=1):
+    """
+    Описания графиков всех видов со случайными данными, как их готовит DataPlotter
+    """
+    rnd = random.Random(seed)
+    headers = ['студентов'] + [f'prob{i}' for i in range(probs)]
+    group_names = [str(700 + i) for i in range(groups)]
+    specs = []
+    for n in range(plots):
+        ydata = [[rnd.randint(15, 30)] + [rnd.randint(0, 15) for _ in range(probs)] for _ in group_names]
+        specs.append({
+            'kind': 'department',
+            'filename': output_dir / f'dep_{n}.png',
+            'title': f'DEP{n} всего',
+            'headers': headers,
+            'labels': [f'{gr} Преподаватель' for gr in group_names],
+            'ydata': ydata,
+        })
+        specs.append({
+            'kind': 'group',
+            'filename': output_dir / f'group_{n}.png',
+            'title': f'DEP{n} {group_names[0]}',
+            'headers': headers,
+            'ydata': ydata[0],
+        })
+        fracs = [row[1] for row in ydata]
+        fracs.append(sum(row[0] for row in ydata) - sum(fracs))
+        specs.append({
+            'kind': 'prob_pie',
+            'filename': output_dir / f'pie_{n}.png',
+            'title': f'DEP{n} prob0',
+            'fracs': fracs,
+            'labels': [f'{f} - {g}' for f, g in zip(fracs, group_names + ['unsolved'])],
+            'colors_number': len(group_names),
+        })
+    return specs
+
+
+def bench(renderer, specs):
+    """
+    :return: {вид графика: среднее время рисования и сохранения одного графика в секундах}
+    """
+    times = {}
+    for spec in specs:
+        start = time.perf_counter()
+        renderer.render(spec)
+        times.setdefault(spec['kind'], []).append(time.perf_counter() - start)
+    return {kind: sum(t) / len(t) for kind, t in times.items()}
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(
+        description='Measure per-plot render time of today path, default and fast render profiles',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--plots", help="plots of every kind", type=int, default=20)
+    parser.add_argument("--groups", help="groups in department", type=int, default=8)
+    parser.add_argument("--probs", help="problems in contest", type=int, default=10)
+    parser.add_argument("--dpi", help="dpi for fast profile", type=int, default=None)
+    parser.add_argument("--format", help="file format for fast profile", choices=['png', 'svg'], default=None)
+    args = parser.parse_args()
+
+    modes = {
+        'today': Renderer('default', reuse=False),
+        'default': Renderer('default'),
+        'fast': Renderer('fast', dpi=args.dpi, fmt=args.format),
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        specs = make_specs(pathlib.Path(tmp), args.plots, args.groups, args.probs)
+        for name, renderer in modes.items():
+            bench(renderer, specs[:3])      # прогрев: шрифты, кеши matplotlib
+            results[name] = bench(renderer, specs)
+
+    kinds = list(results['today'])
+    print('\t'.join(['mode'] + [f'{k}, ms' for k in kinds] + ['speedup']))
+    today = sum(results['today'].values())
+    for name, res in results.items():
+        row = [f'{res[k] * 1000:.1f}' for k in kinds]
+        print('\t'.join([name] + row + [f'{today / sum(res.values()):.2f}x']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Время запуска утилит через ejtools.py без обработки данных: --help и --config_only.
+Каждая команда запускается в новом интерпретаторе несколько раз, берется лучшее время.
+Проверяется, что время не больше бюджета и что не загружены тяжелые модули (matplotlib, numpy, jinja2).
+Подсчет контеста с --text_only --no_html тоже не должен загружать тяжелые модули (время не проверяется).
+Конфиг и dump контеста генерируются (gen_ejudge_dump) во временной директории.
+Код возврата 1, если хоть одна команда не уложилась в бюджет или загрузила тяжелый модуль.
+
+python3 bench_startup.py --budget 0.5 --repeat 5
+"""
+
+import argparse
+import pathlib
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+
+from gen_ejudge_dump import generate
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+EJTOOLS = ROOT / 'ejtools.py'
+HEAVY_MODULES = ('matplotlib', 'numpy', 'jinja2')
+HEAVY_MARK = 'HEAVY_MODULES:'
+
+def commands(config):
+    """
+    {имя: аргументы ejtools.py}
+    """
+    return {
+        'ejtools --help': ['--help'],
+        'contest --help': ['contest', '--help'],
+        'makeall --help': ['makeall', '--help'],
+        'import --help': ['import', '--help'],
+        'progress --help': ['progress', '--help'],
+        'progress_batch --help': ['progress_batch', '--help'],
+        'semestr --help': ['semestr', '--help'],
+        'contest --config_only': ['contest', str(config), '--config_only'],
+    }
+
+
+def text_commands(config):
+    """
+    {имя: аргументы ejtools.py} - обработка данных без графиков и html, проверяются только тяжелые модули
+    """
+    return {
+        'contest --text_only': ['contest', str(config), '--text_only', '--no_html', '--no-cache'],
+        'contest --text_only --stream': ['contest', str(config), '--text_only', '--no_html', '--stream'],
+    }
+
+
+def child(argv):
+    """
+    Выполняется в новом интерпретаторе (bench_startup.py --child ejtools.py ...): запускает ejtools.py
+    как скрипт с аргументами argv и после него печатает в stderr загруженные тяжелые модули
+    """
+    sys.argv = argv
+    try:
+        runpy.run_path(argv[0], run_name='__main__')
+    except SystemExit:
+        pass
+    finally:
+        heavy = sorted(m for m in HEAVY_MODULES if m in sys.modules)
+        print(HEAVY_MARK, ','.join(heavy), file=sys.stderr)
+
+
+def run(args, cwd):
+    """
+    :return: (время в секундах, список загруженных тяжелых модулей)
+    """
+    start = time.perf_counter()
+    res = subprocess.run([sys.executable, __file__, '--child', str(EJTOOLS)] + args, cwd=cwd,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - start
+    heavy = []
+    for line in res.stderr.splitlines():
+        if line.startswith(HEAVY_MARK):
+            heavy = [m for m in line[len(HEAVY_MARK):].strip().split(',') if m]
+    return elapsed, heavy
+
+
+def main():
+    if sys.argv[1:2] == ['--child']:
+        child(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(
+        description='Check that ejtools.py --help and --config_only start within a time budget',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--budget", help="max startup time of every command, seconds", type=float, default=0.5)
+    parser.add_argument("--repeat", help="runs of every command, the best time is taken", type=int, default=5)
+    args = parser.parse_args()
+
+    failed = []
+    # --config_only создает директории результатов рядом с конфигом, поэтому конфиг - во временной директории
+    with tempfile.TemporaryDirectory() as tmp:
+        config = pathlib.Path(tmp) / 'config.json'
+        generate(pathlib.Path(tmp) / 'dump.csv', 2000, logins=60, groups=3, config=config)
+        print('\t'.join(['command', 'best, ms', 'heavy modules', 'result']))
+        for name, cmd in commands(config).items():
+            results = [run(cmd, tmp) for _ in range(args.repeat)]
+            best = min(t for t, _ in results)
+            heavy = sorted({m for _, h in results for m in h})
+            ok = best <= args.budget and not heavy
+            if not ok:
+                failed.append(name)
+            print('\t'.join([name, f'{best * 1000:.0f}', ','.join(heavy) or '-', 'OK' if ok else 'FAIL']))
+        for name, cmd in text_commands(config).items():
+            elapsed, heavy = run(cmd, tmp)
+            if heavy:
+                failed.append(name)
+            print('\t'.join([name, f'{elapsed * 1000:.0f}', ','.join(heavy) or '-', 'FAIL' if heavy else 'OK']))
+
+    if failed:
+        print(f'budget {args.budget}s is exceeded or heavy modules are loaded: {", ".join(failed)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
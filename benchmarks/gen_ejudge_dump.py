@@ -0,0 +1,237 @@
+"""
+Генератор синтетических данных ejudge в точном формате:
+* dump runs in csv format - 42 колонки, как выгружает ejudge (Run_Id;Time;Nsec;...;Pages;Judge_Id),
+* standings, преобразованная в csv (Place;User;задача1;...;Score), пустая клетка - '\\xa0', как в html таблице.
+
+Логины вида <login_prefix><группа><номер>, например ed95070507 (группа 705, login_group_len=3),
+задачи вида A-DPQE, B-DPQE, ... (label A, суффикс - факультет).
+Посылки идут по возрастанию Run_Id и времени, часть из них после конца контеста (дорешивание).
+
+python3 gen_ejudge_dump.py --runs 100000 --logins 300 --groups 10 --problems 8 dump.csv --standings standings.csv
+"""
+
+import argparse
+import contextlib
+import csv
+import datetime
+import hashlib
+import json
+import random
+import string
+import sys
+
+DUMP_HEADER = [
+    'Run_Id', 'Time', 'Nsec', 'Time2', 'Date', 'Year', 'Mon', 'Day', 'Hour', 'Min', 'Sec',
+    'Dur', 'Dur_Day', 'Dur_Hour', 'Dur_Min', 'Dur_Sec', 'Size', 'IPV6_Flag', 'IP', 'SSL_Flag', 'Sha1',
+    'User_Id', 'User_Login', 'User_Name', 'User_Inv', 'User_Ban', 'User_Lock', 'Prob', 'Variant', 'Lang',
+    'Content_Type', 'Stat_Short', 'Status', 'Score', 'Score_Adj', 'Test', 'Import_Flag', 'Hidden_Flag',
+    'RO_Flag', 'Locale_Id', 'Pages', 'Judge_Id',
+]
+
+STATUSES = {
+    'OK': 'OK',
+    'PT': 'Partial solution',
+    'CE': 'Compilation error',
+    'WA': 'Wrong answer',
+    'TL': 'Time-limit exceeded',
+    'RT': 'Run-time error',
+    'SV': 'Coding style violation',
+    'PD': 'Pending check',
+    'CF': 'Check failed',
+}
+
+# доли статусов примерно как в example_data
+DEFAULT_STATUS_MIX = 'OK:0.30,PT:0.25,CE:0.20,WA:0.10,TL:0.05,RT:0.04,SV:0.04,PD:0.02'
+LANGS = ('gcc-vg', 'g++-vg', 'python3')
+MAX_SCORE = 10
+NBSP = '\xa0'
+
+
+def parse_status_mix(text):
+    """
+    'OK:0.3,WA:0.7' -> ({'OK': 0.3, 'WA': 0.7})
+    """
+    mix = {}
+    for item in text.split(','):
+        status, weight = item.split(':')
+        if status not in STATUSES:
+            raise ValueError(f'unknown status {status}, expected one of {list(STATUSES)}')
+        mix[status] = float(weight)
+    return mix
+
+
+def make_groups(groups, first_group=701):
+    return [str(first_group + i) for i in range(groups)]
+
+
+def make_logins(logins, groups, login_prefix='ed950'):
+    """
+    Логины, равномерно распределенные по группам: {login: group}
+    """
+    return {f'{login_prefix}{groups[i % len(groups)]}{i // len(groups):02d}': groups[i % len(groups)]
+            for i in range(logins)}
+
+
+def make_problems(problems):
+    """
+    Короткие имена задач (label): A, B, ..., Z, A1, B1, ...
+    """
+    letters = string.ascii_uppercase
+    return [letters[i % 26] + (str(i // 26) if i >= 26 else '') for i in range(problems)]
+
+
+def generate_runs(runs, logins, problems, department='DPQE', status_mix=None, start=1576082925,
+                  duration=3 * 3600, after=0.1, invisible=0.01, seed=1):
+    """
+    Посылки в формате dump runs, списки строк в порядке DUMP_HEADER.
+    Как с disable_submit_after_ok в ejudge: у логина не больше одной OK посылки по каждой задаче.
+    :param logins: {login: group}
+    :param problems: label задач
+    :param start: timestamp начала контеста
+    :param duration: длительность контеста в секундах
+    :param after: доля посылок после конца контеста (дорешивание)
+    :param invisible: доля невидимых пользователей (User_Inv = I)
+    """
+    rnd = random.Random(seed)
+    mix = status_mix or parse_status_mix(DEFAULT_STATUS_MIX)
+    statuses, weights = list(mix), list(mix.values())
+    not_ok = [st for st in statuses if st != 'OK'] or ['WA']
+    not_ok_weights = [mix.get(st, 1) for st in not_ok]
+    login_list = list(logins)
+    users = {login: (10000 + i, f'Студент{i} Б01-{logins[login]}', 'I' if rnd.random() < invisible else '')
+             for i, login in enumerate(login_list)}
+    ips = {login: f'10.55.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}' for login in login_list}
+    probs = [f'{p}-{department}' for p in problems]
+    solved = {login: set() for login in login_list}
+
+    total = duration / (1 - after) if after < 1 else duration
+    times = sorted(start + rnd.random() * total for _ in range(runs))
+    for run_id, t in enumerate(times):
+        sec = int(t)
+        login = rnd.choice(login_list)
+        user_id, user_name, user_inv = users[login]
+        prob = rnd.choice(probs)
+        status = rnd.choices(statuses, weights)[0]
+        if status == 'OK' and prob in solved[login]:
+            status = rnd.choices(not_ok, not_ok_weights)[0]
+        if status == 'OK':
+            solved[login].add(prob)
+        score = MAX_SCORE if status == 'OK' else rnd.randint(1, MAX_SCORE - 1) if status == 'PT' else 0
+        dt = datetime.datetime.fromtimestamp(sec)
+        dur = sec - start
+        yield [
+            run_id, sec, int((t - sec) * 1e9) // 1000 * 1000, dt.strftime('%Y%m%d%H%M%S'), dt.strftime('%Y%m%d'),
+            dt.year, f'{dt.month:02d}', f'{dt.day:02d}', f'{dt.hour:02d}', f'{dt.minute:02d}', f'{dt.second:02d}',
+            dur, dur // 86400, f'{dur // 3600 % 24:02d}', f'{dur // 60 % 60:02d}', f'{dur % 60:02d}',
+            rnd.randint(100, 5000), 0, ips[login], 0, hashlib.sha1(f'{seed}:{run_id}'.encode()).hexdigest(),
+            user_id, login, user_name, user_inv, '', '', prob, 0, rnd.choice(LANGS),
+            '', status, STATUSES[status], score if status != 'CE' else -1, 0,
+            rnd.randint(1, 20) if status not in ('CE', 'PD') else 0, 0, 0, 0, 1, 0, 0,
+        ]
+
+
+def write_dump(file, rows, delimiter=';'):
+    """
+    Пишет dump runs, возвращает лучшие баллы {login: {label задачи: балл}} для standings
+    """
+    best = {}
+    login_col, prob_col, score_col = (DUMP_HEADER.index(c) for c in ('User_Login', 'Prob', 'Score'))
+    with open_output(file) as fh:
+        writer = csv.writer(fh, delimiter=delimiter, lineterminator='\n')
+        writer.writerow(DUMP_HEADER)
+        for row in rows:
+            writer.writerow(row)
+            label = row[prob_col].rsplit('-', 1)[0]
+            scores = best.setdefault(row[login_col], {})
+            scores[label] = max(scores.get(label, 0), row[score_col])
+    return best
+
+
+def write_standings(file, best, logins, problems, delimiter=';'):
+    """
+    Standings по лучшим баллам: Place;User;задачи...;Score, без посылок по задаче - '\\xa0'
+    """
+    rows = []
+    for login in logins:
+        scores = best.get(login, {})
+        cells = [scores[p] if p in scores else NBSP for p in problems]
+        rows.append((sum(max(s, 0) for s in scores.values()), login, cells))
+    rows.sort(key=lambda r: -r[0])
+    with open_output(file) as fh:
+        writer = csv.writer(fh, delimiter=delimiter, lineterminator='\n')
+        writer.writerow(['Place', 'User'] + list(problems) + ['Score'])
+        for place, (score, login, cells) in enumerate(rows, 1):
+            writer.writerow([place, login] + cells + [score])
+
+
+def contest_config(file_data, groups, problems, department='DPQE', stage='bench', login_prefix='ed950'):
+    """
+    Плоский конфиг ej_plot_contest для сгенерированных данных
+    """
+    return {
+        'department': department,
+        'stage': stage,
+        'file_data': str(file_data),
+        'login_prefix': login_prefix,
+        'login_group_len': 3,
+        'problems': ' '.join(f'{p}-' for p in problems),
+        'preps': {g: f'Преподаватель{i}' for i, g in enumerate(groups)},
+    }
+
+
+def open_output(file):
+    """
+    Открывает файл на запись, '-' - stdout (его не закрываем)
+    """
+    if str(file) == '-':
+        return contextlib.nullcontext(sys.stdout)
+    return open(file, 'w', encoding='utf8', newline='')
+
+
+def generate(dump, runs, logins=300, groups=10, problems=8, department='DPQE', status_mix=None,
+             standings=None, config=None, delimiter=';', seed=1, login_prefix='ed950', **kwargs):
+    """
+    Генерирует dump runs (и, если указаны файлы, standings и конфиг ej_plot_contest)
+    :return: (список групп, {login: group}, список label задач)
+    """
+    group_list = make_groups(groups)
+    login_map = make_logins(logins, group_list, login_prefix)
+    prob_list = make_problems(problems)
+    best = write_dump(dump, generate_runs(runs, login_map, prob_list, department, status_mix, seed=seed, **kwargs),
+                      delimiter)
+    if standings is not None:
+        write_standings(standings, best, login_map, prob_list, delimiter)
+    if config is not None:
+        with open(config, 'w', encoding='utf8') as fh:
+            json.dump(contest_config(dump, group_list, prob_list, department, login_prefix=login_prefix), fh, ensure_ascii=False, indent=4)
+    return group_list, login_map, prob_list
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate synthetic ejudge run dump (42 columns) and standings table in csv format',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("dump", help="output run dump csv, '-' - stdout")
+    parser.add_argument("--runs", help="number of runs", type=int, default=10000)
+    parser.add_argument("--logins", help="number of logins", type=int, default=300)
+    parser.add_argument("--groups", help="number of groups", type=int, default=10)
+    parser.add_argument("--problems", help="number of problems", type=int, default=8)
+    parser.add_argument("--department", help="department, suffix of problem names", default='DPQE')
+    parser.add_argument("--status_mix", help="statuses with weights", default=DEFAULT_STATUS_MIX)
+    parser.add_argument("--duration", help="contest duration, hours", type=float, default=3)
+    parser.add_argument("--after", help="fraction of runs after the contest end", type=float, default=0.1)
+    parser.add_argument("--invisible", help="fraction of invisible users", type=float, default=0.01)
+    parser.add_argument("--delimiter", help="csv delimiter", choices=[';', ','], default=';')
+    parser.add_argument("--standings", help="also write standings table csv", default=None)
+    parser.add_argument("--config", help="also write flat ej_plot_contest config json", default=None)
+    parser.add_argument("--seed", help="random seed", type=int, default=1)
+    args = parser.parse_args()
+
+    generate(args.dump, args.runs, args.logins, args.groups, args.problems, args.department,
+             parse_status_mix(args.status_mix), args.standings, args.config, args.delimiter, args.seed,
+             duration=int(args.duration * 3600), after=args.after, invisible=args.invisible)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+import csv
+import io
+import itertools
+import mmap
+import operator
+import os
+import pathlib
+
+"""
+Быстрое чтение run dump Ejudge с разделителем ';' без csv.DictReader.
+
+Файл отображается в память (mmap) и разбирается блоками по BLOCK_SIZE байт, колонки находятся по заголовку,
+и из строк берутся только нужные поля (проекция): остальные ~40 колонок не декодируются.
+Блок обрабатывается по колонкам (split, map, itemgetter - циклы внутри C), а не по строкам.
+Каждое разное значение строковой колонки декодируется один раз, дальше берется из словаря по байтам.
+Условия where (например Stat_Short == 'OK') проверяются по байтам поля, до декодирования строки.
+
+Строки с кавычками (поле с ';' или переводом строки внутри) разбираются обычным csv,
+поэтому результат тот же, что у csv.DictReader.
+
+scanner = DumpScanner('runs.csv')
+for login, prob in scanner.select(('User_Login', 'Prob'), where={'Stat_Short': ('OK',)}):
+    ...
+"""
+
+DELIMITER = b';'
+QUOTE = b'"'
+ENCODING = 'utf8'
+BLOCK_SIZE = 64 * 2**10     # байт в блоке (продлевается до конца строки), поля блока остаются в кеше процессора
+
+
+class _Decoded(dict):
+    """
+    bytes -> значение: декодирует каждое разное значение поля один раз
+    """
+    def __init__(self, convert):
+        super().__init__()
+        self.convert = convert
+
+    def __missing__(self, key):
+        value = self[key] = self.convert(key.decode(ENCODING))
+        return value
+
+
+def to_int(field):
+    """
+    Число из поля csv (bytes или str), пустые, отсутствующие (None) и нечисловые значения
+    (например '\xa0' в standings) - 0
+    """
+    try:
+        return int(field)
+    except (TypeError, ValueError):
+        return 0
+
+
+class DumpScanner:
+    """
+    Run dump с разделителем ';', отображенный в память.
+    fieldnames - заголовок, rows_read - сколько строк данных просмотрел последний select.
+    """
+    def __init__(self, file):
+        self.file = file
+        self.rows_read = 0
+        with open(file, 'rb') as fh:
+            header = fh.readline()
+        self.header_size = len(header)
+        self.fieldnames = next(csv.reader([header.decode(ENCODING).rstrip('\r\n')], delimiter=DELIMITER.decode()), [])
+
+    def __repr__(self):
+        return f'DumpScanner({self.file}, columns={len(self.fieldnames)})'
+
+    @staticmethod
+    def supported(file):
+        """
+        Файл можно отобразить в память: обычный непустой несжатый файл, не stdin и не named pipe
+        """
+        path = pathlib.Path(file)
+        if str(file) == '-' or path.suffix.lower() in ('.gz', '.bz2', '.xz'):
+            return False
+        try:
+            return path.is_file() and path.stat().st_size > 0
+        except OSError:
+            return False
+
+    def select(self, columns, int_columns=(), where=None, tables=None):
+        """
+        Кортежи значений колонок columns (строки) и int_columns (числа) для каждой строки run dump.
+        Колонки, которых нет в заголовке, дают '' и 0, как у csv.DictReader с r.get(name) or ''.
+        :param where: {колонка: допустимые значения} - строки с другими значениями пропускаются до декодирования
+        :param tables: {колонка: StringTable} - вместо строк этих колонок выдавать их коды в таблице
+        """
+        for values in self.select_columns(columns, int_columns, where, tables):
+            yield from zip(*values)
+
+    def select_columns(self, columns, int_columns=(), where=None, tables=None):
+        """
+        То же, что select, но по блокам и по колонкам: для каждого блока файла [значения колонки для строк блока]
+        в порядке columns + int_columns
+        """
+        tables = tables or {}
+        index = {name: i for i, name in enumerate(self.fieldnames)}     # как у csv.DictReader: последняя с именем
+        wanted = [index[name] for name in list(columns) + list(int_columns) + list(where or ()) if name in index]
+        n_fields = max(wanted, default=0) + 1       # дальше последнего нужного поля строку не режем
+        converters = [(index.get(name), _Decoded(tables[name].code if name in tables else str).__getitem__, '')
+                      for name in columns]
+        converters += [(index.get(name), None, 0) for name in int_columns]
+        filters = [(index.get(name), {str(v).encode(ENCODING) for v in values}) for name, values in (where or {}).items()]
+        self.rows_read = 0
+
+        for rows in self._blocks(n_fields):
+            self.rows_read += len(rows)
+            if min(map(len, rows), default=n_fields) < n_fields:
+                rows = [r + [b''] * (n_fields - len(r)) for r in rows]      # у короткой строки поля пустые
+            for i, allowed in filters:
+                if i is None:
+                    rows = [] if b'' not in allowed else rows
+                else:
+                    rows = list(itertools.compress(rows, map(allowed.__contains__, map(operator.itemgetter(i), rows))))
+            if not rows:
+                continue
+            values = []
+            for i, convert, default in converters:
+                if i is None:
+                    values.append([default] * len(rows))
+                    continue
+                raw = list(map(operator.itemgetter(i), rows))
+                if convert is not None:
+                    values.append(list(map(convert, raw)))
+                else:
+                    try:
+                        values.append(list(map(int, raw)))
+                    except ValueError:
+                        values.append(list(map(to_int, raw)))
+            yield values
+
+    def _blocks(self, n_fields):
+        """
+        Строки файла блоками: [[поле1, ..., поле n_fields и остаток строки]] в bytes, пустые строки пропускаются
+        """
+        with open(self.file, 'rb') as fh:
+            size = os.fstat(fh.fileno()).st_size
+            if size <= self.header_size:
+                return
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                pos = self.header_size
+                while pos < size:
+                    end = mm.find(b'\n', min(pos + BLOCK_SIZE, size - 1))
+                    end = size if end < 0 else end + 1
+                    block = mm[pos:end]
+                    while QUOTE in block and block.count(QUOTE) % 2 and end < size:
+                        # поле в кавычках с переводом строки внутри продолжается в следующей строке
+                        nl = mm.find(b'\n', end)
+                        nl = size if nl < 0 else nl + 1
+                        block += mm[end:nl]
+                        end = nl
+                    pos = end
+                    if QUOTE in block:
+                        yield self._quoted(block)
+                        continue
+                    if b'\r' in block:
+                        block = block.replace(b'\r\n', b'\n')
+                    yield [line.split(DELIMITER, n_fields) for line in block.split(b'\n') if line]
+
+    @staticmethod
+    def _quoted(block):
+        """
+        Строки блока с кавычками, разобранные csv (как csv.DictReader), поля в bytes
+        """
+        rows = csv.reader(io.StringIO(block.decode(ENCODING), newline=''), delimiter=DELIMITER.decode())
+        return [[f.encode(ENCODING) for f in r] for r in rows if r]
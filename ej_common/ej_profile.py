@@ -0,0 +1,104 @@
+import contextlib
+import json
+import logging
+import time
+import tracemalloc
+
+"""
+Профиль обработки по стадиям (ключ --profile): время каждой стадии, пиковая память (tracemalloc),
+для стадий чтения и подсчета - строк в секунду. Отчет сохраняется в json рядом с результатами.
+
+profiler = StageProfiler('DPQE dec')
+with profiler.stage('read') as st:
+    runs = read(...)
+    st['rows'] = len(runs)
+profiler.save('DPQE_dec_profile.json')
+
+Выключенный профайлер (enabled=False) ничего не меряет, stage() только выдает словарь для rows.
+tracemalloc видит только память своего процесса: графики, нарисованные в пуле процессов, в пик не попадают.
+"""
+
+MB = 2**20
+
+
+class StageProfiler:
+    def __init__(self, name='', enabled=True):
+        """
+        :param name: что профилируем (контест, файл), попадает в отчет
+        :param enabled: False - ничего не мерять
+        """
+        self.name = name
+        self.enabled = enabled
+        self.stages = []        # записи о стадиях в порядке выполнения
+        self._start = time.perf_counter()
+        self._own_tracemalloc = False
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_tracemalloc = True
+
+    def __repr__(self):
+        return f'StageProfiler({self.name}, enabled={self.enabled}, stages={len(self.stages)})'
+
+    @contextlib.contextmanager
+    def stage(self, name, **info):
+        """
+        Меряет стадию name. Внутри with можно записать в выданный словарь количество строк: st['rows'] = n
+        :param info: дополнительные поля записи о стадии (например, output_dir)
+        """
+        record = {'stage': name, **info}
+        if not self.enabled:
+            yield record
+            return
+
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            record['seconds'] = round(seconds, 6)
+            record['start_mb'] = round(current / MB, 3)
+            record['peak_mb'] = round(peak / MB, 3)
+            record['alloc_peak_mb'] = round((peak - current) / MB, 3)
+            if record.get('rows') is not None and seconds > 0:
+                record['rows_per_sec'] = round(record['rows'] / seconds)
+            self.stages.append(record)
+            logging.debug(f'profile {self.name}: {record}')
+
+    @staticmethod
+    def counted(rows, record):
+        """
+        Пропускает строки rows, считая их в record['rows'] (для стадий, где строки читаются по одной)
+        """
+        record['rows'] = record.get('rows') or 0
+        for r in rows:
+            record['rows'] += 1
+            yield r
+
+    def report(self):
+        return {
+            'name': self.name,
+            'total_seconds': round(time.perf_counter() - self._start, 6),
+            'peak_mb': max((s['peak_mb'] for s in self.stages), default=None),
+            'stages': self.stages,
+        }
+
+    def save(self, path):
+        """
+        Сохраняет отчет в json и останавливает tracemalloc, если его запускал этот профайлер
+        """
+        if not self.enabled:
+            return
+        report = self.report()
+        with open(path, 'w', encoding='utf8') as fh:
+            json.dump(report, fh, ensure_ascii=False, indent=4)
+        logging.info(f'profile {self.name}: ' +
+                     ', '.join(f'{s["stage"]} {s["seconds"]:.3f}s' for s in self.stages) + f', report {path}')
+        self.stop()
+
+    def stop(self):
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+            self._own_tracemalloc = False
@@ -0,0 +1,231 @@
+import bz2
+import contextlib
+import csv
+import gzip
+import io
+import itertools
+import logging
+import lzma
+import pathlib
+import sys
+
+from ej_dump import DumpScanner, to_int
+
+"""
+Общее чтение csv файлов для всех утилит: разделитель и вид файла определяются по первой строке (заголовку),
+после чего файл разбирается ровно один раз.
+
+Виды файлов:
+* runs - dump runs in csv format (Run_Id;Time;...;User_Login;...;Prob;...;Stat_Short;...)
+* standings - таблица результатов, преобразованная в csv (User;задача1;задача2;...)
+* logins - список пользователей (Login;Group)
+* marks - оценки за семестр по факультетам (Оценка;Школа А;Школа Б;...)
+
+Файлы .gz, .bz2 и .xz распаковываются потоком при чтении, без временных файлов.
+"""
+
+STDIN_NAME = '-'            # имя файла '-' - читать из stdin
+DELIMITERS = (';', ',')     # пробуем в этом порядке
+CHUNK_ROWS = 4096           # строк в куске select_columns при чтении через csv
+
+KIND_RUNS = 'runs'
+KIND_STANDINGS = 'standings'
+KIND_LOGINS = 'logins'
+KIND_MARKS = 'marks'
+KIND_UNKNOWN = 'unknown'
+KIND_EMPTY = 'empty'
+
+MARK = 'Оценка'
+
+# суффикс сжатого файла -> функция открытия (как open, с поддержкой 'rb' и 'rt')
+COMPRESSED = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+}
+
+
+def is_compressed(file):
+    """
+    Файл сжат (по суффиксу .gz, .bz2, .xz)
+    """
+    return pathlib.Path(file).suffix.lower() in COMPRESSED
+
+
+def open_binary(file):
+    """
+    Открывает файл на чтение байтов, сжатый файл распаковывается потоком
+    (смещения, seek и tell - в распакованных байтах)
+    """
+    opener = COMPRESSED.get(pathlib.Path(file).suffix.lower(), open)
+    return opener(file, 'rb')
+
+
+def open_text(file):
+    """
+    Открывает файл на чтение как utf8 текст, '-' - stdin (его не закрываем),
+    сжатый файл распаковывается потоком
+    """
+    if str(file) == STDIN_NAME:
+        return contextlib.nullcontext(io.TextIOWrapper(sys.stdin.buffer, encoding='utf8'))
+    opener = COMPRESSED.get(pathlib.Path(file).suffix.lower(), open)
+    return opener(file, 'rt', encoding='utf8', newline='')
+
+
+def sniff_header(line, delimiter=None):
+    """
+    По первой строке файла определяет разделитель и заголовок.
+    Подходит разделитель, с которым в заголовке больше 1 колонки.
+    :param line: первая строка файла
+    :param delimiter: None - подобрать из DELIMITERS, иначе использовать указанный
+    :return: (delimiter, header)
+    """
+    delimiters = DELIMITERS if delimiter is None else (delimiter,)
+    header = []
+    for delim in delimiters:
+        header = next(csv.reader([line], delimiter=delim), [])
+        if len(header) > 1:
+            return delim, header
+    return delimiters[0], header
+
+
+def sniff_kind(header):
+    """
+    Вид файла по его заголовку
+    """
+    if not header:
+        return KIND_EMPTY
+    columns = set(header)
+    if {'Run_Id', 'User_Login', 'Prob', 'Stat_Short'} <= columns:
+        return KIND_RUNS
+    if {'Login', 'Group'} <= columns:
+        return KIND_LOGINS
+    if header[0] == MARK:
+        return KIND_MARKS
+    if 'User' in columns:
+        return KIND_STANDINGS
+    return KIND_UNKNOWN
+
+
+class CsvTable:
+    """
+    Открытый csv файл с уже разобранным заголовком:
+    delimiter, fieldnames, kind - определены по первой строке,
+    итерирование выдает оставшиеся строки как словари (как csv.DictReader),
+    select - только нужные колонки (run dump с ';' в обычном файле читается быстрым DumpScanner).
+
+    with CsvTable('runs.csv') as table:
+        if table.kind == KIND_RUNS:
+            for r in table:
+                ...
+    """
+    def __init__(self, file, delimiter=None):
+        self.file = file
+        self.rows_read = 0      # сколько строк просмотрел select
+        self._fh = None
+        self._cm = open_text(file)
+        self._fh = self._cm.__enter__()
+        try:
+            line = self._fh.readline()
+            self.delimiter, self.fieldnames = sniff_header(line, delimiter)
+            self.kind = sniff_kind(self.fieldnames)
+        except BaseException:
+            self.close()
+            raise
+        logging.debug(f'{file}: kind={self.kind} delimiter="{self.delimiter}" columns={len(self.fieldnames)}')
+
+    def __repr__(self):
+        return f'CsvTable({self.file}, kind={self.kind}, delimiter="{self.delimiter}")'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        if self.kind == KIND_EMPTY:
+            return iter(())
+        return csv.DictReader(self._fh, fieldnames=self.fieldnames, delimiter=self.delimiter)
+
+    def select(self, columns, int_columns=(), where=None, tables=None):
+        """
+        Кортежи значений колонок columns (строки) и int_columns (числа), как r.get(name) or '' и to_int
+        :param where: {колонка: допустимые значения} - остальные строки пропускаются
+        :param tables: {колонка: StringTable} - вместо строк этих колонок выдавать их коды в таблице
+        """
+        for values in self.select_columns(columns, int_columns, where, tables):
+            yield from zip(*values)
+
+    def select_columns(self, columns, int_columns=(), where=None, tables=None):
+        """
+        То же, что select, но кусками по колонкам: [значения колонки для строк куска] в порядке columns + int_columns.
+        Run dump с разделителем ';' в обычном файле разбирается DumpScanner (mmap, только нужные поля),
+        остальные файлы - csv.DictReader.
+        """
+        self.rows_read = 0
+        if self.kind == KIND_RUNS and self.delimiter == ';' and DumpScanner.supported(self.file):
+            scanner = DumpScanner(self.file)
+            for values in scanner.select_columns(columns, int_columns, where, tables):
+                self.rows_read = scanner.rows_read
+                yield values
+            self.rows_read = scanner.rows_read
+            return
+
+        tables = tables or {}
+        codes = [tables[name].code if name in tables else str for name in columns]
+        filters = [(name, {str(v) for v in values}) for name, values in (where or {}).items()]
+        rows = iter(self)
+        while True:
+            chunk = list(itertools.islice(rows, CHUNK_ROWS))
+            if not chunk:
+                return
+            self.rows_read += len(chunk)
+            chunk = [r for r in chunk if all((r.get(name) or '') in allowed for name, allowed in filters)]
+            if chunk:
+                yield [[code(r.get(name) or '') for r in chunk] for name, code in zip(columns, codes)] + \
+                      [[to_int(r.get(name)) for r in chunk] for name in int_columns]
+
+    def close(self):
+        if self._fh is not None:
+            self._cm.__exit__(None, None, None)
+            self._fh = None
+
+
+def open_table(file, delimiter=None):
+    """
+    Открывает csv файл, определяет разделитель и вид файла по первой строке
+    :param file: filename (можно .gz, .bz2, .xz) или '-' для stdin
+    :param delimiter: None - определить по заголовку
+    :return: CsvTable
+    """
+    return CsvTable(file, delimiter)
+
+
+def read_table(file, delimiter=None, kind=None):
+    """
+    Читает csv файл целиком и возвращает список словарей
+    file with data:
+    A;B;C
+    1;2;3
+    parse as
+    [{'A': '1', 'B': '2', 'C': '3'}]
+
+    :param file: filename
+    :param delimiter: None - определить по заголовку (; или ,)
+    :param kind: ожидаемый вид файла, если файл другого вида - предупреждение в лог
+    :return: list of dict, для пустого файла []
+    """
+    with open_table(file, delimiter) as table:
+        if kind is not None and table.kind not in (kind, KIND_EMPTY):
+            logging.warning(f'{file}: expected {kind} csv file, got {table.kind}')
+        return [dict(row) for row in table]
+
+
+def sniff_file(file, delimiter=None):
+    """
+    Вид файла и разделитель по первой строке, сам файл не разбирается
+    :return: CsvTable, уже закрытый (есть поля delimiter, fieldnames, kind)
+    """
+    with open_table(file, delimiter) as table:
+        return table
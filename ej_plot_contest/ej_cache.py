@@ -0,0 +1,212 @@
+import array
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import struct
+
+from ej_runs import RunStore, StringTable
+
+"""
+Кеш разобранных run dump на диске.
+
+Разобранный и закодированный RunStore сохраняется в компактный бинарный файл:
+    MAGIC | длина заголовка (4 байта) | заголовок json | байты массивов колонок подряд
+В заголовке лежат путь, размер, mtime и хеш содержимого исходного файла, имена и типы колонок, таблицы строк.
+
+Ключ кеша - путь к файлу данных. Запись кеша годится, если:
+* совпадают размер и mtime файла данных, или
+* совпадает размер и хеш содержимого (файл только перезаписали без изменений, mtime другой).
+Только реальное изменение файла данных приводит к полному разбору csv.
+
+Вытеснение: если суммарный размер кеша больше max_size, удаляются давно не использованные записи.
+"""
+
+CACHE_VERSION = 1
+MAGIC = b'EJRUNS\x00' + bytes([CACHE_VERSION])
+SUFFIX = '.ejruns'
+HASH_CHUNK = 1 << 20
+
+
+def default_cache_dir():
+    """
+    $XDG_CACHE_HOME/ejudge_tools или ~/.cache/ejudge_tools
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or pathlib.Path.home() / '.cache'
+    return pathlib.Path(base) / 'ejudge_tools'
+
+
+def file_hash(path):
+    """
+    Хеш содержимого файла (читается кусками, файл целиком в память не грузится)
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class RunCache:
+    """
+    Кеш RunStore по файлам данных.
+    cache = RunCache(cache_dir)
+    runs = cache.load(file, columns)      # None, если в кеше нет годной записи
+    cache.save(file, runs)
+    """
+    def __init__(self, cache_dir=None, max_size=512 * 2**20):
+        """
+        :param cache_dir: директория кеша, None - default_cache_dir()
+        :param max_size: максимальный суммарный размер файлов кеша в байтах
+        """
+        self.cache_dir = pathlib.Path(cache_dir) if cache_dir is not None else default_cache_dir()
+        self.max_size = max_size
+
+    def __repr__(self):
+        return f'RunCache({self.cache_dir}, max_size={self.max_size})'
+
+    def entry_path(self, file):
+        """
+        Файл записи кеша для файла данных file
+        """
+        key = hashlib.sha1(str(pathlib.Path(file).resolve()).encode('utf8')).hexdigest()[:20]
+        return self.cache_dir / (key + SUFFIX)
+
+    def load(self, file, columns=()):
+        """
+        Возвращает RunStore из кеша или None, если записи нет, она устарела или в ней нет нужных колонок
+        :param file: файл данных
+        :param columns: имена колонок, которые должны быть в сохраненном RunStore
+        """
+        entry = self.entry_path(file)
+        try:
+            with open(entry, 'rb') as fh:
+                header = self._read_header(fh)
+                if header is None:
+                    return None
+                if not set(columns) <= {c['name'] for c in header['columns']}:
+                    logging.info(f'cache {entry}: no columns {columns}, parse {file}')
+                    return None
+                if not self._is_fresh(header['source'], file, entry):
+                    return None
+                runs = self._read_columns(fh, header['columns'])
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, EOFError) as e:
+            logging.warning(f'cache {entry} is broken ({e}), parse {file}')
+            return None
+
+        os.utime(entry)     # запись использовали - она последней пойдет на вытеснение
+        logging.info(f'runs of {file} are loaded from cache {entry}')
+        return runs
+
+    def save(self, file, runs):
+        """
+        Сохраняет RunStore, разобранный из файла данных file, и вытесняет старые записи
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entry = self.entry_path(file)
+        st = os.stat(file)
+        columns = []
+        for name, col in runs.columns.items():
+            table = runs.tables.get(name)
+            columns.append({
+                'name': name,
+                'typecode': col.typecode,
+                'length': len(col),
+                'table': table.values if table is not None else None,
+            })
+        header = {
+            'source': {
+                'path': str(pathlib.Path(file).resolve()),
+                'size': st.st_size,
+                'mtime_ns': st.st_mtime_ns,
+                'hash': file_hash(file),
+            },
+            'columns': columns,
+        }
+        RunCache._write_entry(entry, header, lambda fh: [col.tofile(fh) for col in runs.columns.values()])
+        logging.info(f'runs of {file} are saved into cache {entry}')
+        self.evict()
+
+    def evict(self):
+        """
+        Удаляет давно не использованные записи, пока суммарный размер кеша больше max_size
+        """
+        entries = []
+        for path in self.cache_dir.glob('*' + SUFFIX):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            logging.info(f'cache: evict {path}')
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        for path in self.cache_dir.glob('*' + SUFFIX):
+            path.unlink(missing_ok=True)
+
+    @staticmethod
+    def _read_header(fh):
+        if fh.read(len(MAGIC)) != MAGIC:
+            return None
+        size, = struct.unpack('<I', fh.read(4))
+        return json.loads(fh.read(size).decode('utf8'))
+
+    @staticmethod
+    def _is_fresh(source, file, entry):
+        """
+        Запись годится, если файл данных не менялся: тот же размер и mtime, или тот же размер и хеш содержимого
+        """
+        st = os.stat(file)
+        if st.st_size != source['size']:
+            return False
+        if st.st_mtime_ns == source['mtime_ns']:
+            return True
+        if file_hash(file) != source['hash']:
+            return False
+        # содержимое то же, запоминаем новый mtime, чтобы в следующий раз не считать хеш
+        source['mtime_ns'] = st.st_mtime_ns
+        RunCache._update_source(entry, source)
+        return True
+
+    @staticmethod
+    def _update_source(entry, source):
+        with open(entry, 'rb') as fh:
+            header = RunCache._read_header(fh)
+            data = fh.read()
+        header['source'] = source
+        RunCache._write_entry(entry, header, lambda out: out.write(data))
+
+    @staticmethod
+    def _write_entry(entry, header, write_columns):
+        """
+        Пишет запись во временный файл и подменяет ею старую, чтобы параллельный запуск не прочитал половину записи
+        :param write_columns: функция, которая пишет байты колонок в открытый файл
+        """
+        header_bytes = json.dumps(header, ensure_ascii=False).encode('utf8')
+        tmp = entry.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp, 'wb') as fh:
+            fh.write(MAGIC)
+            fh.write(struct.pack('<I', len(header_bytes)))
+            fh.write(header_bytes)
+            write_columns(fh)
+        os.replace(tmp, entry)
+
+    @staticmethod
+    def _read_columns(fh, columns):
+        runs = RunStore()
+        for c in columns:
+            col = array.array(c['typecode'])
+            col.fromfile(fh, c['length'])
+            runs.columns[c['name']] = col
+            if c['table'] is not None:
+                runs.tables[c['name']] = StringTable(c['table'])
+        return runs
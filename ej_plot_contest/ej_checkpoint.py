@@ -0,0 +1,224 @@
+import csv
+import json
+import logging
+import os
+import pathlib
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'ej_common'))
+from ej_reader import is_compressed, open_binary, sniff_header
+
+"""
+Инкрементальная обработка run dump.
+
+Ejudge дописывает посылки в конец dump, Run_Id только растет. Поэтому после обработки сохраняем:
+* состояние подсчета FilterState (данные по группам и задачам, логины групп, окно контеста, последний Run_Id),
+* смещение в байтах после последней обработанной строки и несколько байт перед ним.
+Следующий запуск продолжает читать файл с этого смещения, время обработки пропорционально новым посылкам.
+
+Если файл данных переписан (другой заголовок, файл стал короче, байты перед смещением другие, Run_Id не растет)
+или поменялись настройки подсчета, checkpoint не используется и файл обрабатывается целиком.
+
+Сжатый файл (.gz, .bz2, .xz) нельзя прочитать с середины, не распаковав все до нее, поэтому для него сверяются
+размер и время изменения самого сжатого файла: не изменился - новых посылок нет, изменился - обрабатывается целиком.
+"""
+
+CHECKPOINT_VERSION = 1
+TAIL_SIZE = 64      # сколько байт перед смещением сверяем, чтобы убедиться, что начало файла не менялось
+
+
+class CheckpointMismatch(Exception):
+    """
+    Новые строки не продолжают уже обработанные: файл данных переписан, нужно обработать его целиком
+    """
+
+
+class UnsortedRuns(CheckpointMismatch):
+    """
+    Посылка раньше уже известного начала окна контеста: посылки в файле идут не по времени,
+    окно можно найти только отдельным проходом по всему файлу
+    """
+
+
+class FilterState:
+    """
+    Состояние подсчета Data.fiter_data, которое можно сохранить и продолжить подсчет новыми посылками
+    """
+    def __init__(self):
+        self.data = {}                  # {'702': {'A":22, 'C-DPQE':20}} - сколько успешных решений задач
+        self.total = {}                 # {'702': {login1, login2}} - разные логины группы
+        self.contest_start = None       # timestamp начала турнира (первой OK посылки)
+        self.contest_end = None         # timestamp конца турнира
+        self.login_start = {}           # {login: timestamp первой посылки} - начала виртуальных контестов
+        self.last_run_id = None         # Run_Id последней обработанной посылки
+
+    def __repr__(self):
+        return str(self.to_dict())
+
+    def to_dict(self):
+        return {
+            'data': self.data,
+            'total': {group: sorted(logins) for group, logins in self.total.items()},
+            'contest_start': self.contest_start,
+            'contest_end': self.contest_end,
+            'login_start': self.login_start,
+            'last_run_id': self.last_run_id,
+        }
+
+    @staticmethod
+    def from_dict(d):
+        state = FilterState()
+        state.data = d['data']
+        state.total = {group: set(logins) for group, logins in d['total'].items()}
+        state.contest_start = d['contest_start']
+        state.contest_end = d['contest_end']
+        state.login_start = d.get('login_start', {})
+        state.last_run_id = d['last_run_id']
+        return state
+
+
+class DumpTail:
+    """
+    Строки run dump (словари, как csv.DictReader), начиная со смещения offset в байтах.
+    Читаются только полные строки (с '\\n' в конце): последнюю строку ejudge может еще дописывать.
+    После чтения offset - смещение после последней прочитанной строки.
+    """
+    def __init__(self, file, offset=0):
+        self.file = file
+        self.offset = offset
+        self.header = None      # строка заголовка
+        self.fieldnames = []
+
+    def __iter__(self):
+        with open_binary(self.file) as fh:
+            header = fh.readline()
+            if not header.endswith(b'\n'):
+                return
+            self.header = header.decode('utf8')
+            delimiter, self.fieldnames = sniff_header(self.header)
+            self.offset = max(self.offset, len(header))
+            fh.seek(self.offset)
+            yield from csv.DictReader(self._complete_lines(fh), fieldnames=self.fieldnames, delimiter=delimiter)
+
+    def _complete_lines(self, fh):
+        for line in fh:
+            if not line.endswith(b'\n'):
+                break
+            self.offset += len(line)
+            yield line.decode('utf8')
+
+
+class Checkpoint:
+    """
+    Файл с сохраненным состоянием подсчета одного контеста.
+    checkpoint = Checkpoint(path)
+    state, offset = checkpoint.load(file, settings)
+    ...
+    checkpoint.save(file, tail, settings, state)
+    """
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+
+    def __repr__(self):
+        return f'Checkpoint({self.path})'
+
+    def load(self, file, settings):
+        """
+        Состояние подсчета и смещение в файле данных, с которого надо продолжить.
+        Если checkpoint нет или он не подходит к файлу данных и настройкам - пустое состояние и смещение 0.
+        :param file: файл данных
+        :param settings: словарь настроек подсчета, при их изменении checkpoint не используется
+        :return: (FilterState, offset)
+        """
+        try:
+            with open(self.path, encoding='utf8') as fh:
+                cp = json.load(fh)
+        except FileNotFoundError:
+            return FilterState(), 0
+        except (OSError, ValueError) as e:
+            logging.warning(f'checkpoint {self.path} is broken ({e}), process {file} from the beginning')
+            return FilterState(), 0
+
+        source = cp.get('source', {})
+        reason = None
+        if cp.get('version') != CHECKPOINT_VERSION:
+            reason = 'old checkpoint version'
+        elif cp.get('settings') != settings:
+            reason = 'config has been changed'
+        elif source.get('path') != str(pathlib.Path(file).resolve()):
+            reason = 'other data file'
+        elif not self._same_source(file, source):
+            reason = 'data file has been rewritten'
+        if reason is not None:
+            logging.info(f'checkpoint {self.path} is not used: {reason}, process {file} from the beginning')
+            return FilterState(), 0
+
+        state = FilterState.from_dict(cp['state'])
+        logging.info(f'checkpoint {self.path}: continue {file} after Run_Id {state.last_run_id}')
+        return state, source['offset']
+
+    def save(self, file, tail:DumpTail, settings, state:FilterState):
+        """
+        Сохраняет состояние подсчета после чтения файла данных file до tail.offset
+        """
+        tail_bytes = b''
+        if not is_compressed(file):
+            with open_binary(file) as fh:
+                fh.seek(max(tail.offset - TAIL_SIZE, 0))
+                tail_bytes = fh.read(min(tail.offset, TAIL_SIZE))
+        cp = {
+            'version': CHECKPOINT_VERSION,
+            'settings': settings,
+            'source': {
+                'path': str(pathlib.Path(file).resolve()),
+                'header': tail.header,
+                'offset': tail.offset,
+                'tail': tail_bytes.hex(),
+                'raw': Checkpoint._raw_stat(file),
+            },
+            'state': state.to_dict(),
+        }
+        tmp = self.path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp, 'w', encoding='utf8') as fh:
+            json.dump(cp, fh, ensure_ascii=False)
+        os.replace(tmp, self.path)
+        logging.info(f'checkpoint {self.path}: {file} is processed up to Run_Id {state.last_run_id}')
+
+    @staticmethod
+    def _raw_stat(file):
+        """
+        Размер и время изменения сжатого файла данных, None - файл не сжат
+        """
+        if not is_compressed(file):
+            return None
+        st = os.stat(file)
+        return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+    @staticmethod
+    def _same_source(file, source):
+        """
+        Файл данных до сохраненного смещения не менялся, сжатый файл - не менялся совсем
+        """
+        if is_compressed(file):
+            try:
+                return source.get('raw') is not None and Checkpoint._raw_stat(file) == source['raw']
+            except OSError:
+                return False
+        return Checkpoint._same_head(file, source)
+
+    @staticmethod
+    def _same_head(file, source):
+        """
+        Файл данных до сохраненного смещения не менялся: тот же заголовок и те же байты перед смещением
+        """
+        offset = source.get('offset', 0)
+        try:
+            with open_binary(file) as fh:
+                header = fh.readline().decode('utf8')
+                fh.seek(0, os.SEEK_END)
+                if header != source.get('header') or fh.tell() < offset:
+                    return False
+                fh.seek(max(offset - TAIL_SIZE, 0))
+                return fh.read(min(offset, TAIL_SIZE)).hex() == source.get('tail')
+        except (OSError, UnicodeDecodeError):
+            return False
@@ -0,0 +1,111 @@
+import re
+
+"""
+Определение группы студента по посылке. Строится один раз на контест по конфигу:
+* login_list - словарь {login: group} из csv файла Group;Login,
+* group_regex - регулярное выражение по User_Name, например 'Б\\d\\d-(\\d{3})' для 'Иванов Иван Б04-905' -> '905',
+* login_prefix и login_group_len - группа идет в логине сразу после префикса; префиксов может быть несколько
+  (список), они проверяются одним проходом по дереву префиксов, берется самый длинный подходящий.
+Если в файле данных есть колонка Group, группа берется из нее, resolver не нужен.
+
+Результат запоминается для каждого логина: один и тот же логин встречается в сотнях посылок.
+
+resolver = GroupResolver.from_config(cfg, logins)
+resolver('ed95070507')                          # '705'
+resolver('ed95070507', 'Иванов Иван Б04-905')   # с group_regex нужно еще имя пользователя
+"""
+
+PREFIX_END = ''     # ключ в узле дерева префиксов: здесь заканчивается префикс
+
+
+class GroupResolver:
+    def __init__(self, logins=None, login_prefix='ed', login_group_len=3, group_regex=None):
+        """
+        :param logins: {login: group} или None
+        :param login_prefix: префикс логина или список префиксов
+        :param login_group_len: сколько символов после префикса идентифицируют группу
+        :param group_regex: регулярное выражение по User_Name, группа - первая скобка (или все совпадение)
+        """
+        self.logins = logins
+        self.prefixes = [login_prefix] if isinstance(login_prefix, str) else list(login_prefix)
+        self.login_group_len = login_group_len
+        self.regex = re.compile(group_regex) if group_regex else None
+        self.trie = GroupResolver.build_trie(self.prefixes)
+        self.groups = {}        # login: group, уже определенные группы
+
+    def __repr__(self):
+        if self.logins:
+            return f'GroupResolver(login_list of {len(self.logins)} logins)'
+        if self.regex is not None:
+            return f'GroupResolver(group_regex={self.regex.pattern!r})'
+        return f'GroupResolver(login_prefix={self.prefixes}, login_group_len={self.login_group_len})'
+
+    @classmethod
+    def from_config(cls, cfg, logins=None):
+        """
+        :param cfg: Params контеста
+        :param logins: прочитанный login_list {login: group} или None
+        """
+        return cls(logins, cfg.login_prefix, cfg.login_group_len, cfg.group_regex)
+
+    @property
+    def columns(self):
+        """
+        Колонки run dump, кроме User_Login, которые нужны для определения группы
+        """
+        return ('User_Name',) if self.regex is not None and not self.logins else ()
+
+    def __call__(self, login, name=None):
+        """
+        :param login: логин пользователя
+        :param name: User_Name, нужен только с group_regex
+        :return: group или None, если логин не относится ни к одной группе
+        """
+        try:
+            return self.groups[login]
+        except KeyError:
+            group = self.groups[login] = self.resolve(login, name)
+            return group
+
+    def resolve(self, login, name=None):
+        """
+        Группа логина без запоминания
+        """
+        if self.logins:
+            return self.logins.get(login)
+        if self.regex is not None:
+            m = self.regex.search(name) if name else None
+            if m is None:
+                return None
+            return m.group(1) if self.regex.groups else m.group(0)
+        n = self.match_prefix(login)
+        if n is None:
+            return None
+        return login[n:n + self.login_group_len]
+
+    def match_prefix(self, login):
+        """
+        Длина самого длинного префикса из login_prefix, с которого начинается login, или None
+        """
+        node = self.trie
+        n = 0 if PREFIX_END in node else None
+        for i, c in enumerate(login, 1):
+            node = node.get(c)
+            if node is None:
+                break
+            if PREFIX_END in node:
+                n = i
+        return n
+
+    @staticmethod
+    def build_trie(prefixes):
+        """
+        Дерево префиксов: вложенные словари по символам, PREFIX_END отмечает конец префикса
+        """
+        root = {}
+        for prefix in prefixes:
+            node = root
+            for c in prefix:
+                node = node.setdefault(c, {})
+            node[PREFIX_END] = True
+        return root
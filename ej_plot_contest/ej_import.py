@@ -0,0 +1,99 @@
+#! /usr/bin/python3
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import pathlib
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from ej_plot_contest import flat_contests, contest_name, contest_path, LOG_FORMAT
+from ej_warehouse import Warehouse, contest_key
+
+"""
+Импорт run dump и списков логинов контестов конфига в склад посылок SQLite (см. ej_warehouse.py).
+Файлы, не изменившиеся с прошлого импорта, пропускаются (--force - импортировать все заново).
+
+ej_import.py cfg_2019.json [department] [stage] --db semestr_2019.sqlite
+
+После импорта ej_plot_contest.py с --warehouse (или полем конфига warehouse) считает по базе, не разбирая csv.
+"""
+
+
+def import_contests(contests, config_dir, db, force=False):
+    """
+    Импортирует файлы данных и списки логинов контестов в базу db
+    :param contests: список плоских конфигов контестов
+    :return: количество импортированных файлов данных
+    """
+    imported = 0
+    with contextlib.closing(Warehouse(db)) as warehouse:
+        for config in contests:
+            contest = contest_key(config['department'], config['stage'])
+            file_data = contest_path(config, config_dir, 'file_data')
+            login_list = contest_path(config, config_dir, 'login_list')
+            if force or not warehouse.is_fresh(contest, file_data):
+                warehouse.import_runs(contest, file_data)
+                imported += 1
+            else:
+                logging.info(f'{contest_name(config)}: {file_data} is not changed since the last import')
+            if login_list is not None and (force or not warehouse.is_fresh(contest, login_list, logins=True)):
+                warehouse.import_logins(contest, login_list)
+    return imported
+
+
+def build_parser(prog=None):
+    parser = argparse.ArgumentParser(
+        description='Import run dumps and login lists of contests described into config json into SQLite warehouse',
+        prog=prog,
+        usage=f'\n\t{prog or sys.argv[0]} cfg_2019.json [department] [stage] --db semestr_2019.sqlite',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("config", help="config in json format")
+    parser.add_argument("department", help="Department name in config dictionary", default=None, nargs='?')
+    parser.add_argument("stage", help="stage name in config dictionary", default=None, nargs='?')
+    parser.add_argument("--db", help="SQLite warehouse file, default - warehouse field of config", default=None)
+    parser.add_argument("--force", help="import all files even if they are not changed since the last import",
+                        default=False, action="store_true")
+    parser.add_argument('-v', "--verbose", help="increase verbosity",
+                        action="store_true")
+    return parser
+
+
+def main(argv=None, prog=None):
+    """
+    ej_import.py config [department] [stage] --db warehouse.sqlite
+    :param argv: аргументы командной строки, None - sys.argv[1:]
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format=LOG_FORMAT
+        )
+
+    args = build_parser(prog).parse_args(argv)
+    if args.verbose:
+        logging.getLogger().level = logging.DEBUG
+
+    config_path = pathlib.Path.cwd() / args.config
+    with open(config_path, 'r', encoding='utf8') as read_file:
+        config = json.load(read_file)
+
+    contests = flat_contests(config, args.department, args.stage)
+    if args.db is not None:
+        db = pathlib.Path.cwd() / args.db
+    else:
+        # база из конфига находится так же, как остальные пути конфига
+        dbs = {contest_path(contest, config_path.parent, 'warehouse') for contest in contests}
+        if len(dbs) != 1 or None in dbs:
+            logging.error('specify --db or one warehouse field for all contests of the config')
+            sys.exit(1)
+        db = dbs.pop()
+
+    imported = import_contests(contests, config_path.parent, db, args.force)
+    logging.info(f'{imported} of {len(contests)} contests are imported into {db}')
+
+
+if __name__ == '__main__':
+    main()
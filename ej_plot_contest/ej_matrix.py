@@ -0,0 +1,98 @@
+"""
+Результаты подсчета - плотная матрица количества учтенных посылок: строки - группы, столбцы - задачи.
+
+          | C-DPQE | D-DPQE | F-DPQE |
+    702   |   22   |   10   |    0   |
+    705   |   18   |    7   |    3   |
+
+Матрица заполняется одним bincount по кодам групп и задач закодированных посылок (RunStore, from_codes)
+или из словаря построчного подсчета (from_dict), строка группы, столбец задачи и суммы по всем группам -
+выборки по индексам, а не обход вложенных словарей.
+В матрице только группы и задачи, у которых есть хотя бы одна учтенная посылка, как и в словаре
+{'702': {'C-DPQE': 22, 'D-DPQE': 10}}. Для отсутствующих групп и задач выдаются нули.
+
+Матрица хранится списками строк, numpy нужен только для from_codes: --help, --config_only и --text_only
+обходятся без него.
+"""
+
+
+class CountMatrix:
+    def __init__(self, groups=(), probs=(), counts=None):
+        """
+        :param groups: имена групп - строки матрицы
+        :param probs: полные имена задач - столбцы матрицы
+        :param counts: целочисленная матрица len(groups) x len(probs) (списки строк), None - нули
+        """
+        self.groups = list(groups)
+        self.probs = list(probs)
+        self.group_index = {g: i for i, g in enumerate(self.groups)}
+        self.prob_index = {p: j for j, p in enumerate(self.probs)}
+        if counts is None:
+            counts = [[0] * len(self.probs) for _ in self.groups]
+        self.counts = counts
+        # та же матрица с нулевой строкой и нулевым столбцом в конце: туда смотрят отсутствующие группы и задачи
+        self._padded = [row + [0] for row in counts] + [[0] * (len(self.probs) + 1)]
+        # суммы столбцов по всем группам, матрица после создания не меняется
+        self._sums = [sum(column) for column in zip(*self._padded)]
+
+    def __repr__(self):
+        return f'CountMatrix({self.to_dict()})'
+
+    @classmethod
+    def from_codes(cls, group_codes, prob_codes, groups, probs):
+        """
+        Матрица по кодам групп и задач учтенных посылок
+        :param group_codes: numpy массив кодов групп (индексы в groups), по одному на посылку
+        :param prob_codes: numpy массив кодов задач (индексы в probs)
+        :param groups: имена групп по кодам
+        :param probs: имена задач по кодам
+        """
+        import numpy as np
+        n_probs = len(probs)
+        flat = group_codes.astype(np.int64) * n_probs + prob_codes
+        counts = np.bincount(flat, minlength=len(groups) * n_probs).reshape(len(groups), n_probs)
+        # группы и задачи без учтенных посылок в матрицу не попадают
+        rows = np.flatnonzero(counts.any(axis=1))
+        cols = np.flatnonzero(counts.any(axis=0))
+        return cls([groups[i] for i in rows], [probs[j] for j in cols], counts[np.ix_(rows, cols)].tolist())
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Матрица по словарю {группа: {задача: количество}}
+        """
+        groups = [g for g, probs in data.items() if any(probs.values())]
+        probs = sorted({p for g in groups for p, n in data[g].items() if n})
+        return cls(groups, probs, [[data[g].get(p, 0) for p in probs] for g in groups])
+
+    def to_dict(self):
+        """
+        {группа: {задача: количество}}, только ненулевые
+        """
+        return {g: {p: n for p, n in zip(self.probs, row) if n} for g, row in zip(self.groups, self.counts)}
+
+    def select(self, groups, probs):
+        """
+        Подматрица len(groups) x len(probs) в заданном порядке, нули для отсутствующих групп и задач
+        """
+        rows = [self._padded[self.group_index.get(g, len(self.groups))] for g in groups]
+        cols = [self.prob_index.get(p, len(self.probs)) for p in probs]
+        return [[row[j] for j in cols] for row in rows]
+
+    def row(self, group, probs):
+        """
+        Количества группы group по задачам probs
+        """
+        return self.select([group], probs)[0]
+
+    def column(self, prob, groups):
+        """
+        Количества задачи prob по группам groups
+        """
+        return [row[0] for row in self.select(groups, [prob])]
+
+    def total(self, probs):
+        """
+        Суммы по всем группам матрицы для задач probs
+        """
+        return [self._sums[self.prob_index.get(p, len(self.probs))] for p in probs]
@@ -1,12 +1,29 @@
 import argparse
+import array
+import concurrent.futures
+import contextlib
+import copy
 import datetime
 import csv
+import io
 import json
 import logging
 import os
 import pathlib
 import sys
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'ej_common'))
+from ej_profile import StageProfiler
+from ej_reader import is_compressed, open_table, read_table, sniff_file, STDIN_NAME, KIND_EMPTY, KIND_LOGINS, KIND_STANDINGS
+from ej_cache import RunCache
+from ej_checkpoint import Checkpoint, CheckpointMismatch, DumpTail, FilterState, UnsortedRuns
+from ej_warehouse import Warehouse, contest_key
+from ej_watch import FileWatcher, write_if_changed
+from ej_groups import GroupResolver
+from ej_matrix import CountMatrix
+from ej_stats import FilterStats, COUNTED, NOT_OK, OUT_OF_WINDOW, SKIPPED_INVISIBLE, UNKNOWN_GROUP
+from ej_runs import RunStore, StringTable, CODE_TYPECODE, DUMP_INT_COLUMNS, DUMP_STR_COLUMNS, to_int
 
 """
 Parse dumped runs, get OK statistics: prob_
@@ -76,11 +93,27 @@ class Params:
         self.login_prefix = 'ed'    # как добыть номер группы из логина: префикс и далее длина части, которая идентификатор группы
         self.login_group_len = 3
         self.login_list = None      # группа может быть задана списком в csv файле Group;Login
+        self.group_regex = None     # или регулярным выражением по User_Name, например 'Б\\d\\d-(\\d{3})'
         self._preps = {}            # group from login : prep last name, or build by csv data without prep names
         self._groups = []           # list of groups in preconstructed order
         self.probs = []             # ProblemName list
         self.duration = None        # contest duration, all OK runs after end would be dropped (дорешивание не учитываем)
+        self.contest_start = None   # начало контеста 'YYYY-MM-DD HH:MM' (timestamp после разбора), None - по первой OK посылке
+        self.virtual_start = False  # у каждого логина контест начинается с его первой посылки (виртуальный контест)
         self.statement_table = False     # файл данных содержит не run dumps (False), а таблицу результатов (True)
+        self.stream = False         # читать run dump построчно, не сохраняя посылки в памяти (для stdin и pipe включается само)
+        self.cache = True           # хранить разобранные run dump в кеше на диске, чтобы не разбирать csv каждый запуск
+        self.cache_dir = None       # директория кеша, None - ~/.cache/ejudge_tools
+        self.cache_max_mb = 512     # максимальный размер кеша, старые записи вытесняются
+        self.warehouse = None       # база SQLite со всеми посылками семестра (ejtools.py import), None - читать file_data
+        self.incremental = False    # сохранять состояние подсчета и при следующем запуске читать только новые посылки
+        self.profile = False        # мерять время и память каждой стадии, отчет <department>_<stage>_profile.json
+        self.html = True            # писать таблицы в html (нужен jinja2)
+        self.site_dir = None        # сайт отчетов: страница каждого контеста и index.html, None - не собирать
+        self.plot_jobs = 1          # сколько процессов параллельно рисуют графики одного контеста
+        self.render_profile = 'default'  # default - графики как раньше, fast - фиксированная разметка, быстрее
+        self.plot_dpi = None        # dpi файлов графиков, None - из профиля
+        self.plot_format = None     # png или svg, None - из профиля
 
     def verify(self):
         """
@@ -144,6 +177,8 @@ class Params:
         if p.duration is not None:
             t = datetime.datetime.strptime(p.duration, '%H:%M')
             p.duration = datetime.timedelta(hours=t.hour, minutes=t.minute)
+        if p.contest_start is not None:
+            p.contest_start = datetime.datetime.strptime(p.contest_start, '%Y-%m-%d %H:%M').timestamp()
 
         logging.debug(p)
 
@@ -154,8 +189,12 @@ class Params:
         # меняем директорию, относительно которой будет разбирать пути
         p.base_dir = p.resolve_path(p.dir)
         # и определяем где лежат входные файлы
-        p.file_data = p.resolve_path(p.file_data)
+        if p.file_data != STDIN_NAME:
+            p.file_data = p.resolve_path(p.file_data)
         p.login_list = p.resolve_path(p.login_list)
+        p.cache_dir = p.resolve_path(p.cache_dir)
+        p.warehouse = p.resolve_path(p.warehouse)
+        p.site_dir = p.resolve_path(p.site_dir)
 
         # результаты конкретного факультета и контрольной - отдельно от данных
         p.output_dir = p.resolve_path(p.output_dir)
@@ -181,12 +220,22 @@ class Params:
 
 
 class Data:
-    def __init__(self, config:Params):
+    # поля посылки, которые получает fiter_data, в этом порядке
+    RUN_FIELDS = ('User_Login', 'Group', 'Prob', 'Stat_Short', 'Time', 'User_Inv')
+    # считать RunStore масками numpy (fiter_runs), а не построчно (fiter_data): только для графиков,
+    # matplotlib все равно импортирует numpy, а --text_only обходится без него
+    VECTORIZED = False
+
+    def __init__(self, config:Params, profiler:StageProfiler=None):
         """
         Читаем данные из csv файла данных config.file_data, фильтруем из них только нужные и их подсчитываем
         :param config: параметры конфигурации
+        :param profiler: куда записывать время и память стадий, None - не мерять
         """
         self.cfg = config
+        self.profiler = profiler if profiler is not None else StageProfiler(enabled=False)
+        profiler = self.profiler
+        self.filter_stats = FilterStats()   # счетчики учтенных и пропущенных посылок последнего fiter_data
 
         # раньше были аргументами, теперь лежат в конфиге
         csv_file = config.file_data
@@ -196,41 +245,96 @@ class Data:
 
         # результирующий файл для таблицы - имя файла данных с расширением csv в директории результататов
 
-        # читаем cvs файл
-        runs = Data.get_data(csv_file)
-        logging.debug((runs))
-        self.logins = Data.get_login_list(login_csv_file) if login_csv_file else None
+        self.logins = self.read_login_list(login_csv_file) if login_csv_file else None
+        self.resolver = GroupResolver.from_config(config, self.logins)     # группа по логину, один раз на логин
         self.groups = self.cfg.groups    # {'705': 'Иванов', '702':'Петров'}
 
+        # вид файла определяем по заголовку, таблицу результатов можно не указывать в конфиге
+        if not statement_table and not Data.is_stream(csv_file) and sniff_file(csv_file).kind == KIND_STANDINGS:
+            logging.info(f'{csv_file} looks like standings table, process it as statement_table')
+            statement_table = True
+
         if statement_table:
             # это statement table, где задача считается НЕ решеной, если у нее нет или 0 баллов.
             # Иначе - решена, поэтому ручками вытрите неполные решения, если не хотите их учитыватьd
-            data, totals = self.parse_statement_table(runs)
+            with profiler.stage('read') as st:
+                runs = Data.get_data(csv_file, statement_table, self.cfg.probs)
+                st['rows'] = len(runs)
+            logging.debug(runs)
+            with profiler.stage('filter', rows=len(runs)):
+                data, totals = self.parse_statement_table(runs)
+        elif self.cfg.warehouse is not None and not Data.is_stream(csv_file):
+            # посылки уже в базе SQLite, подсчет - агрегатные запросы; измененный файл данных импортируется заново
+            with profiler.stage('read+filter', warehouse=str(self.cfg.warehouse)):
+                data, totals = self.fiter_warehouse(csv_file, duration)
+        elif self.cfg.stream or Data.is_stream(csv_file):
+            # runs dump читаем построчно и сразу считаем, в памяти остаются только результаты подсчета;
+            # окно контеста из посылок файла ищется отдельным проходом, stdin и pipe второй раз не прочитать
+            with profiler.stage('read+filter') as st:
+                state = None if Data.is_stream(csv_file) else self.window_state(self.stream_runs(csv_file), duration)
+                data, totals = self.fiter_data(profiler.counted(self.stream_runs(csv_file), st), duration,
+                                               state=state)
+        elif self.cfg.incremental:
+            # продолжаем подсчет с сохраненного состояния, читаем только посылки, добавленные после прошлого запуска
+            with profiler.stage('read+filter', incremental=True):
+                data, totals = self.fiter_incremental(csv_file, duration)
         else:
             # runs dump in csv format with logins list if needed
+            # читаем cvs файл в колоночное хранилище
 
             # учитываем только ОК посылки от логинов, которые содержат номера групп по маске, для всех задач
             # так же подсчитывается количество студентов в группе (по количеству логинов, которые посылали успешно задачи)
-            data, totals = self.fiter_data(runs, duration)
-
-        self.data = data            # {'702': {'A":22, 'C-DPQE':20, 'Cmem-DPQE':18, 'D-DPQE':10}} - сколько успешных решений задач
+            with profiler.stage('read') as st:
+                runs = self.load_runs(csv_file)
+                st['rows'] = len(runs)
+            logging.debug(runs)
+            with profiler.stage('filter', rows=len(runs)):
+                self.encode_groups(runs)
+                if self.VECTORIZED:
+                    data, totals = self.fiter_runs(runs, duration)
+                else:
+                    state = self.window_state(runs.rows(*Data.RUN_FIELDS), duration)
+                    data, totals = self.fiter_data(runs.rows(*Data.RUN_FIELDS), duration, state=state)
+
+        # сколько успешных решений задач: матрица группы x задачи
+        self.matrix = data if isinstance(data, CountMatrix) else CountMatrix.from_dict(data)
         logging.debug(f'groups in original order: {self.cfg.groups}')
-        logging.debug(f'data: {self.data}')
+        logging.debug(f'data: {self.matrix}')
 
         # количество студентов в группе считаем или по списку логинов, или по посылкам (total)
         # сколько человек в каждой группе {'702': 20, '319':17}
-        if self.logins is not None:
-            self.totals = self.count_totals_by_login_list()
-        else:
-            self.totals = self.count_totals_by_runs(totals)
-
+        with profiler.stage('totals'):
+            if self.logins is not None:
+                self.totals = self.count_totals_by_login_list()
+            else:
+                self.totals = self.count_totals_by_runs(totals)
 
-        # оставляем только те названия задач, что реально существуют и интересны нам
-        # если фильтр задач в конфигурации указан пустой, то считаем все задачи
-        self.headers = self.get_counted_probs(data)     # реальные имена задач, в порядке, заданном в фильтре
+            # оставляем только те названия задач, что реально существуют и интересны нам
+            # если фильтр задач в конфигурации указан пустой, то считаем все задачи
+            self.headers = self.get_counted_probs(self.data)    # реальные имена задач, в порядке, заданном в фильтре
         logging.debug(f'real counted prob names {self.headers}')
 
 
+    def with_config(self, config:Params):
+        """
+        Те же подсчитанные данные с другой конфигурацией вывода (фильтр задач, output_dir).
+        Файл данных заново не читается: подсчитаны все задачи, фильтр задач применяется только к заголовкам.
+        :param config: параметры конфигурации нового вида
+        :return: копия Data (того же класса), разделяющая с self подсчитанные данные
+        """
+        view = copy.copy(self)
+        view.cfg = config
+        view.headers = view.get_counted_probs(view.data)
+        logging.debug(f'real counted prob names {view.headers}')
+        return view
+
+    @property
+    def data(self):
+        """
+        {'702': {'A":22, 'C-DPQE':20, 'Cmem-DPQE':18, 'D-DPQE':10}} - сколько успешных решений задач
+        """
+        return self.matrix.to_dict()
+
     def data_group(self, group, get_student_numbers=True, add_percentes=False):
         """
         возвращает список данных: [количество_студентов_в_группе, количество_ок_задачи1, .. количество_ок_задачиN]
@@ -240,13 +344,20 @@ class Data:
         :param add_percentes: добавить данные по % соотношению решивших данные задачи к общему количеству студентов в группе
         :return: [количество_студентов_в_группе, количество_ок_задачи1, .. количество_ок_задачиN]
         """
-        d = [self.data.get(group, {}).get(prob.fullname, 0) for prob in self.headers]
-        x0 = self.totals[group]
+        d = self.matrix.row(group, [prob.fullname for prob in self.headers])
+        x0 = self.totals.get(group, 0)     # в группе может не быть ни одной посылки (или файл данных пустой)
+        return Data.with_totals(d, x0, get_student_numbers, add_percentes)
 
-        if add_percentes:
-            d += [int(x * 100 / x0) for x in d]
+    def data_groups(self, groups, get_student_numbers=True):
+        """
+        Матрица данных по группам groups (список строк data_group) одной выборкой
+        :param groups: названия (номера) групп в нужном порядке
+        :param get_student_numbers: первым столбцом - количество студентов в группе
+        :return: [[количество_студентов_в_группе, количество_ок_задачи1, .. количество_ок_задачиN], ...]
+        """
+        d = self.matrix.select(groups, [prob.fullname for prob in self.headers])
         if get_student_numbers:
-            d.insert(0, x0)
+            d = [[self.totals.get(g, 0)] + row for g, row in zip(groups, d)]
         return d
 
     def data_group_all(self, get_student_numbers=True, add_percentes=False):
@@ -257,14 +368,23 @@ class Data:
         :param add_percentes: добавить данные по % соотношению решивших данные задачи к общему количеству студентов в группах
         :return: [количество_студентов_в_группах, количество_ок_задачи1, .. количество_ок_задачиN]
         """
-        d = [ sum([gr_data.get(prob.fullname, 0)  for gr_data in self.data.values()]) for prob in self.headers]
+        d = self.matrix.total([prob.fullname for prob in self.headers])
         x0 = sum(self.totals.values())
+        return Data.with_totals(d, x0, get_student_numbers, add_percentes)
 
+    @staticmethod
+    def with_totals(d, x0, get_student_numbers=True, add_percentes=False):
+        """
+        Список [x0, d..., % d от x0...] из строки матрицы d
+        :param d: количества по задачам
+        :param x0: количество студентов
+        """
+        res = list(d)
         if add_percentes:
-            d += [int(x * 100 / x0) for x in d]
+            res += [x * 100 // x0 for x in d] if x0 else [0] * len(res)
         if get_student_numbers:
-            d.insert(0, x0)
-        return d
+            res.insert(0, x0)
+        return res
 
     def data_prob(self, prob:ProblemName):
         """
@@ -272,97 +392,245 @@ class Data:
         :param prob: задача
         :return:
         """
-        return [self.data.get(g, {}).get(prob.fullname, 0) for g in self.groups]
+        return self.matrix.column(prob.fullname, self.groups)
 
     @staticmethod
     def read_csv_file(file, delimiter=None):
         """
-        Read csv file and return list of OrderedDict
+        Read csv file and return list of dict
         file with data:
         A;B;C
         1;2;3
         parse as
-        OrderedDict([('A', '1'), ('B', '2'), ('C', '3')])
-        OrderedDict([('A', '10'), ('B', '20'), ('C', '30')])
+        {'A': '1', 'B': '2', 'C': '3'}
+        {'A': '10', 'B': '20', 'C': '30'}
 
         :param file: filename
-        :param delimiter: None - try to use delimiter , or ; (good delimiter has 1+ columns)
-        :return: list of OrderedDict
+        :param delimiter: None - delimiter , or ; is detected by header line
+        :return: list of dict
         """
-        if delimiter is None:       # try delimiters ; and ,
-            delimiter = [';', ',']
-        else:
-            delimiter = [delimiter]
+        return read_table(file, delimiter)
 
-        for delim in delimiter:
-            with open(file, encoding="utf8") as fh:
-                rd = csv.DictReader(fh, delimiter=delim)
-                runs = [dict(row) for row in rd]
-                if len(runs[0].keys()) > 1:
-                    logging.debug('Read csv data:')
-                    logging.debug(runs)
-                    return runs
+    @staticmethod
+    def get_data(file, statement_table=False, probs=(), delimiter=None, columns=()):
+        """
+        Читает csv файл в колоночное хранилище RunStore, сохраняются только нужные для подсчета колонки.
+        Разделитель определяется по заголовку, файл разбирается один раз.
+        :param file: filename
+        :param statement_table: файл - таблица результатов (True) или run dump (False)
+        :param probs: [ProblemName] - для таблицы результатов берем только колонки этих задач
+        :param delimiter: None - определить по заголовку
+        :param columns: дополнительные строковые колонки run dump (например, User_Name для group_regex)
+        :return: RunStore
+        """
+        with open_table(file, delimiter) as table:
+            header = table.fieldnames
+            if table.kind == KIND_EMPTY:
+                logging.warning(f'{file} is empty')
+            if statement_table:
+                str_columns = [name for name in ('Group', 'Login', 'User') if name in header]
+                titles = {t for prob in probs for t in (prob.label, prob.fullname)}
+                int_columns = [name for name in header if name in titles]
+                return RunStore.from_rows(table, str_columns, int_columns)
+
+            str_columns = list(DUMP_STR_COLUMNS) + [name for name in columns if name in header]
+            if 'Group' in header:
+                str_columns.append('Group')
+            # только нужные колонки, строки сразу кодами: run dump с ';' разбирается без csv.DictReader.
+            # Условий where (статус, префикс логина) нет: не OK посылки и чужие логины нужны для подсчета
+            # логинов групп (enroll) и FilterStats, а RunStore в кеше общий для всех конфигов этого файла
+            runs = RunStore(str_columns, DUMP_INT_COLUMNS)
+            runs.extend_columns(table.select_columns(str_columns, DUMP_INT_COLUMNS, tables=runs.tables))
+            return runs
+
+    def load_runs(self, file):
+        """
+        Читает run dump в RunStore: из кеша, если файл данных не менялся, иначе разбирает csv и сохраняет в кеш
+        :param file: filename
+        :return: RunStore
+        """
+        if not self.cfg.cache:
+            return Data.get_data(file, columns=self.resolver.columns)
 
+        cache = RunCache(self.cfg.cache_dir, self.cfg.cache_max_mb * 2**20)
+        runs = cache.load(file, DUMP_STR_COLUMNS + DUMP_INT_COLUMNS + self.resolver.columns)
+        if runs is None:
+            runs = Data.get_data(file, columns=self.resolver.columns)
+            try:
+                cache.save(file, runs)
+            except OSError as e:
+                logging.warning(f'can not save runs of {file} into cache: {e}')
+        return runs
 
     @staticmethod
-    def get_data(file, delimiter=';'):
-        return Data.read_csv_file(file, delimiter)
+    def is_stream(file):
+        """
+        Файл данных нельзя прочитать второй раз: stdin или named pipe
+        """
+        return str(file) == STDIN_NAME or pathlib.Path(file).is_fifo()
+
+    def stream_runs(self, file, delimiter=None):
+        """
+        Читает run dump построчно и выдает кортежи полей Data.RUN_FIELDS, посылки в памяти не сохраняются.
+        Группа вычисляется один раз на каждый разный логин.
+        :param file: filename, named pipe или '-' для stdin
+        :param delimiter: None - определить по заголовку
+        """
+        with open_table(file, delimiter) as table:
+            yield from self.run_fields(table, 'Group' in table.fieldnames)
+
+    def run_fields(self, rows, has_group=False):
+        """
+        Кортежи полей Data.RUN_FIELDS из строк run dump (словарей csv.DictReader).
+        Группа вычисляется один раз на каждый разный логин.
+        :param has_group: в строках есть колонка Group, None - определить по первой строке
+        """
+        resolver = self.resolver
+        need_name = bool(resolver.columns)
+        for r in rows:
+            if has_group is None:
+                has_group = 'Group' in r
+            login = r['User_Login']
+            if has_group:
+                group = r['Group']
+            else:
+                group = resolver(login, r['User_Name'] if need_name else None)
+            yield login, group, r['Prob'], r['Stat_Short'], to_int(r['Time']), r['User_Inv']
+
+    def checkpoint_settings(self, contest_duration=None, counted_status='OK'):
+        """
+        Настройки, от которых зависит подсчет посылок: при их изменении сохраненное состояние не годится
+        """
+        login_list = self.cfg.login_list
+        return {
+            'login_prefix': self.cfg.login_prefix,
+            'login_group_len': self.cfg.login_group_len,
+            'group_regex': self.cfg.group_regex,
+            'login_list': str(login_list) if login_list else None,
+            'login_list_mtime_ns': os.stat(login_list).st_mtime_ns if login_list else None,
+            'duration': contest_duration.total_seconds() if contest_duration is not None else None,
+            'contest_start': self.cfg.contest_start,
+            'virtual_start': self.cfg.virtual_start,
+            'counted_status': counted_status,
+        }
+
+    def fiter_incremental(self, file, contest_duration=None, counted_status='OK'):
+        """
+        Как fiter_data, но состояние подсчета сохраняется в checkpoint в output_dir, и следующий запуск
+        читает только посылки, дописанные в run dump после прошлого запуска.
+        Если файл данных переписан или поменялись настройки подсчета - файл обрабатывается целиком.
+        :param file: filename run dump
+        """
+        checkpoint = Checkpoint(self.cfg.output_dir / f'{self.cfg.department}_{self.cfg.stage}.checkpoint.json')
+        settings = self.checkpoint_settings(contest_duration, counted_status)
+        state, offset = checkpoint.load(file, settings)
+        if offset and is_compressed(file):
+            # checkpoint подошел, значит сжатый файл не менялся: новых посылок нет, распаковывать его незачем
+            return state.data, state.total
+        try:
+            tail = self.fiter_tail(file, offset, state, contest_duration, counted_status)
+        except CheckpointMismatch as e:
+            logging.info(f'{checkpoint}: {e}, process {file} from the beginning')
+            state = FilterState()
+            tail = self.fiter_tail(file, 0, state, contest_duration, counted_status)
+        if tail.header is not None:
+            checkpoint.save(file, tail, settings, state)
+        return state.data, state.total
+
+    def fiter_tail(self, file, offset, state:FilterState, contest_duration=None, counted_status='OK'):
+        """
+        Продолжает подсчет state посылками run dump, начиная со смещения offset.
+        С начала файла окно контеста ищется отдельным проходом (window_state), продолжение подсчета
+        с посылкой раньше начала окна - UnsortedRuns, и файл обрабатывается целиком.
+        :return: DumpTail, прочитанный до конца последней полной строки
+        """
+        if offset == 0:
+            self.window_state(self.run_fields(DumpTail(file), None), contest_duration, counted_status, state)
+        tail = DumpTail(file, offset)
+        last_run_id = state.last_run_id
+
+        def new_rows():
+            # Run_Id только растет: если первая новая посылка не новее последней обработанной, файл переписан
+            for i, r in enumerate(tail):
+                run_id = to_int(r['Run_Id'])
+                if i == 0 and last_run_id is not None and run_id <= last_run_id:
+                    raise CheckpointMismatch(f'Run_Id {run_id} after Run_Id {last_run_id}')
+                state.last_run_id = run_id
+                yield r
+
+        # заголовок DumpTail читает только при переборе строк, поэтому колонку Group ищем в первой строке
+        self.fiter_data(self.run_fields(new_rows(), None), contest_duration, counted_status, state)
+        return tail
 
     @staticmethod
     def get_login_list(file):
-        data = Data.read_csv_file(file)
+        data = read_table(file, kind=KIND_LOGINS)
         return {r['Login']:r['Group'] for r in data}
 
+    def read_login_list(self, file):
+        """
+        Список логинов {login: group}. Со складом посылок (config.warehouse) - из базы, по нему группы определяет
+        и fiter_warehouse; файл, измененный после импорта, импортируется заново.
+        :param file: csv файл списка логинов
+        """
+        if self.cfg.warehouse is None:
+            return Data.get_login_list(file)
+        contest = contest_key(self.cfg.department, self.cfg.stage)
+        with contextlib.closing(Warehouse(self.cfg.warehouse)) as warehouse:
+            if not warehouse.is_fresh(contest, file, logins=True):
+                warehouse.import_logins(contest, file)
+            return warehouse.logins(contest)
+
     def parse_statement_table(self, runs):
         """
-        Даны runs -  прочитанная statement table в формате csv, из которых нужно сделать
+        Даны runs -  прочитанная statement table в RunStore, из которой нужно сделать
         total[group1] - how many different logins in this group
         считаем у сколькоих пользователей из group1 за задачу D- очки >0 в d['group1']['D-']
 
-        :param runs:
+        :param runs: RunStore
         :return: data, totals
         """
-        print(runs)
         d = {}
         total = {gr:0 for gr in self.groups}
-        for r in runs:
-            group = self.get_group(r)
+        if 'Group' in runs:
+            groups = runs.decoded('Group')
+        else:
+            login_column = 'Login' if 'Login' in runs else 'User'
+            groups = map(self.get_group, runs.decoded(login_column))
+
+        # колонки очков каждой задачи, задача может называться в таблице и label, и fullname
+        scores = [(prob, [runs.column(t) for t in (prob.label, prob.fullname) if t in runs]) for prob in self.cfg.probs]
+
+        for i, group in enumerate(groups):
             if group not in total:
                 logging.warning(f'group {group} has not been counted')
                 continue
             total[group] += 1
-            for prob in self.cfg.probs:
-                score = self.get_score(r, prob)
-                # logging.debug(f"score={score} prob={prob} r={r}")
-                if  score > 0:
+            for prob, columns in scores:
+                if self.get_score(columns, i) > 0:
                     self.count(d, group, prob.fullname)
 
-        print(d)
+        logging.debug(f'statement table: {d}')
         return d, total
 
-    def get_score(self, r, prob):
+    @staticmethod
+    def get_score(columns, i):
         """
         При разборе standing table возвращаем очки в виде int (если было пусто, возвращаем 0, если проблемы нет, возвращаем 0)
-        :param r:
-        :param prob:
+        :param columns: колонки очков задачи (по label и по fullname)
+        :param i: номер строки таблицы
         :return:
         """
-        titles = [prob.label, prob.fullname]
-        for p in titles:
-            score = r.get(p)
-            if score is None:
-                continue
-            try:
-                score = int(score)
-            except ValueError:
-                score = 0
+        for col in columns:
+            score = col[i]
             if score > 0:
                 return score
 
         return 0
 
 
-    def fiter_data(self, runs, contest_duration=None, counted_status='OK'):
+    def fiter_data(self, runs, contest_duration=None, counted_status='OK', state:FilterState=None,
+                   stats:FilterStats=None):
         """
         Create table:
         login_group \ prob | D- | F- | E- | E_mem- |
@@ -373,34 +641,45 @@ class Data:
         total              | cdt| cft| cet| cememt | сумма по всем группам
         as d['group1']['D-']
         and total[group1] - how many different logins in this group1 with any results for any problems - сколько всего человек в группе, нужно будет для подсчета % справившихся с задачей
+        :param runs: итератор кортежей полей Data.RUN_FIELDS: RunStore.rows(*Data.RUN_FIELDS) или Data.stream_runs(file)
+        :param state: FilterState - продолжить подсчет с этого состояния (оно обновляется), None - начать с нуля
+        :param stats: FilterStats - счетчики учтенных и пропущенных посылок, None - новые (будут в self.filter_stats)
+        Начало контеста, как у fiter_runs, - самая ранняя посылка: его заранее находит window_state, иначе начало -
+        первая посылка, и посылка раньше нее - UnsortedRuns (учтенные посылки не хранятся, сдвинуть окно нельзя).
         """
-        d1 = {}         # данные
-        total = {}      # для подсчета разных логинов в группе total[group] = [login1, login2, ... loginN]
-        contest_start_timestamp = None   # contest start, datetime
-        contest_end_timestamp = None     # contest end, datetime
-        for r in runs:
-            login = r['User_Login']
-            prob = r['Prob']
-            result = r['Stat_Short']
-            timestamp = r['Time']
-            user_invis = r['User_Inv']
-            logging.debug(f'raw data (data): {login} ??? {prob} {result} {timestamp}')
-            logging.debug('User_Inv=[{user_invis}]')
+        if state is None:
+            state = FilterState()
+        if stats is None:
+            stats = FilterStats()
+        self.filter_stats = stats
+        d1 = state.data         # данные
+        total = state.total     # для подсчета разных логинов в группе total[group] = [login1, login2, ... loginN]
+        # на каждую посылку в лог не пишем, только считаем, сводка - одна строка в конце
+        skip = stats.add
+        virtual_start = self.cfg.virtual_start and contest_duration is not None
+        for login, group, prob, result, timestamp, user_invis in runs:
             if user_invis:
-                logging.warning(f'Invisible user {login} ... skipped')
+                stats.invisible_logins.add(login)
+                skip(SKIPPED_INVISIBLE, group, prob)
                 continue
 
-            # номер группы достаем или из списка посылок или из списка логин-группа или из логина по маске
-            group = self.get_group(r, login)
-
             if group is None or group == '0':
+                skip(UNKNOWN_GROUP, None, prob)
                 continue
-            logging.debug(f'filter data (data): {login} {group} {prob} {result}')
 
             # учитываем очередной логин в группе (будем смотреть сколько в ней разных логинов), посылки могут быть не ОК
             Data.enroll(total, login, group)
+            if virtual_start:
+                # виртуальный контест логина начинается с его самой ранней посылки
+                start = state.login_start.get(login)
+                if start is None:
+                    state.login_start[login] = timestamp
+                elif timestamp < start:
+                    raise UnsortedRuns(f'run of {login} at {timestamp} is earlier than the start of '
+                                       f'its virtual contest {start}: runs are not sorted by Time')
 
             if result != counted_status:
+                skip(NOT_OK, group, prob)
                 continue
 
             #if user_invis:
@@ -412,35 +691,228 @@ class Data:
             # если длительность не указана, считаем посылки (с правильным логином и группой)
             if contest_duration is None:
                 Data.count(d1, group, prob)
+                skip(COUNTED, group, prob)
                 continue
 
-            # первая ОК посылка от правильного логина становится началом отсчета длительности
-            if contest_end_timestamp is None:
-                contest_start_timestamp = int(timestamp)
-                contest_end_timestamp = datetime.datetime.fromtimestamp(contest_start_timestamp) + contest_duration
-                contest_end_timestamp = contest_end_timestamp.timestamp()
-            # учитываются посылки во время турнира (а не до него или при дорешивании)
-            if contest_start_timestamp <= int(timestamp) <= contest_end_timestamp:
+            if virtual_start:
+                start = state.login_start[login]
+                in_window = start <= timestamp <= start + contest_duration.total_seconds()
+            else:
+                # начало из конфига или самая ранняя ОК посылка от правильного логина
+                if state.contest_end is None:
+                    state.contest_start = timestamp if self.cfg.contest_start is None else self.cfg.contest_start
+                    state.contest_end = Data.contest_end(state.contest_start, contest_duration)
+                elif timestamp < state.contest_start and self.cfg.contest_start is None:
+                    raise UnsortedRuns(f'OK run at {timestamp} is earlier than the contest start '
+                                       f'{state.contest_start}: runs are not sorted by Time')
+                # учитываются посылки во время турнира (а не до него или при дорешивании)
+                in_window = state.contest_start <= timestamp <= state.contest_end
+            if in_window:
                 Data.count(d1, group, prob)
+                skip(COUNTED, group, prob)
             else:
-                logging.warning(f"Out of date: {group} {prob} {timestamp}")
-            # logging.debug(f'filter data (total): {total}')
+                skip(OUT_OF_WINDOW, group, prob)
+        stats.log_summary()
         return d1, total        # это total по посылкам, его могут потом игнорировать, если считать будем по списку логинов
 
-    def get_group(self, r, login=None):
+    def window_state(self, runs, contest_duration=None, counted_status='OK', state:FilterState=None):
         """
-        Достает номер группы или из поля Group записи r, или по логину из списка логинов или по маске из логина
-        :param r: - прочитанная запись из cvs файла
-        :param login: - если уже найден логин для этой записи, передать его (run dump, поле Login, в standing table этого поля нет
-        :return: group
+        Первый проход для fiter_data: начало окна контеста, если оно берется из посылок, - самая ранняя ОК посылка
+        от правильного логина, с virtual_start - самая ранняя посылка каждого логина. В памяти - только начала.
+        :param runs: итератор кортежей полей Data.RUN_FIELDS, без окна из посылок не читается
+        :param state: FilterState, в который записать начало, None - новый
+        :return: state
         """
-        if 'Group' in r.keys():
-            group = r['Group']
-        elif self.logins:
-            group = self.logins[login]
-        else:
-            group = r.get('Group', self.extract_group(login))
-        return group
+        if state is None:
+            state = FilterState()
+        if contest_duration is None or not self.cfg.virtual_start and self.cfg.contest_start is not None:
+            return state
+        for login, group, prob, result, timestamp, user_invis in runs:
+            if user_invis or group is None or group == '0':
+                continue
+            if self.cfg.virtual_start:
+                start = state.login_start.get(login)
+                if start is None or timestamp < start:
+                    state.login_start[login] = timestamp
+            elif result == counted_status and (state.contest_start is None or timestamp < state.contest_start):
+                state.contest_start = timestamp
+        if state.contest_start is not None:
+            state.contest_end = Data.contest_end(state.contest_start, contest_duration)
+        return state
+
+    def fiter_runs(self, runs, contest_duration=None, counted_status='OK', stats:FilterStats=None):
+        """
+        То же, что fiter_data, но для всего RunStore сразу: условия fiter_data считаются масками по закодированным
+        колонкам, учтенные посылки раскладываются по группам и задачам одним bincount.
+        :param runs: RunStore с колонкой Group (Data.encode_groups)
+        :param stats: FilterStats - счетчики учтенных и пропущенных посылок, None - новые (будут в self.filter_stats)
+        :return: CountMatrix, total - {группа: {логины}}
+        """
+        import numpy as np
+        if stats is None:
+            stats = FilterStats()
+        self.filter_stats = stats
+
+        def codes(name):
+            return np.frombuffer(runs.column(name), dtype=runs.column(name).typecode)
+
+        def lookup(name, predicate):
+            # значение predicate для каждой посылки: по таблице строк колонки, а не по каждой строке
+            return np.array([predicate(v) for v in runs.table(name).values], dtype=bool)[codes(name)]
+
+        logins, groups, probs = (runs.table(name) for name in ('User_Login', 'Group', 'Prob'))
+        login, group, prob = codes('User_Login'), codes('Group'), codes('Prob')
+        timestamp = codes('Time')
+
+        invisible = lookup('User_Inv', bool)
+        known = ~invisible & lookup('Group', lambda g: g is not None and g != '0')
+        ok = known & lookup('Stat_Short', lambda st: st == counted_status)
+        counted = ok
+        out_of_window = np.zeros(len(runs), dtype=bool)
+        if contest_duration is not None and ok.any():
+            in_window = self.contest_window(timestamp, login, len(logins), known, ok, contest_duration)
+            counted = ok & in_window
+            out_of_window = ok & ~in_window
+
+        # счетчики по причинам: bincount пар (группа, задача)
+        n_probs = len(probs)
+        pairs = group.astype(np.int64) * n_probs + prob
+        for reason, mask in ((SKIPPED_INVISIBLE, invisible), (NOT_OK, known & ~ok), (COUNTED, counted),
+                             (OUT_OF_WINDOW, out_of_window)):
+            counts = np.bincount(pairs[mask], minlength=len(groups) * n_probs)
+            for i in np.flatnonzero(counts):
+                stats.add(reason, groups[i // n_probs], probs[i % n_probs], int(counts[i]))
+        unknown = np.bincount(prob[~invisible & ~known], minlength=n_probs)
+        for j in np.flatnonzero(unknown):
+            stats.add(UNKNOWN_GROUP, None, probs[j], int(unknown[j]))
+        stats.invisible_logins.update(logins[c] for c in np.unique(login[invisible]))
+
+        # разные логины в группе, посылки могут быть не ОК
+        total = {}
+        n_logins = len(logins)
+        for pair in np.unique(group[known].astype(np.int64) * n_logins + login[known]):
+            Data.enroll(total, logins[pair % n_logins], groups[pair // n_logins])
+
+        stats.log_summary()
+        return CountMatrix.from_codes(group[counted], prob[counted], groups.values, probs.values), total
+
+    def fiter_warehouse(self, file, contest_duration=None, counted_status='OK', stats:FilterStats=None):
+        """
+        То же, что fiter_runs, но посылки берутся из базы SQLite config.warehouse: база сама группирует посылки
+        по логинам и задачам, в python определяются только группы логинов и складываются агрегаты.
+        Группы - по списку логинов из той же базы (read_login_list), если он задан в конфиге.
+        Если файла данных нет в базе или он изменился после импорта, он импортируется заново.
+        :param file: filename run dump
+        :return: data, total
+        """
+        if stats is None:
+            stats = FilterStats()
+        self.filter_stats = stats
+        contest = contest_key(self.cfg.department, self.cfg.stage)
+        with contextlib.closing(Warehouse(self.cfg.warehouse)) as warehouse:
+            if not warehouse.is_fresh(contest, file):
+                warehouse.import_runs(contest, file)
+            # группа из колонки Group файла данных или по логину и имени первой посылки
+            groups = {login: group if group is not None else self.resolver(login, name)
+                      for login, name, group, _ in warehouse.users(contest)}
+            known = {login for login, group in groups.items() if group is not None and group != '0'}
+
+            windows = None
+            if contest_duration is not None:
+                if self.cfg.virtual_start:
+                    seconds = contest_duration.total_seconds()
+                    windows = {login: (start, start + seconds)
+                               for login, start in warehouse.first_times(contest).items() if login in known}
+                else:
+                    start = self.cfg.contest_start
+                    if start is None:
+                        # самая ранняя ОК посылка от правильного логина
+                        start = min((t for login, t in warehouse.first_times(contest, counted_status).items()
+                                     if login in known), default=None)
+                    end = Data.contest_end(start, contest_duration) if start is not None else None
+                    windows = {login: (start, end) for login in known} if start is not None else {}
+            counts = warehouse.run_counts(contest, counted_status, windows)
+
+        d, total = {}, {}
+        for login, prob, invisible, ok, in_window, n in counts:
+            group = groups[login]
+            if invisible:
+                stats.invisible_logins.add(login)
+                stats.add(SKIPPED_INVISIBLE, group, prob, n)
+            elif login not in known:
+                stats.add(UNKNOWN_GROUP, None, prob, n)
+            else:
+                Data.enroll(total, login, group)
+                if not ok:
+                    stats.add(NOT_OK, group, prob, n)
+                elif in_window:
+                    Data.count(d, group, prob, n)
+                    stats.add(COUNTED, group, prob, n)
+                else:
+                    stats.add(OUT_OF_WINDOW, group, prob, n)
+        stats.log_summary()
+        return d, total
+
+    def contest_window(self, timestamp, login, n_logins, known, ok, contest_duration):
+        """
+        Маска посылок, сделанных во время контеста (а не до него или при дорешивании). Начало контеста:
+        * contest_start из конфига - одно для всех,
+        * virtual_start - у каждого логина свое, время его первой посылки (виртуальный контест),
+        * иначе - самая ранняя ОК посылка, порядок посылок в файле не важен.
+        :param timestamp: numpy массив времени посылок
+        :param login: numpy массив кодов логинов
+        :param n_logins: количество разных логинов
+        :param known: маска посылок видимых пользователей из групп
+        :param ok: маска учитываемых посылок
+        """
+        import numpy as np
+        if self.cfg.virtual_start:
+            first = np.full(n_logins, np.iinfo(np.int64).max)
+            np.minimum.at(first, login[known], timestamp[known])
+            start = first[login]
+            return (timestamp >= start) & (timestamp <= start + contest_duration.total_seconds())
+
+        start = self.cfg.contest_start
+        if start is None:
+            start = int(timestamp[ok].min())
+        return (timestamp >= start) & (timestamp <= Data.contest_end(start, contest_duration))
+
+    @staticmethod
+    def contest_end(start, contest_duration):
+        """
+        timestamp конца контеста, начавшегося в start
+        """
+        return (datetime.datetime.fromtimestamp(start) + contest_duration).timestamp()
+
+    def get_group(self, login, name=None):
+        """
+        Достает номер группы по логину: из списка логинов, по регулярному выражению по имени или по префиксу логина
+        :param login: - логин пользователя
+        :param name: User_Name, нужен только с group_regex
+        :return: group или None, если логин не относится ни к одной группе
+        """
+        return self.resolver(login, name)
+
+    def encode_groups(self, runs):
+        """
+        Добавляет в RunStore колонку Group (если ее не было в файле данных).
+        Группа вычисляется один раз на каждый разный логин, а не на каждую посылку.
+        :param runs: RunStore
+        """
+        if 'Group' in runs:
+            return
+        logins = runs.table('User_Login')
+        names = [None] * len(logins)
+        if 'User_Name' in self.resolver.columns:
+            # имя пользователя первой посылки каждого логина
+            name_table = runs.table('User_Name')
+            for login, name in zip(runs.column('User_Login'), runs.column('User_Name')):
+                if names[login] is None:
+                    names[login] = name_table[name]
+        groups = StringTable()
+        by_login = [groups.code(self.get_group(login, name)) for login, name in zip(logins.values, names)]
+        codes = array.array(CODE_TYPECODE, map(by_login.__getitem__, runs.column('User_Login')))
+        runs.add_column('Group', codes, groups)
 
     def count_totals_by_login_list(self):
         """
@@ -492,49 +964,40 @@ class Data:
 
         return self.cfg.probs
 
-    def print_table(self, percent=False, to_html=True):
+    def print_table(self, percent=False, to_html=True, report=None):
+        """
+        :param report: ReportBuilder для html таблиц и страницы контеста на сайте отчетов, None - новый по конфигу
+        """
         header, body, footer = self.get_table(percent)
         Data.table_print(header, body, footer)
         self.table_csv(header, body, footer)
         if to_html:
-            self.table_html(header, body, footer)
-
-    def table_html(self,header, body, footer):
-
-        from jinja2 import Environment, FileSystemLoader
+            self.table_html(header, body, footer, report)
 
-        html_template_dir = pathlib.Path(__file__).parent / 'jinja_templates'
-        html_template_file = 'result_table_template.html'
-
-        env = Environment(loader=FileSystemLoader([html_template_dir]))
-        template = env.get_template(html_template_file)
+    def table_html(self, header, body, footer, report=None):
+        """
+        Html таблицы абсолютных данных и процентов в output_dir, если задан сайт отчетов - раздел страницы контеста
+        :param report: ReportBuilder, None - новый по конфигу (Jinja Environment все равно один на процесс)
+        """
+        from ej_report import ReportBuilder
+        if report is None:
+            report = ReportBuilder.from_config(self.cfg)
 
         # разбиваем данные на абсолютные и проценты
         n = len(self.headers)
-        # делаем кусок html кода с только таблицей абсолютных данных
-        self.table_html_1(template, header[2:n+2], [r[:n+2] for r in body], footer[:n+2])
-        # делаем кусок html кода с только таблицей процентов
-        self.table_html_1(template, header[n+2:], [r[:2]+r[n+2:] for r in body], footer[:2]+footer[n+2:], percent=True)
-
-    def table_html_1(self, template, header, body, footer, percent=False):
-        print(f'header={header}')
-        print(f'body={body}')
-        print(f'footer={footer}')
-
-
-        percent_sign = '%' if percent else ''
-        output_from_parsed_template = template.render(header=header, body=body, footer=footer, percent=percent_sign)
-        print(output_from_parsed_template)
-
-        if percent:
-            filename = f'{self.cfg.department}_{self.cfg.stage}_percent_table.html'
+        tables = [
+            (header[2:n+2], [r[:n+2] for r in body], footer[:n+2], ''),
+            (header[n+2:], [r[:2]+r[n+2:] for r in body], footer[:2]+footer[n+2:], '%'),
+        ]
+        for (h, b, f, percent), name in zip(tables, ('table', 'percent_table')):
+            html_file = self.cfg.output_dir.joinpath(f'{self.cfg.department}_{self.cfg.stage}_{name}.html').resolve()
+            report.write_table(html_file, h, b, f, percent)
+
+        if self.cfg.probs:
+            title = 'Задачи: ' + ' '.join(p.label for p in self.cfg.probs)
         else:
-            filename = f'{self.cfg.department}_{self.cfg.stage}_table.html'
-        html_file = self.cfg.output_dir.joinpath(filename).resolve()
-
-        # to save the results
-        with open(html_file, "w", encoding='utf8') as fh:
-            fh.write(output_from_parsed_template)
+            title = 'Все задачи'
+        report.add_tables(self.cfg.department, self.cfg.stage, title, tables)
 
     def get_table(self, percent=False):
         """
@@ -542,7 +1005,7 @@ class Data:
         """
         TABLE_SEPARATOR = '=>'
 
-        d = self.data
+        d = self.matrix
         headers = self.headers
         group_numbers = self.totals
 
@@ -561,7 +1024,7 @@ class Data:
 
         csv_footer = ['all'] + self.data_group_all(get_student_numbers=True, add_percentes=True)
 
-        print(csv_header, csv_body, csv_footer)
+        logging.debug(f'table: {csv_header} {csv_body} {csv_footer}')
         return (csv_header, csv_body, csv_footer)
 
 
@@ -569,11 +1032,12 @@ class Data:
         # write to  csv file
         filename = f'{self.cfg.department}_table.csv'
         csv_file = self.cfg.output_dir.joinpath(filename).resolve()
-        with open(csv_file, 'w', encoding='utf8',  newline='') as csvfile:
-            csvwriter = csv.writer(csvfile, delimiter=';', quotechar='|', quoting=csv.QUOTE_MINIMAL)
-            csvwriter.writerow(csv_header)
-            csvwriter.writerows(csv_body)
-            csvwriter.writerow(csv_footer)
+        csvfile = io.StringIO(newline='')
+        csvwriter = csv.writer(csvfile, delimiter=';', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        csvwriter.writerow(csv_header)
+        csvwriter.writerows(csv_body)
+        csvwriter.writerow(csv_footer)
+        write_if_changed(csv_file, csvfile.getvalue())
 
     @staticmethod
     def table_print(csv_header, csv_body, csv_footer):
@@ -593,17 +1057,6 @@ class Data:
         s = '\t'.join(map(str, csv_footer))
         print(s)
 
-    def extract_group(self, login):
-        """
-        extract and return group name part from login: remove prefix, get group_name_len symbols
-        extract_group('ed95070507', 'ed950', 3) -> '705'
-        extract_group('ejudge', 'ed950', 3) -> None
-        """
-        if not login.startswith(self.cfg.login_prefix):
-            return None
-        n = len(self.cfg.login_prefix)
-        return login[n:n+self.cfg.login_group_len]
-
     @staticmethod
     def enroll(total, login, group):
         """
@@ -616,13 +1069,13 @@ class Data:
 
 
     @staticmethod
-    def count(d, group, prob):
+    def count(d, group, prob, n=1):
         """
-        Add +1 to counter for (group, prob) key
+        Add +n to counter for (group, prob) key
         """
         if d.get(group) is None:
             d[group] = {prob: 0}
-        d[group][prob] = d[group].get(prob, 0) + 1
+        d[group][prob] = d[group].get(prob, 0) + n
 
 
 
@@ -642,8 +1095,8 @@ def get_flat_dict(d, department=None, stage=None):
             dres['department'] = department
             d1 = d['department'][department]
 
-    print(dres)
-    print(d1)
+    logging.debug(f'config: {dres}')
+    logging.debug(f'department {department}: {d1}')
     # сначала обрабатываем все ключи высших уровней, потом перезаписываем их уровнем stage
     for st in d1:
         if st != 'stage':
@@ -653,51 +1106,237 @@ def get_flat_dict(d, department=None, stage=None):
     dres.update(d1['stage'][stage])
     return dres
 
-def process_data(cfg:Params, show_plots=False, to_html=True):
+def flat_contests(config, department=None, stage=None):
+    """
+    Плоские конфиги всех контестов, которые нужно обработать
+    :param config: плоский конфиг одного контеста или конфиг с уровнями department и stage
+    :param department: только этот факультет, None - все
+    :param stage: только эта контрольная, None - все
+    """
+    # обрабатываем конфиг для одного единственного констеста (конфиг плоский)
+    if isinstance(config.get('department'), str) and isinstance(config.get('stage'), str):
+        logging.info('Не знаю как Земля, но конфиг плоский')
+        return [config]
+
+    # в конфиге есть уровни вложенности
+    contests = []
+    departments = config['department'].keys() if department is None else [department]
+    for dep in departments:
+        stages = config['department'][dep]['stage'].keys() if stage is None else [stage]
+        for st in stages:
+            d = get_flat_dict(config, dep, st)
+            logging.debug(f'{dep} {st}: {json.dumps(d, indent=4, ensure_ascii=False)}')
+            if d is None:
+                logging.warning(f'Config file has not department {dep} and stage {st}')
+                continue
+            contests.append(d)
+    return contests
+
+def process_data(cfg:Params, show_plots=False, to_html=True, text_only=False, rendered=None, profiler=None,
+                 report=None):
     """
     Обработка данных и вывод результатов
     :param cfg: конфиг, где указано что брать, как обрабатывать и куда класть результаты
-    :return:
+    :param text_only: только таблицы, без графиков (matplotlib не нужен)
+    :param rendered: уже нарисованные графики для режима --watch (см. DataPlotter.plot_all)
+    :param profiler: StageProfiler для --profile, None - не мерять
+    :param report: ReportBuilder для html таблиц, None - новый по конфигу
+    :return: Data (или DataPlotter) с подсчитанными данными
     """
     # разбираем файл данных
-    if args.text_only:
-        data = Data(cfg)
-        data.print_table(to_html)
+    if text_only:
+        data = Data(cfg, profiler)
     else:
         from ej_plotter import DataPlotter
-        data = DataPlotter(cfg)
-        data.print_table(to_html)
-        data.plot_all(show_plots)
+        data = DataPlotter(cfg, profiler)
+    output_data(data, show_plots, to_html, text_only, rendered, report)
+    return data
 
-def process_one_contest(config, config_dir, config_only, show_plots):
+def output_data(data:Data, show_plots=False, to_html=True, text_only=False, rendered=None, report=None):
+    """
+    Вывод уже подсчитанных результатов: таблицы и (если не text_only) графики в data.cfg.output_dir
+    :param report: ReportBuilder для html таблиц, None - новый по конфигу
+    """
+    with data.profiler.stage('tables', output_dir=str(data.cfg.output_dir)):
+        data.print_table(to_html=to_html and data.cfg.html, report=report)
+    if not text_only:
+        with data.profiler.stage('plots', output_dir=str(data.cfg.output_dir)) as st:
+            cache = data.plot_all(show_plots, rendered=rendered)
+            if cache is not None:
+                st.update(cached=cache.hits, rendered=cache.rendered)
+
+def process_one_contest(config, config_dir, config_only, show_plots, text_only=False, rendered=None):
     cfg = Params.from_dict(config_dir, config)
     cfg.verify()
-    if not config_only:
-        process_data(cfg, show_plots)
-    logging.info(cfg.output_dir)
-
-    # а теперь данные, не отфильтрованные по задачам. Чтобы два раза не запускать с фильтрованным и нефильтрованным конфигом.
-    if config['problems']:
-        config['problems'] = ''
-        config['output_dir'] = 'res_unfiltered'
-        cfg = Params.from_dict(config_dir, config)
-        if not config_only:
-            process_data(cfg, show_plots)
+    profiler = StageProfiler(contest_name(config), cfg.profile and not config_only)
+    report = None
+    if cfg.html and not config_only:
+        from ej_report import ReportBuilder
+        report = ReportBuilder.from_config(cfg)
+    try:
+        data = None
+        if config_only:
+            # --config_only только печатает плоский конфиг контеста
+            json.dump(config, indent=4, ensure_ascii=False, fp=sys.stdout)
+            print()
+        else:
+            data = process_data(cfg, show_plots, text_only=text_only, rendered=rendered, profiler=profiler,
+                                report=report)
         logging.info(cfg.output_dir)
 
+        # а теперь данные, не отфильтрованные по задачам. Чтобы два раза не запускать с фильтрованным и нефильтрованным конфигом.
+        # подсчитаны уже все задачи, поэтому файл данных второй раз не читаем, меняем только фильтр задач и директорию вывода
+        if config['problems']:
+            unfiltered = dict(config, problems='', output_dir='res_unfiltered')
+            unfiltered_cfg = Params.from_dict(config_dir, unfiltered)
+            if data is not None:
+                output_data(data.with_config(unfiltered_cfg), show_plots, text_only=text_only, rendered=rendered,
+                            report=report)
+            logging.info(unfiltered_cfg.output_dir)
 
-if __name__ == '__main__':
+        # страница контеста на сайте отчетов: таблицы по задачам контеста и по всем задачам
+        if report is not None:
+            report.write_contest(cfg.department, cfg.stage)
 
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(levelname)s:%(lineno)d  \t%(message)s'
-        )
+        # отчет профиля рядом с результатами контеста
+        profiler.save(cfg.output_dir / f'{cfg.department}_{cfg.stage}_profile.json')
+    finally:
+        profiler.stop()
 
-    parser = argparse.ArgumentParser(
-        description='Calculate statistics for all Ejudge contests described into config json',
-        usage=f'\n\t{sys.argv[0]} cfg_2019.json FRTK dec --text_only',
-        formatter_class=argparse.ArgumentDefaultsHelpFormatter
-    )
+LOG_FORMAT = '%(levelname)s:%(lineno)d  \t%(message)s'
+
+def contest_name(config):
+    return f'{config.get("department")} {config.get("stage")}'
+
+def contest_path(config, config_dir, field):
+    """
+    Путь из поля field конфига контеста так же, как его находит Params.from_dict,
+    но без создания директорий результатов
+    :return: pathlib.Path или None, если поле не задано
+    """
+    p = Params(config_dir)
+    p.base_dir = p.resolve_path(config.get('dir', '.'))
+    return p.resolve_path(config.get(field))
+
+def write_site_index(contests, config_dir):
+    """
+    Пишет index.html сайтов отчетов (поле site_dir) со ссылками на страницы контестов
+    :param contests: список плоских конфигов контестов
+    """
+    sites = {}      # site_dir: (конфиг первого контеста сайта, [(department, stage)])
+    for config in contests:
+        site_dir = contest_path(config, config_dir, 'site_dir')
+        if site_dir is not None and config.get('html', True):
+            sites.setdefault(site_dir, (config, []))[1].append((config['department'], config['stage']))
+    if not sites:
+        return
+    from ej_report import ReportBuilder, bytecode_dir
+    for site_dir, (config, pages) in sites.items():
+        # тот же кеш байткода шаблонов, что и у страниц контестов (ReportBuilder.from_config)
+        cache_dir = bytecode_dir(config.get('cache', True), contest_path(config, config_dir, 'cache_dir'))
+        ReportBuilder(site_dir, bytecode_dir=cache_dir).write_index(pages)
+
+def run_one_contest(config, config_dir, config_only=False, show_plots=False, text_only=False, capture=False,
+                    rendered=None):
+    """
+    Обрабатывает один контест, ошибка в нем не останавливает обработку остальных контестов
+    :param capture: собрать весь вывод (print и logging) контеста в строку, а не выводить сразу
+    :param rendered: уже нарисованные графики для режима --watch (см. DataPlotter.plot_all)
+    :return: (True если контест обработан без ошибок, собранный вывод или '')
+    """
+    if not capture:
+        try:
+            process_one_contest(config, config_dir, config_only, show_plots, text_only, rendered)
+            return True, ''
+        except (Exception, SystemExit):
+            logging.exception(f'contest {contest_name(config)} failed')
+            return False, ''
+
+    out = io.StringIO()
+    handler = logging.StreamHandler(out)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root = logging.getLogger()
+    old_handlers = root.handlers
+    root.handlers = [handler]
+    try:
+        with contextlib.redirect_stdout(out):
+            return run_one_contest(config, config_dir, config_only, show_plots, text_only,
+                                   rendered=rendered)[0], out.getvalue()
+    finally:
+        root.handlers = old_handlers
+
+def run_contests(contests, config_dir, config_only=False, show_plots=False, text_only=False, jobs=1):
+    """
+    Обрабатывает контесты, jobs > 1 - параллельно в пуле из jobs процессов.
+    Вывод каждого контеста печатается целиком и в порядке контестов в списке.
+    :param contests: список плоских конфигов контестов (см. get_flat_dict)
+    :return: список конфигов контестов, обработка которых завершилась ошибкой
+    """
+    failed = []
+    if jobs <= 1 or len(contests) <= 1 or show_plots:
+        for config in contests:
+            ok, _ = run_one_contest(config, config_dir, config_only, show_plots, text_only)
+            if not ok:
+                failed.append(config)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(run_one_contest, config, config_dir, config_only, show_plots, text_only, True)
+                       for config in contests]
+            for config, future in zip(contests, futures):
+                try:
+                    ok, output = future.result()
+                except Exception:
+                    logging.exception(f'contest {contest_name(config)} failed')
+                    ok, output = False, ''
+                sys.stdout.write(output)
+                sys.stdout.flush()
+                if not ok:
+                    failed.append(config)
+
+    # страницы контестов пишут сами контесты (в том числе в пуле), оглавление - после всех
+    if not config_only:
+        write_site_index(contests, config_dir)
+    return failed
+
+def watch_contests(contests, config_dir, text_only=False, interval=2.0, debounce=2.0):
+    """
+    Режим --watch: обрабатывает контесты, затем ждет изменения их файлов данных и обрабатывает заново
+    контесты, файл данных которых изменился. Подсчет инкрементальный (читаются только новые посылки),
+    перезаписываются только таблицы и графики, в которых что-то изменилось. Останавливается по Ctrl+C.
+    :param interval: период опроса файлов в секундах, если нет inotify
+    :param debounce: сколько секунд файл не должен меняться, чтобы начать обработку
+    """
+    contests = [dict(config, incremental=True) for config in contests]
+    files = {}      # файл данных: номера контестов
+    for i, config in enumerate(contests):
+        file_data = Params.from_dict(config_dir, config).file_data
+        if Data.is_stream(file_data):
+            logging.error(f'contest {contest_name(config)}: can not watch stdin or pipe {file_data}')
+            sys.exit(1)
+        files.setdefault(pathlib.Path(file_data).resolve(), []).append(i)
+
+    rendered = {}   # файл графика: spec_digest, общий для всех контестов
+    watcher = FileWatcher(files, interval, debounce)
+    changed = files.keys()
+    try:
+        while True:
+            for i in sorted(i for f in changed for i in files[f]):
+                logging.info(f'refresh contest {contest_name(contests[i])}')
+                run_one_contest(contests[i], config_dir, text_only=text_only, rendered=rendered)
+            write_site_index(contests, config_dir)
+            changed = watcher.wait()
+    except KeyboardInterrupt:
+        logging.info('watch is stopped')
+    finally:
+        watcher.close()
+
+
+def add_contest_args(parser, show_plots=True):
+    """
+    Аргументы командной строки обработки контестов, общие для ej_plot_contest.py и makeall_2019.py.
+    Поля конфига, которые они перекрывают, - config_overrides, запуск контестов - process_contests.
+    :param show_plots: добавить --show_plots (makeall_2019.py графики не показывает)
+    """
     parser.add_argument("config", help="config in json format")
     parser.add_argument("department", help="Department name in config dictionary", default=None, nargs='?')
     parser.add_argument("stage", help="stage name in config dictionary", default=None, nargs='?')
@@ -705,12 +1344,105 @@ if __name__ == '__main__':
                         default=False, action="store_true")
     parser.add_argument("--text_only", help="prevent prot data, use if no matplotlib",
                         default=False, action="store_true")
-    parser.add_argument("--show_plots", help="show all plots interactively in addition to saving all images",
+    if show_plots:
+        parser.add_argument("--show_plots", help="show all plots interactively in addition to saving all images",
+                            default=False, action="store_true")
+    parser.add_argument("--stream", help="read run dump row by row without keeping runs in memory (file_data '-' is stdin)",
+                        default=False, action="store_true")
+    parser.add_argument("--incremental", help="save counting state and process only runs appended since the last run",
+                        default=False, action="store_true")
+    parser.add_argument("--no-cache", help="always parse run dumps, do not use and do not update parsed dump cache",
+                        dest='no_cache', default=False, action="store_true")
+    parser.add_argument("--warehouse", help="count runs from SQLite warehouse (see import command), import changed dumps",
+                        default=None, metavar='DB')
+    parser.add_argument('-j', "--jobs", help="process department/stage contests in N parallel processes",
+                        type=int, default=1, metavar='N')
+    parser.add_argument("--plot_jobs", help="render plots of one contest in N parallel processes",
+                        type=int, default=None, metavar='N')
+    parser.add_argument("--render_profile", help="plot render profile: default (as before) or fast (fixed layout)",
+                        choices=['default', 'fast'], default=None)
+    parser.add_argument("--watch", help="watch file_data and refresh tables and plots on changes (Ctrl+C to stop)",
                         default=False, action="store_true")
+    parser.add_argument("--watch_interval", help="file polling period in seconds when inotify is not available",
+                        type=float, default=2.0, metavar='SEC')
+    parser.add_argument("--debounce", help="seconds without file changes before refresh in watch mode",
+                        type=float, default=2.0, metavar='SEC')
+    parser.add_argument("--profile", help="time and trace memory of every stage, save json report next to outputs",
+                        default=False, action="store_true")
+    parser.add_argument("--no_html", help="do not write html tables (jinja2 is not needed)",
+                        default=False, action="store_true")
+    parser.add_argument("--site", help="build static report site: a page of every contest and index.html",
+                        default=None, metavar='DIR')
     parser.add_argument('-v', "--verbose", help="increase verbosity",
                         action="store_true")
+    return parser
+
+
+def build_parser(prog=None):
+    parser = argparse.ArgumentParser(
+        description='Calculate statistics for all Ejudge contests described into config json',
+        prog=prog,
+        usage=f'\n\t{prog or sys.argv[0]} cfg_2019.json FRTK dec --text_only',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    return add_contest_args(parser)
+
+
+def config_overrides(args, base_dir):
+    """
+    Поля конфига, которые перекрывают параметры командной строки (add_contest_args), для каждого контеста
+    :param base_dir: директория, относительно которой заданы пути в командной строке
+    :return: {поле конфига: значение}
+    """
+    overrides = {}
+    if args.stream:
+        overrides['stream'] = True
+    if args.incremental:
+        overrides['incremental'] = True
+    if args.no_cache:
+        overrides['cache'] = False
+    if args.no_html:
+        overrides['html'] = False
+    if args.profile:
+        overrides['profile'] = True
+    if args.plot_jobs is not None:
+        overrides['plot_jobs'] = args.plot_jobs
+    if args.render_profile is not None:
+        overrides['render_profile'] = args.render_profile
+    if args.warehouse is not None:
+        overrides['warehouse'] = str(base_dir / args.warehouse)
+    if args.site is not None:
+        overrides['site_dir'] = str(base_dir / args.site)
+    return overrides
+
+
+def process_contests(args, contests, config_dir):
+    """
+    Обрабатывает контесты так, как заданы параметры командной строки (add_contest_args): один раз или в режиме
+    --watch; код возврата 1, если хотя бы один контест завершился ошибкой
+    :param contests: список плоских конфигов контестов с уже примененными config_overrides
+    """
+    if args.watch and not args.config_only:
+        watch_contests(contests, config_dir, args.text_only, args.watch_interval, args.debounce)
+        return
+    show_plots = getattr(args, 'show_plots', False)
+    failed = run_contests(contests, config_dir, args.config_only, show_plots, args.text_only, args.jobs)
+    if failed:
+        logging.error(f'failed contests: {", ".join(contest_name(d) for d in failed)}')
+        sys.exit(1)
 
-    args = parser.parse_args()
+
+def main(argv=None, prog=None):
+    """
+    ej_plot_contest.py config [department] [stage]
+    :param argv: аргументы командной строки, None - sys.argv[1:]
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format=LOG_FORMAT
+        )
+
+    args = build_parser(prog).parse_args(argv)
 
     if args.verbose:
         print("verbosity turned on")
@@ -722,27 +1454,17 @@ if __name__ == '__main__':
 
     with open(config_path, 'r', encoding='utf8') as read_file:
         config = json.load(read_file)
-    json.dump(config, indent=4, fp=sys.stdout)
+    logging.debug(json.dumps(config, indent=4, ensure_ascii=False))
 
-    # обрабатываем конфиг для одного единственного констеста (конфиг плоский)
-    if isinstance(config.get('department'), str) and isinstance(config.get('stage'), str):
-        logging.info('Не знаю как Земля, но конфиг плоский')
-        process_one_contest(config, config_dir, args.config_only, args.show_plots)
-        sys.exit(0)
+    # параметры командной строки перекрывают поля конфига каждого контеста
+    overrides = config_overrides(args, base_dir)
 
-    # в конфиге есть уровни вложенности
     logging.info(f'file={args.config} dep={args.department} stage={args.stage}')
+    contests = flat_contests(config, args.department, args.stage)
+    for d in contests:
+        d.update(overrides)
+    process_contests(args, contests, config_dir)
 
-    departments = config['department'].keys() if args.department is None else [args.department]
-
-    for dep in departments:
-        stages = config['department'][dep]['stage'].keys() if args.stage is None else [args.stage]
-        for st in stages:
-            print(dep, st)
-            d = get_flat_dict(config, dep, st)
-            json.dump(d,indent=4, fp=sys.stdout)
-            if d is None:
-                logging.warning(f'Config file has not department {dep} and stage {st}')
-                continue
-            process_one_contest(d, config_dir, args.config_only, args.show_plots)
 
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,22 @@
-from ej_plot_contest import Data, Params, ProblemName
+from ej_plot_contest import Data, Params
+from ej_profile import StageProfiler
+from ej_render import get_colors, plot_path, render_plot, spec_digest, PlotCache, PLOT_CACHE_DIR
 
+import concurrent.futures
 import logging
-import matplotlib
-import matplotlib.pyplot as plt
-import numpy as np
+
+"""
+Графики строятся в два шага:
+* DataPlotter по подсчитанным данным готовит описание каждого графика - словарь только с данными (plot spec),
+* render_plot(spec) (ej_render.py) по описанию рисует график и сохраняет его в файл.
+Описания не зависят от DataPlotter, поэтому графики можно рисовать параллельно в пуле процессов.
+"""
 
 class DataPlotter(Data):
-    def __init__(self, config:Params):
-        super().__init__(config)
+    VECTORIZED = True   # numpy уже загружен matplotlib
+
+    def __init__(self, config:Params, profiler:StageProfiler=None):
+        super().__init__(config, profiler)
 
     @staticmethod
     def get_colors(cmp, n:int):
@@ -17,26 +26,99 @@ class DataPlotter(Data):
         :param n: - number of colors (should be less then colormap color quantity
         :return: list of n colors
         """
-        return list(cmp(np.arange(n)))
+        return get_colors(cmp, n)
 
-    def plot_all(self, show=True):
+    def render_options(self):
         """
-        Рисует и сохраняет все графики по прочитанным данным
-        :param show: - показывать графики интерактивно (в файл сохраняется всегда)
+        Настройки рисования из конфига, попадают в описание каждого графика
+        """
+        return {'profile': self.cfg.render_profile, 'dpi': self.cfg.plot_dpi, 'fmt': self.cfg.plot_format}
+
+    def plot_specs(self):
+        """
+        Описания всех графиков по прочитанным данным, в порядке рисования
         """
-        self.plot_department(show)
-        for gr in self.groups:
-           self.plot_group(gr, show)
-        for prob in self.headers:
-            self.plot_prob_pie(prob, show_unsolved=True, show=show)
-            #self.plot_prob_pie(prob, show_unsolved=False, show=show)
+        specs = [self.department_spec()]
+        specs += [self.group_spec(gr) for gr in self.groups]
+        specs += [self.prob_pie_spec(prob, show_unsolved=True) for prob in self.headers]
+        #specs += [self.prob_pie_spec(prob, show_unsolved=False) for prob in self.headers]
+        return specs
 
+    def plot_cache(self):
+        """
+        Кеш файлов графиков из конфига (рядом с кешем run dump), None - без кеша (cache = False)
+        """
+        if not self.cfg.cache:
+            return None
+        cache_dir = self.cfg.cache_dir / PLOT_CACHE_DIR if self.cfg.cache_dir is not None else None
+        return PlotCache(cache_dir, self.cfg.cache_max_mb * 2**20)
+
+    def plot_all(self, show=True, jobs=None, rendered=None):
+        """
+        Рисует и сохраняет все графики по прочитанным данным.
+        Графики, которые уже есть в кеше графиков (то же содержимое), не рисуются, а берутся из кеша.
+        :param show: - показывать графики интерактивно (в файл сохраняется всегда)
+        :param jobs: - сколько процессов рисуют графики, None - из конфига (plot_jobs)
+        :param rendered: - словарь {файл графика: spec_digest} уже нарисованных графиков (режим --watch),
+                           графики с тем же описанием и существующим файлом не перерисовываются, словарь обновляется
+        :return: PlotCache со счетчиками графиков из кеша и нарисованных, None - кеш не использовался
+        """
+        specs = self.plot_specs()
+        if jobs is None:
+            jobs = self.cfg.plot_jobs
+        changed = specs
+        if rendered is not None:
+            digests = {str(plot_path(spec)): spec_digest(spec) for spec in specs}
+            changed = [spec for spec in specs
+                       if rendered.get(str(plot_path(spec))) != digests[str(plot_path(spec))]
+                       or not plot_path(spec).exists()]
+            logging.info(f'{len(changed)} of {len(specs)} plots are changed')
+
+        cache = self.plot_cache() if not show else None
+        if cache is None:
+            render_plots(changed, show, jobs)
+        else:
+            missed = [spec for spec in changed if not cache.fetch(spec)]
+            render_plots(missed, show, jobs)
+            for spec in missed:
+                cache.store(spec)
+            if missed:
+                cache.evict()
+            logging.info(f'{self.cfg.department} {self.cfg.stage}: {cache.summary()}')
+
+        if rendered is not None:
+            for spec in changed:
+                rendered[str(plot_path(spec))] = digests[str(plot_path(spec))]
+        return cache
 
     def plot_department(self, show=True):
         """
         Рисует и сохраняет в файл данные по всему факультету (stacked bar по каждой группе студентов) для всех задач
         :param show: - показывать графики интерактивно (в файл сохраняется всегда)
         """
+        render_plot(self.department_spec(), show)
+
+    def plot_group(self, group:str, show=True):
+        """
+        Рисует и сохраняет в файл данные по 1 группе студентов
+        :param group: - номер группы
+        :param show: - показывать графики интерактивно (в файл сохраняется всегда)
+        """
+        render_plot(self.group_spec(group), show)
+
+    def plot_prob_pie(self, prob_name, show_unsolved=False, show=True):
+        """
+        Рисует pie-диаграмму для задачи prob_name по количеству ее решивших по группам.
+        :param prob_name: = ProblemName('Cmem-', department) - для какой задачи будем брать данные
+        :param show_unresolved: - рисовать серым сектор сколько студентов НЕ решило эту задачу или рисуем только решения
+        :param show: - показывать графики интерактивно (в файл сохраняется всегда)
+        """
+        render_plot(self.prob_pie_spec(prob_name, show_unsolved), show)
+
+    def department_spec(self):
+        """
+        Описание графика по всему факультету: stacked bar по каждой группе студентов для всех задач
+        """
         department = self.cfg.department    # department='DPQE'
         preps = self.cfg.preps              # preps = {'705': 'Иванов'}
         headers = ['студентов'] + [h.label for h in self.headers] # headers = ['студентов', 'C', 'Cmem', 'D', 'F', 'E', 'Emem']
@@ -47,104 +129,39 @@ class DataPlotter(Data):
 
         # делаем из self.data матрицу, строки - группы, столбцы - задачи ydata[group][prob]
         # и добавляем первым столбцом ydata[gr][0] количество студентов в группе
-        ydata = np.array([self.data_group(gr) for gr in groups])
-
-        # данные по задачам
-        # столбцы 0, 1, 2, .. до последней задачи, первый столбец - общее кооличество студентов в группе
-        xdata = np.arange(len(headers))
-
-        logging.debug(xdata)
-        logging.debug(ydata)
-        logging.debug(groups)
-
-        width = 0.35  # the width of the bars: can also be len(x) sequence
-
-        fig, ax = plt.subplots()
-
-        logging.debug(f'ydata {ydata}')
-
-        y_bottom = np.zeros(len(ydata[0]), dtype=int)
-
-        for i in range(ydata.shape[0]):
-            gr = groups[i]
-            logging.debug(f'group={gr} preps={preps}')
-            logging.debug(f'{gr} {preps[gr]}')
-            p = ax.bar(xdata, ydata[i], width, label=f'{gr} {preps[gr]}', bottom=y_bottom)  # , color=colors[i]
-            y_bottom = y_bottom + ydata[i]
-            logging.debug(f'y_bottom = {y_bottom}')
-
-        # числа сверху столбцов, без первого
-        x = xdata[1:]
-        y = y_bottom[1:]
-        for i in range(len(x)):
-            ax.annotate(str(y[i]),  # this is the text
-                        (x[i], y[i]),  # this is the point to label
-                        textcoords="offset points",  # how to position the text
-                        xytext=(0, 10),  # distance from text to points (x,y)
-                        ha='center')  # horizontal alignment can be left, right or center
-        ax.set_xticks(xdata)
-        ax.set_xticklabels(headers)
-        ax.set_title(f'{department} всего')
-        ax.legend()
-
-        if show:
-            plt.show()
-        filename = f'{department}_all.png'
-        filename = self.cfg.output_dir.joinpath(filename).resolve()
-        fig.savefig(filename, format='png', bbox_inches='tight', pad_inches=0)
-        plt.close(fig)
-
-    def plot_group(self, group:str, show=True):
+        return {
+            'kind': 'department',
+            'render': self.render_options(),
+            'filename': self.cfg.output_dir.joinpath(f'{department}_all.png').resolve(),
+            'title': f'{department} всего',
+            'headers': headers,
+            'labels': [f'{gr} {preps[gr]}' for gr in groups],
+            'ydata': self.data_groups(groups),
+        }
+
+    def group_spec(self, group:str):
         """
-        Рисует и сохраняет в файл данные по 1 группе студентов
+        Описание графика по 1 группе студентов
         :param group: - номер группы
-        :param show: - показывать графики интерактивно (в файл сохраняется всегда)
         """
         department = self.cfg.department    # department='DPQE'
         headers = ['студентов'] + [h.label for h in self.headers] # headers = ['студентов', 'C', 'Cmem', 'D', 'F', 'E', 'Emem']
-        colors = ['lightgray'] + DataPlotter.get_colors(plt.cm.tab10, len(headers)-1)   # gray - for student numbers
         logging.debug(f'plot GROUP group {group} of {department} department with headers {headers}')
 
-        # данные по задачам
-        xdata = np.arange(len(headers))
-        ydata = self.data_group(group)
-
-        fig, ax = plt.subplots()
-
-        # рисуем столбик студентов и столбики задач
-        # каждая задача отдельным графиком, чтобы получить легенду по отдельным задачам, иначе можно было бы одним
-        # ax.bar(x, y, label, colors)
-        # и еще числа сверху каждого столбика - аннотации
-        for x, y in enumerate(ydata):
-            ax.bar([x + 1], [y], label=headers[x], color=colors[x])
+        return {
+            'kind': 'group',
+            'render': self.render_options(),
+            'filename': self.cfg.output_dir.joinpath(f'{department}_{group}.png').resolve(),
+            'title': f'{department} {group} {self.cfg.preps[group]}',
+            'headers': headers,
+            'ydata': self.data_group(group),
+        }
 
-            ax.annotate(str(y),  # this is the text
-                        (x + 1, y),  # this is the point to label
-                        textcoords="offset points",  # how to position the text
-                        xytext=(0, 1 if x == 0 else 10),  # distance from text to points (x,y)
-                        ha='center')  # horizontal alignment can be left, right or center
-
-        # по оси У только целые числа, ибо студентов пополам не делим
-        ax.yaxis.set_major_locator(matplotlib.ticker.MaxNLocator(integer=True))
-        ax.set_xticks(xdata+1)
-        ax.set_xticklabels(headers)
-        ax.set_title(f'{department} {group} {self.cfg.preps[group]}')
-        #ax.legend()
-        if show:
-            plt.show()
-
-        filename = f'{department}_{group}.png'
-        filename = self.cfg.output_dir.joinpath(filename).resolve()
-        fig.savefig(filename, format='png', bbox_inches='tight', pad_inches=0)
-        plt.close(fig)
-
-
-    def plot_prob_pie(self, prob_name, show_unsolved=False, show=True):
+    def prob_pie_spec(self, prob_name, show_unsolved=False):
         """
-        Рисует pie-диаграмму для задачи prob_name по количеству ее решивших по группам.
+        Описание pie-диаграммы для задачи prob_name по количеству ее решивших по группам.
         :param prob_name: = ProblemName('Cmem-', department) - для какой задачи будем брать данные
         :param show_unresolved: - рисовать серым сектор сколько студентов НЕ решило эту задачу или рисуем только решения
-        :param show: - показывать графики интерактивно (в файл сохраняется всегда)
         """
 
         # номера групп в нужной последовательности
@@ -156,8 +173,7 @@ class DataPlotter(Data):
         fracs = self.data_prob(prob_name)
         logging.debug(fracs)
         explodes = [0] * len(fracs)
-        logging.debug(explodes)
-        pie_colors =  DataPlotter.get_colors(plt.cm.tab10, len(fracs)) + ['lightgray']
+        colors_number = len(fracs)
 
         file_name = ''
         if show_unsolved:
@@ -170,23 +186,27 @@ class DataPlotter(Data):
             groups.append('unsolved')
             explodes.append(0.01)
 
-        # Make figure and axes
-        fig, ax = plt.subplots()
-
-        # The slices will be ordered and plotted counter-clockwise.
-        labels = [f'{fracs[i]} - {groups[i]}' for i in range(len(fracs))]
-        patches, texts = plt.pie(fracs, colors=pie_colors, startangle=90)
-        plt.legend(patches, labels, loc="best")
-        # Set aspect ratio to be equal so that pie is drawn as a circle.
-        plt.axis('equal')
-        #plt.tight_layout()
-
-        ax.set_title(f'{department} {prob_name.label}')
-
-        if show:
-            plt.show()
-
-        filename = f'{department}_{prob_name.label}_pie{file_name}.png'
-        filename = self.cfg.output_dir.joinpath(filename).resolve()
-        fig.savefig(filename, format='png', bbox_inches='tight', pad_inches=0)
-        plt.close(fig)
+        return {
+            'kind': 'prob_pie',
+            'render': self.render_options(),
+            'filename': self.cfg.output_dir.joinpath(f'{department}_{prob_name.label}_pie{file_name}.png').resolve(),
+            'title': f'{department} {prob_name.label}',
+            'fracs': fracs,
+            'labels': [f'{fracs[i]} - {groups[i]}' for i in range(len(fracs))],
+            'colors_number': colors_number,
+        }
+
+
+def render_plots(specs, show=False, jobs=1):
+    """
+    Рисует графики по описаниям, jobs > 1 - в пуле из jobs процессов.
+    Каждый график рисуется и сохраняется так же, как при последовательном рисовании, поэтому файлы одинаковые.
+    Интерактивный показ (show) возможен только последовательно.
+    """
+    if show or jobs <= 1 or len(specs) <= 1:
+        for spec in specs:
+            render_plot(spec, show)
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        for filename in pool.map(render_plot, specs):
+            logging.debug(f'plot {filename} is saved')
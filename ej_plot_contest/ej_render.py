@@ -0,0 +1,419 @@
+import functools
+import hashlib
+import importlib.metadata
+import json
+import logging
+import os
+import pathlib
+import re
+import shutil
+
+from ej_cache import default_cache_dir
+
+"""
+Рисование графиков по описаниям (plot spec), которые готовит DataPlotter.
+
+Renderer рисует без pyplot, всегда через Agg, и держит по одному Figure/Axes на каждый вид графика:
+следующий график того же вида рисуется на очищенных осях, а не на новом рисунке.
+
+matplotlib и numpy импортируются при первом рисовании: описания графиков, их хеши и пути к файлам
+доступны без них.
+
+Профили:
+* default - графики такие же, как раньше: png, разметка bbox_inches='tight' (лишний проход layout/draw при сохранении)
+* fast - фиксированная разметка без bbox_inches='tight', легенда в фиксированном месте,
+  dpi и формат (png или svg) задаются в конфиге
+
+PlotCache - кеш файлов графиков по содержимому: ключ - хеш всего, что видно на графике (spec_digest).
+Если такой график уже рисовали (в любом контесте и любом запуске), файл берется из кеша жесткой ссылкой
+или копией, а не рисуется заново.
+"""
+
+RENDER_VERSION = 1      # увеличить, если меняется вид графиков при тех же данных
+PLOT_CACHE_DIR = 'plots'    # поддиректория кеша для файлов графиков
+SVG_HASH_SALT = 'ejudge_tools'     # соль id элементов svg, см. Renderer.save
+PLOT_ENTRY = re.compile(r'[0-9a-f]{40}\.(png|svg)')     # файлы PlotCache: spec_digest и формат
+
+PROFILES = {
+    'default': {'tight': True, 'dpi': None, 'format': 'png', 'legend_loc': 'best'},
+    'fast': {'tight': False, 'dpi': 72, 'format': 'png', 'legend_loc': 'upper right'},
+}
+
+# поля осей при фиксированной разметке (профиль fast), в долях размера рисунка
+FIXED_LAYOUT = {'left': 0.08, 'right': 0.98, 'bottom': 0.08, 'top': 0.92}
+
+
+def get_colors(cmp, n:int):
+    """
+    return list of n colors from colormap named cm
+    :param cm: - name of colormap
+    :param n: - number of colors (should be less then colormap color quantity
+    :return: list of n colors
+    """
+    import numpy as np
+    return list(cmp(np.arange(n)))
+
+
+class Renderer:
+    """
+    renderer = Renderer('fast', dpi=100, fmt='svg')
+    path = renderer.render(spec)    # путь к сохраненному файлу
+    """
+    def __init__(self, profile='default', dpi=None, fmt=None, reuse=True, show=False):
+        """
+        :param profile: имя профиля из PROFILES
+        :param dpi: dpi сохраняемых файлов, None - из профиля
+        :param fmt: формат файлов 'png' или 'svg', None - из профиля
+        :param reuse: рисовать графики одного вида на одном Figure (False - новый рисунок на каждый график, как раньше)
+        :param show: показывать графики интерактивно через pyplot (тогда рисунки не переиспользуются)
+        """
+        if profile not in PROFILES:
+            raise ValueError(f'unknown render profile {profile}, expected one of {list(PROFILES)}')
+        self.profile = profile
+        self.options = dict(PROFILES[profile])
+        if dpi is not None:
+            self.options['dpi'] = dpi
+        if fmt is not None:
+            self.options['format'] = fmt
+        self.show = show
+        self.reuse = reuse and not show
+        self._figures = {}      # kind: (fig, ax)
+
+    def __repr__(self):
+        return f'Renderer({self.profile}, {self.options}, reuse={self.reuse})'
+
+    def figure(self, kind):
+        """
+        Рисунок и оси для графика вида kind: переиспользованные и очищенные или новые
+        """
+        if self.show:
+            import matplotlib.pyplot as plt
+            return plt.subplots()
+
+        if self.reuse and kind in self._figures:
+            fig, ax = self._figures[kind]
+            ax.clear()
+            return fig, ax
+
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        if not self.options['tight']:
+            fig.subplots_adjust(**FIXED_LAYOUT)
+        if self.reuse:
+            self._figures[kind] = (fig, ax)
+        return fig, ax
+
+    def output_path(self, filename):
+        """
+        Имя файла графика с расширением формата профиля
+        """
+        return pathlib.Path(filename).with_suffix('.' + self.options['format'])
+
+    def save(self, fig, filename):
+        """
+        Сохраняет рисунок, возвращает путь к файлу
+        """
+        if self.show:
+            import matplotlib.pyplot as plt
+            plt.show()
+
+        fmt = self.options['format']
+        path = self.output_path(filename)
+        kwargs = {'format': fmt}
+        if self.options['dpi'] is not None:
+            kwargs['dpi'] = self.options['dpi']
+        if self.options['tight']:
+            kwargs.update(bbox_inches='tight', pad_inches=0)
+        rc = {}
+        if fmt == 'svg':
+            # без даты и со своей солью id элементов (иначе uuid4) одинаковые данные дают одинаковый файл
+            kwargs['metadata'] = {'Date': None}
+            rc['svg.hashsalt'] = SVG_HASH_SALT
+        # пишем новый файл и подменяем старый: старый может быть жесткой ссылкой на файл в PlotCache
+        tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        try:
+            import matplotlib
+            with matplotlib.rc_context(rc):
+                fig.savefig(tmp, **kwargs)
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+        if self.show:
+            import matplotlib.pyplot as plt
+            plt.close(fig)
+        return path
+
+    def render(self, spec):
+        """
+        Рисует и сохраняет график по его описанию, возвращает путь к файлу
+        """
+        return RENDERERS[spec['kind']](self, spec)
+
+    def render_department(self, spec):
+        """
+        stacked bar по факультету по описанию DataPlotter.department_spec()
+        """
+        import numpy as np
+
+        headers = spec['headers']
+        ydata = np.array(spec['ydata'])
+
+        # данные по задачам
+        # столбцы 0, 1, 2, .. до последней задачи, первый столбец - общее кооличество студентов в группе
+        xdata = np.arange(len(headers))
+
+        logging.debug(xdata)
+        logging.debug(ydata)
+
+        width = 0.35  # the width of the bars: can also be len(x) sequence
+
+        fig, ax = self.figure(spec['kind'])
+
+        y_bottom = np.zeros(len(ydata[0]), dtype=int)
+
+        for i in range(ydata.shape[0]):
+            ax.bar(xdata, ydata[i], width, label=spec['labels'][i], bottom=y_bottom)  # , color=colors[i]
+            y_bottom = y_bottom + ydata[i]
+            logging.debug(f'y_bottom = {y_bottom}')
+
+        # числа сверху столбцов, без первого
+        x = xdata[1:]
+        y = y_bottom[1:]
+        for i in range(len(x)):
+            ax.annotate(str(y[i]),  # this is the text
+                        (x[i], y[i]),  # this is the point to label
+                        textcoords="offset points",  # how to position the text
+                        xytext=(0, 10),  # distance from text to points (x,y)
+                        ha='center')  # horizontal alignment can be left, right or center
+        ax.set_xticks(xdata)
+        ax.set_xticklabels(headers)
+        ax.set_title(spec['title'])
+        ax.legend(loc=self.options['legend_loc'])
+
+        return self.save(fig, spec['filename'])
+
+    def render_group(self, spec):
+        """
+        столбцы по 1 группе по описанию DataPlotter.group_spec()
+        """
+        import matplotlib.cm
+        import matplotlib.ticker
+        import numpy as np
+
+        headers = spec['headers']
+        colors = ['lightgray'] + get_colors(matplotlib.cm.tab10, len(headers)-1)   # gray - for student numbers
+
+        # данные по задачам
+        xdata = np.arange(len(headers))
+        ydata = spec['ydata']
+
+        fig, ax = self.figure(spec['kind'])
+
+        # рисуем столбик студентов и столбики задач
+        # каждая задача отдельным графиком, чтобы получить легенду по отдельным задачам, иначе можно было бы одним
+        # ax.bar(x, y, label, colors)
+        # и еще числа сверху каждого столбика - аннотации
+        for x, y in enumerate(ydata):
+            ax.bar([x + 1], [y], label=headers[x], color=colors[x])
+
+            ax.annotate(str(y),  # this is the text
+                        (x + 1, y),  # this is the point to label
+                        textcoords="offset points",  # how to position the text
+                        xytext=(0, 1 if x == 0 else 10),  # distance from text to points (x,y)
+                        ha='center')  # horizontal alignment can be left, right or center
+
+        # по оси У только целые числа, ибо студентов пополам не делим
+        ax.yaxis.set_major_locator(matplotlib.ticker.MaxNLocator(integer=True))
+        ax.set_xticks(xdata+1)
+        ax.set_xticklabels(headers)
+        ax.set_title(spec['title'])
+        #ax.legend()
+
+        return self.save(fig, spec['filename'])
+
+    def render_prob_pie(self, spec):
+        """
+        pie-диаграмма задачи по описанию DataPlotter.prob_pie_spec()
+        """
+        import matplotlib.cm
+
+        fracs = spec['fracs']
+        pie_colors =  get_colors(matplotlib.cm.tab10, spec['colors_number']) + ['lightgray']
+
+        fig, ax = self.figure(spec['kind'])
+
+        # The slices will be ordered and plotted counter-clockwise.
+        patches, texts = ax.pie(fracs, colors=pie_colors, startangle=90)
+        ax.legend(patches, spec['labels'], loc=self.options['legend_loc'])
+        # Set aspect ratio to be equal so that pie is drawn as a circle.
+        ax.axis('equal')
+
+        ax.set_title(spec['title'])
+
+        return self.save(fig, spec['filename'])
+
+
+RENDERERS = {
+    'department': Renderer.render_department,
+    'group': Renderer.render_group,
+    'prob_pie': Renderer.render_prob_pie,
+}
+
+_renderers = {}     # (profile, dpi, format): Renderer - свои рисунки в каждом процессе
+
+
+def get_renderer(profile='default', dpi=None, fmt=None):
+    """
+    Renderer этого процесса для указанных настроек, рисунки переиспользуются между вызовами
+    """
+    key = (profile, dpi, fmt)
+    if key not in _renderers:
+        _renderers[key] = Renderer(profile, dpi, fmt)
+    return _renderers[key]
+
+
+@functools.lru_cache(maxsize=None)
+def matplotlib_version():
+    """
+    Версия установленного matplotlib (без его импорта), None - не установлен
+    """
+    try:
+        return importlib.metadata.version('matplotlib')
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def spec_digest(spec):
+    """
+    Хеш содержимого графика: описание без имени файла, формат файла, RENDER_VERSION и версия matplotlib.
+    Одинаковый хеш - одинаковый файл графика, где бы его ни сохраняли (ключ PlotCache и --watch)
+    """
+    content = {key: value for key, value in spec.items() if key != 'filename'}
+    text = json.dumps([RENDER_VERSION, matplotlib_version(), plot_path(spec).suffix, content],
+                      sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(text.encode('utf8')).hexdigest()
+
+
+def plot_path(spec):
+    """
+    Путь к файлу, в который render_plot(spec) сохранит график
+    """
+    render = spec.get('render', {})
+    fmt = render.get('fmt') or PROFILES[render.get('profile', 'default')]['format']
+    return pathlib.Path(spec['filename']).with_suffix('.' + fmt)
+
+
+def render_plot(spec, show=False):
+    """
+    Рисует и сохраняет график по его описанию, настройки рисования в spec['render']
+    :return: путь к сохраненному файлу
+    """
+    render = spec.get('render', {})
+    if show:
+        renderer = Renderer(render.get('profile', 'default'), render.get('dpi'), render.get('fmt'), show=True)
+    else:
+        renderer = get_renderer(render.get('profile', 'default'), render.get('dpi'), render.get('fmt'))
+    return renderer.render(spec)
+
+
+class PlotCache:
+    """
+    Кеш файлов графиков по содержимому.
+    cache = PlotCache(cache_dir)
+    if not cache.fetch(spec):       # файла нет в кеше
+        render_plot(spec)
+        cache.store(spec)
+    """
+    def __init__(self, cache_dir=None, max_size=512 * 2**20):
+        """
+        :param cache_dir: директория кеша графиков
+        :param max_size: максимальный суммарный размер файлов кеша в байтах
+        """
+        self.cache_dir = pathlib.Path(cache_dir) if cache_dir is not None else default_cache_dir() / PLOT_CACHE_DIR
+        self.max_size = max_size
+        self.hits = 0
+        self.rendered = 0
+
+    def __repr__(self):
+        return f'PlotCache({self.cache_dir}, hits={self.hits}, rendered={self.rendered})'
+
+    def entry_path(self, spec):
+        """
+        Файл кеша для графика spec
+        """
+        return self.cache_dir / (spec_digest(spec) + plot_path(spec).suffix)
+
+    def fetch(self, spec):
+        """
+        Кладет файл графика spec из кеша в plot_path(spec)
+        :return: True, если график был в кеше
+        """
+        entry = self.entry_path(spec)
+        path = plot_path(spec)
+        try:
+            if not (path.exists() and os.path.samefile(entry, path)):
+                PlotCache._place(entry, path)
+                logging.debug(f'plot {path} is taken from cache {entry}')
+            os.utime(entry)     # запись использовали - она последней пойдет на вытеснение
+        except FileNotFoundError:
+            return False
+        self.hits += 1
+        return True
+
+    def store(self, spec):
+        """
+        Сохраняет в кеш только что нарисованный файл графика spec
+        """
+        self.rendered += 1
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        PlotCache._place(plot_path(spec), self.entry_path(spec))
+
+    def evict(self):
+        """
+        Удаляет давно не использованные файлы, пока суммарный размер кеша больше max_size.
+        Чужие файлы и временные файлы _place в директории кеша не трогаются.
+        """
+        entries = []
+        for path in self.cache_dir.glob('*.*'):
+            if not PLOT_ENTRY.fullmatch(path.name):
+                continue
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def summary(self):
+        """
+        Сколько графиков взято из кеша и сколько нарисовано
+        """
+        return f'{self.hits} plots from cache, {self.rendered} rendered'
+
+    @staticmethod
+    def _place(source, target):
+        """
+        Жесткая ссылка (или копия, если ссылку сделать нельзя, например другой диск) source в target,
+        через временный файл, поэтому target никогда не бывает недописанным
+        """
+        tmp = target.with_name(f'{target.name}.{os.getpid()}.tmp')
+        try:
+            try:
+                os.link(source, tmp)
+            except FileNotFoundError:
+                raise
+            except OSError:
+                shutil.copyfile(source, tmp)
+            os.replace(tmp, target)
+        finally:
+            tmp.unlink(missing_ok=True)
@@ -0,0 +1,161 @@
+import functools
+import logging
+import os
+import pathlib
+
+from ej_cache import default_cache_dir
+
+"""
+Html отчеты: таблицы результатов контестов и сайт отчетов семестра.
+
+Jinja Environment создается один раз на процесс (environment кеширует его), скомпилированные шаблоны
+хранятся в кеше байткода на диске, поэтому следующие запуски шаблоны не компилируют.
+Страницы пишутся потоком (template.stream(...).dump), без сборки всей страницы в одну строку,
+и заменяют старый файл, только если изменились.
+
+Сайт отчетов (поле конфига site_dir или ключ --site):
+* <department>_<stage>.html - страница контеста: таблицы по задачам контеста и по всем задачам,
+* index.html - факультеты x контрольные со ссылками на страницы контестов.
+
+report = ReportBuilder('site')
+report.add_tables('DPQE', 'dec', 'Все задачи', [(header, body, footer, '')])
+report.write_contest('DPQE', 'dec')
+report.write_index([('DPQE', 'dec'), ('FALT', 'dec')])
+"""
+
+TEMPLATE_DIR = pathlib.Path(__file__).parent / 'jinja_templates'
+TABLE_TEMPLATE = 'result_table_template.html'
+CONTEST_TEMPLATE = 'contest_page_template.html'
+INDEX_TEMPLATE = 'index_page_template.html'
+INDEX_PAGE = 'index.html'
+BYTECODE_DIR = 'jinja'      # поддиректория кеша для байткода шаблонов
+
+
+@functools.lru_cache(maxsize=None)
+def environment(template_dir=TEMPLATE_DIR, bytecode_dir=None):
+    """
+    Jinja Environment шаблонов template_dir, один на процесс для каждой пары аргументов
+    :param bytecode_dir: директория кеша скомпилированных шаблонов, None - не кешировать на диске
+    """
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+    bytecode_cache = None
+    if bytecode_dir is not None:
+        pathlib.Path(bytecode_dir).mkdir(parents=True, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(str(bytecode_dir))
+    return Environment(loader=FileSystemLoader([str(template_dir)]), bytecode_cache=bytecode_cache)
+
+
+def dump_if_changed(path, template, **context):
+    """
+    Пишет страницу template потоком во временный файл рядом и заменяет им path, только если содержимое другое
+    (неизменившиеся страницы не перезаписываются, как write_if_changed)
+    :return: True, если файл записан
+    """
+    path = pathlib.Path(path)
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    try:
+        with open(tmp, 'w', encoding='utf8', newline='') as fh:
+            template.stream(**context).dump(fh)
+        try:
+            if path.stat().st_size == tmp.stat().st_size and path.read_bytes() == tmp.read_bytes():
+                logging.debug(f'{path} is not changed')
+                return False
+        except FileNotFoundError:
+            pass
+        os.replace(tmp, path)
+        return True
+    finally:
+        # не замененный временный файл (страница не изменилась или ошибка шаблона) не остается в директории сайта
+        tmp.unlink(missing_ok=True)
+
+
+def bytecode_dir(cache=True, cache_dir=None):
+    """
+    Кеш байткода шаблонов рядом с кешем run dump
+    :param cache: поле конфига cache, False - без кеша на диске (None)
+    :param cache_dir: поле конфига cache_dir, None - кеш по умолчанию
+    """
+    if not cache:
+        return None
+    return pathlib.Path(cache_dir or default_cache_dir()) / BYTECODE_DIR
+
+
+def contest_page(department, stage):
+    """
+    Имя страницы контеста на сайте отчетов
+    """
+    return f'{department}_{stage}.html'
+
+
+class ReportBuilder:
+    """
+    Пишет html таблицы контестов и собирает сайт отчетов в site_dir.
+    Таблицы контеста копятся в add_tables (фильтрованные и нефильтрованные по задачам считаются
+    в разное время), страница контеста пишется целиком в write_contest.
+    """
+    def __init__(self, site_dir=None, template_dir=TEMPLATE_DIR, bytecode_dir=None):
+        """
+        :param site_dir: директория сайта отчетов, None - писать только таблицы контестов
+        :param bytecode_dir: кеш скомпилированных шаблонов, None - без кеша на диске
+        """
+        self.site_dir = pathlib.Path(site_dir) if site_dir is not None else None
+        self.env = environment(pathlib.Path(template_dir), bytecode_dir)
+        self.sections = {}      # (department, stage): [(заголовок, [(header, body, footer, percent)])]
+
+    def __repr__(self):
+        return f'ReportBuilder({self.site_dir})'
+
+    @classmethod
+    def from_config(cls, cfg):
+        """
+        Сайт и кеш байткода из конфига контеста: кеш рядом с кешем run dump, без кеша при cache = False
+        """
+        return cls(cfg.site_dir, bytecode_dir=bytecode_dir(cfg.cache, cfg.cache_dir))
+
+    def write_table(self, html_file, header, body, footer, percent=''):
+        """
+        Html таблица одного контеста (кусок страницы без <html>)
+        :param percent: '%' для таблицы процентов
+        :return: True, если файл записан
+        """
+        template = self.env.get_template(TABLE_TEMPLATE)
+        return dump_if_changed(html_file, template, header=header, body=body, footer=footer, percent=percent)
+
+    def add_tables(self, department, stage, title, tables):
+        """
+        Добавляет на страницу контеста раздел title с таблицами [(header, body, footer, percent)]
+        """
+        self.sections.setdefault((department, stage), []).append((title, tables))
+
+    def write_contest(self, department, stage):
+        """
+        Пишет страницу контеста со всеми добавленными разделами
+        """
+        sections = self.sections.pop((department, stage), [])
+        if self.site_dir is None or not sections:
+            return False
+        self.site_dir.mkdir(parents=True, exist_ok=True)
+        template = self.env.get_template(CONTEST_TEMPLATE)
+        page = self.site_dir / contest_page(department, stage)
+        written = dump_if_changed(page, template, department=department, stage=stage, sections=sections,
+                                  index=INDEX_PAGE)
+        logging.info(f'site page {page}')
+        return written
+
+    def write_index(self, contests):
+        """
+        Пишет index.html: факультеты x контрольные, ссылки на уже написанные страницы контестов
+        :param contests: [(department, stage)] в порядке конфига
+        """
+        if self.site_dir is None:
+            return False
+        self.site_dir.mkdir(parents=True, exist_ok=True)
+        departments = list(dict.fromkeys(dep for dep, _ in contests))
+        stages = list(dict.fromkeys(stage for _, stage in contests))
+        pages = {(dep, stage): contest_page(dep, stage) for dep, stage in contests
+                 if (self.site_dir / contest_page(dep, stage)).exists()}
+        template = self.env.get_template(INDEX_TEMPLATE)
+        page = self.site_dir / INDEX_PAGE
+        written = dump_if_changed(page, template, departments=departments, stages=stages, pages=pages)
+        logging.info(f'site index {page}: {len(pages)} contest pages')
+        return written
@@ -0,0 +1,161 @@
+import array
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'ej_common'))
+from ej_dump import to_int
+
+"""
+Колоночное хранилище посылок (run dump) и таблиц результатов Ejudge.
+
+Вместо списка словарей (42 строки на каждую посылку) храним по одному массиву на каждую нужную колонку:
+* строковые колонки (User_Login, Prob, Stat_Short, Group, ...) - массив целых кодов в общую таблицу строк StringTable
+* числовые колонки (Time, Run_Id, очки задач) - массив int64
+
+Память растет с количеством разных значений, а не с количеством строк x колонок.
+"""
+
+# колонки run dump, которые нужны для подсчета результатов
+DUMP_STR_COLUMNS = ('User_Login', 'User_Inv', 'Prob', 'Stat_Short')
+DUMP_INT_COLUMNS = ('Run_Id', 'Time')
+
+CODE_TYPECODE = 'i'     # коды строк
+INT_TYPECODE = 'q'      # int64
+
+
+class StringTable:
+    """
+    Таблица строк: каждая разная строка хранится один раз, в колонках лежат только ее коды.
+    values[code] -> строка, code(строка) -> код (новая строка получает следующий код)
+    """
+    def __init__(self, values=()):
+        self.values = []
+        self._codes = {}
+        for v in values:
+            self.code(v)
+
+    def __repr__(self):
+        return f'StringTable({self.values})'
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+    def __contains__(self, value):
+        return value in self._codes
+
+    def code(self, value):
+        """
+        Возвращает код строки value, добавляет строку в таблицу, если ее еще нет
+        """
+        c = self._codes.get(value)
+        if c is None:
+            c = len(self.values)
+            self._codes[value] = c
+            self.values.append(value)
+        return c
+
+    def find(self, value):
+        """
+        Код строки value или None, если такой строки в таблице нет
+        """
+        return self._codes.get(value)
+
+
+class RunStore:
+    """
+    Колоночное хранилище: columns[name] - array с кодами (строковые колонки) или числами (числовые колонки),
+    tables[name] - таблица строк для строковой колонки name.
+    """
+    def __init__(self, str_columns=(), int_columns=(), tables=None):
+        """
+        :param str_columns: имена строковых колонок (хранятся кодами)
+        :param int_columns: имена числовых колонок (хранятся int64)
+        :param tables: {name: StringTable} - уже существующие таблицы строк, чтобы делить их между хранилищами
+        """
+        tables = tables or {}
+        self.tables = {name: tables.get(name) or StringTable() for name in str_columns}
+        self.columns = {name: array.array(CODE_TYPECODE) for name in str_columns}
+        self.columns.update({name: array.array(INT_TYPECODE) for name in int_columns})
+
+    def __repr__(self):
+        return f'RunStore(rows={len(self)}, columns={list(self.columns)})'
+
+    def __len__(self):
+        for col in self.columns.values():
+            return len(col)
+        return 0
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    @classmethod
+    def from_rows(cls, rows, str_columns=(), int_columns=(), tables=None):
+        """
+        Создает хранилище из итератора словарей (например, csv.DictReader), словари не сохраняются
+        """
+        store = cls(str_columns, int_columns, tables)
+        store.extend(rows)
+        return store
+
+    def extend(self, rows):
+        """
+        Дописывает в хранилище строки из итератора словарей, берутся только колонки хранилища
+        """
+        str_columns = [(name, self.columns[name].append, self.tables[name].code) for name in self.tables]
+        int_columns = [(name, self.columns[name].append) for name in self.columns if name not in self.tables]
+        for r in rows:
+            for name, append, code in str_columns:
+                append(code(r.get(name) or ''))
+            for name, append in int_columns:
+                append(to_int(r.get(name)))
+
+    def extend_columns(self, chunks):
+        """
+        Дописывает в хранилище куски колонок: [значения колонки] в порядке self.columns,
+        строковые колонки - уже коды в self.tables (как выдает CsvTable.select_columns с tables=self.tables)
+        """
+        columns = list(self.columns.values())
+        for values in chunks:
+            for col, data in zip(columns, values):
+                col.extend(data)
+
+    def add_column(self, name, data, table=None):
+        """
+        Добавляет уже посчитанную колонку: data - array кодов в table или array чисел, если table is None
+        """
+        if len(data) != len(self):
+            raise ValueError(f'column {name} has {len(data)} rows, store has {len(self)}')
+        self.columns[name] = data
+        if table is not None:
+            self.tables[name] = table
+
+    def column(self, name):
+        return self.columns[name]
+
+    def table(self, name):
+        return self.tables[name]
+
+    def decoded(self, name):
+        """
+        Итератор по значениям колонки name: строки для строковых колонок, числа для числовых
+        """
+        col = self.columns[name]
+        table = self.tables.get(name)
+        if table is None:
+            return iter(col)
+        return map(table.values.__getitem__, col)
+
+    def rows(self, *names):
+        """
+        Итератор по кортежам значений колонок names, построчно
+        """
+        return zip(*(self.decoded(name) for name in names))
+
+    def nbytes(self):
+        """
+        Сколько байт занимают массивы колонок (без таблиц строк)
+        """
+        return sum(col.itemsize * len(col) for col in self.columns.values())
@@ -0,0 +1,83 @@
+import logging
+
+"""
+Счетчики Data.fiter_data: сколько посылок и почему не учтено, с разбивкой по группам и задачам.
+Вместо сообщения в лог на каждую посылку - одна сводка после подсчета.
+
+stats = FilterStats()
+data.fiter_data(runs, stats=stats)
+stats.count(NOT_OK)                 # всего не OK посылок
+stats.by_group(OUT_OF_WINDOW)       # {'702': 3, '705': 1}
+stats.by_prob(COUNTED)              # {'C-DPQE': 40, ...}
+"""
+
+COUNTED = 'counted'                         # учтенные OK посылки
+SKIPPED_INVISIBLE = 'skipped_invisible'     # посылки невидимых пользователей (User_Inv)
+UNKNOWN_GROUP = 'unknown_group'             # логин не относится ни к одной группе
+NOT_OK = 'not_ok'                           # статус не тот, что считаем (не OK)
+OUT_OF_WINDOW = 'out_of_window'             # OK посылка до начала или после конца контеста (дорешивание)
+
+REASONS = (COUNTED, SKIPPED_INVISIBLE, UNKNOWN_GROUP, NOT_OK, OUT_OF_WINDOW)
+
+
+class FilterStats:
+    def __init__(self):
+        self.counts = {}                # (reason, group, prob): количество посылок
+        self.invisible_logins = set()   # логины невидимых пользователей
+
+    def __repr__(self):
+        return f'FilterStats({self.totals()})'
+
+    def add(self, reason, group, prob, n=1):
+        """
+        Учитывает n посылок (group, prob), не учтенных или учтенных по причине reason
+        """
+        key = (reason, group, prob)
+        self.counts[key] = self.counts.get(key, 0) + n
+
+    def count(self, reason, group=None, prob=None):
+        """
+        Количество посылок по причине reason, всего или только группы group и/или задачи prob
+        """
+        return sum(n for (r, g, p), n in self.counts.items()
+                   if r == reason and (group is None or g == group) and (prob is None or p == prob))
+
+    def by_group(self, reason):
+        """
+        {группа: количество посылок по причине reason}
+        """
+        return self._by(reason, 1)
+
+    def by_prob(self, reason):
+        """
+        {задача: количество посылок по причине reason}
+        """
+        return self._by(reason, 2)
+
+    def totals(self):
+        """
+        {причина: количество посылок} по всем причинам REASONS
+        """
+        return {reason: self.count(reason) for reason in REASONS}
+
+    def _by(self, reason, index):
+        res = {}
+        for key, n in self.counts.items():
+            if key[0] == reason:
+                res[key[index]] = res.get(key[index], 0) + n
+        return res
+
+    def summary(self):
+        """
+        Сводка одной строкой: сколько посылок учтено и сколько пропущено по каждой причине
+        """
+        totals = self.totals()
+        parts = [f'{reason}={n}' for reason, n in totals.items()]
+        if totals[OUT_OF_WINDOW]:
+            parts.append(f'out_of_window by group {self.by_group(OUT_OF_WINDOW)}')
+        if self.invisible_logins:
+            parts.append(f'invisible users {sorted(self.invisible_logins)}')
+        return 'runs: ' + ', '.join(parts)
+
+    def log_summary(self):
+        logging.info(self.summary())
@@ -0,0 +1,196 @@
+import datetime
+import logging
+import os
+import pathlib
+import sqlite3
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'ej_common'))
+from ej_reader import open_table, read_table, KIND_LOGINS
+from ej_runs import to_int
+
+"""
+Склад посылок семестра: run dump и списки логинов всех контестов (test, oct, dec каждого факультета)
+в одной базе SQLite. Csv разбирается один раз при импорте, дальше подсчет - агрегатные запросы.
+
+Таблицы:
+* contests - импортированные контесты: файл данных, его размер и mtime при импорте,
+* runs - посылки (только нужные для подсчета колонки), лежат по порядку (contest, login, run_id), поэтому
+  запросы подсчета (группировка по логинам контеста) читают таблицу подряд по первичному ключу, других индексов нет,
+* logins - списки логинов с группами (login_list), login_lists - их файлы, размер и mtime при импорте.
+
+Контест - строка '<department>_<stage>'. Вопросы по нескольким контестам - обычный SQL:
+    SELECT contest, COUNT(DISTINCT login) FROM runs WHERE status = 'OK' GROUP BY contest
+
+warehouse = Warehouse('semestr.sqlite')
+warehouse.import_runs('DPQE_dec', 'DPQE_dec.csv')
+warehouse.close()
+"""
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contests (
+    contest TEXT PRIMARY KEY,
+    file TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    runs INTEGER NOT NULL,
+    imported_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    contest TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    time INTEGER NOT NULL,
+    login TEXT NOT NULL,
+    user_name TEXT NOT NULL,
+    user_inv TEXT NOT NULL,
+    prob TEXT NOT NULL,
+    status TEXT NOT NULL,
+    grp TEXT,
+    PRIMARY KEY (contest, login, run_id)
+) WITHOUT ROWID;
+-- индексы первых версий: запросы подсчета их не используют, а импорт они замедляют
+DROP INDEX IF EXISTS runs_contest_prob_status;
+DROP INDEX IF EXISTS runs_time;
+CREATE TABLE IF NOT EXISTS logins (
+    contest TEXT NOT NULL,
+    login TEXT NOT NULL,
+    grp TEXT NOT NULL,
+    PRIMARY KEY (contest, login)
+);
+CREATE TABLE IF NOT EXISTS login_lists (
+    contest TEXT PRIMARY KEY,
+    file TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+"""
+
+BATCH_SIZE = 10000      # посылок в одном executemany
+
+
+class Warehouse:
+    def __init__(self, path):
+        """
+        Открывает (создает) базу path
+        """
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        version = self.db.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            raise ValueError(f'{self.path}: schema version {version}, expected {SCHEMA_VERSION}')
+        self.db.executescript(SCHEMA)
+        self.db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def __repr__(self):
+        return f'Warehouse({self.path})'
+
+    def close(self):
+        self.db.close()
+
+    def is_fresh(self, contest, file, logins=False):
+        """
+        Контест импортирован из файла file, и файл с тех пор не менялся
+        :param logins: file - список логинов контеста, а не run dump
+        """
+        table = 'login_lists' if logins else 'contests'
+        row = self.db.execute(f'SELECT file, size, mtime_ns FROM {table} WHERE contest = ?', (contest,)).fetchone()
+        if row is None:
+            return False
+        st = os.stat(file)
+        return row == (str(pathlib.Path(file).resolve()), st.st_size, st.st_mtime_ns)
+
+    def import_runs(self, contest, file, delimiter=None):
+        """
+        Заменяет посылки контеста contest посылками run dump file.
+        Пустые Time и другие числа - 0, как в RunStore, строки без Run_Id пропускаются.
+        :return: количество импортированных посылок
+        """
+        st = os.stat(file)
+        with open_table(file, delimiter) as table, self.db:
+            has_name, has_group = 'User_Name' in table.fieldnames, 'Group' in table.fieldnames
+            # у короткой строки недостающие поля None, как в RunStore - пустые
+            rows = ((contest, to_int(r['Run_Id']), to_int(r['Time']), r['User_Login'] or '',
+                     (r['User_Name'] or '') if has_name else '', r['User_Inv'] or '', r['Prob'] or '',
+                     r['Stat_Short'] or '', r['Group'] if has_group else None) for r in table if r['Run_Id'])
+            self.db.execute('DELETE FROM runs WHERE contest = ?', (contest,))
+            n = 0
+            while True:
+                batch = [r for _, r in zip(range(BATCH_SIZE), rows)]
+                if not batch:
+                    break
+                self.db.executemany('INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', batch)
+                n += len(batch)
+            self.db.execute('INSERT OR REPLACE INTO contests VALUES (?, ?, ?, ?, ?, ?)',
+                            (contest, str(pathlib.Path(file).resolve()), st.st_size, st.st_mtime_ns, n,
+                             datetime.datetime.now().isoformat(timespec='seconds')))
+        logging.info(f'{self}: {n} runs of {contest} are imported from {file}')
+        return n
+
+    def import_logins(self, contest, file):
+        """
+        Заменяет список логинов контеста contest списком из csv файла Group;Login
+        """
+        st = os.stat(file)
+        logins = [(contest, r['Login'], r['Group']) for r in read_table(file, kind=KIND_LOGINS)]
+        with self.db:
+            self.db.execute('DELETE FROM logins WHERE contest = ?', (contest,))
+            self.db.executemany('INSERT OR REPLACE INTO logins VALUES (?, ?, ?)', logins)
+            self.db.execute('INSERT OR REPLACE INTO login_lists VALUES (?, ?, ?, ?)',
+                            (contest, str(pathlib.Path(file).resolve()), st.st_size, st.st_mtime_ns))
+        logging.info(f'{self}: {len(logins)} logins of {contest} are imported from {file}')
+        return len(logins)
+
+    def logins(self, contest):
+        """
+        Список логинов контеста {login: group}
+        """
+        return dict(self.db.execute('SELECT login, grp FROM logins WHERE contest = ?', (contest,)))
+
+    def users(self, contest):
+        """
+        Логины контеста с User_Name и Group их первой посылки: [(login, user_name, group, run_id первой посылки)]
+        """
+        return self.db.execute('SELECT login, user_name, grp, MIN(run_id) FROM runs WHERE contest = ? GROUP BY login',
+                               (contest,)).fetchall()
+
+    def first_times(self, contest, status=None):
+        """
+        Время первой посылки каждого видимого логина (со статусом status, если он задан): {login: time}
+        """
+        query = "SELECT login, MIN(time) FROM runs WHERE contest = ? AND user_inv = ''"
+        args = (contest,)
+        if status is not None:
+            query += ' AND status = ?'
+            args += (status,)
+        return dict(self.db.execute(query + ' GROUP BY login', args))
+
+    def run_counts(self, contest, counted_status='OK', windows=None):
+        """
+        Количество посылок контеста, сгруппированных по логину, задаче, невидимости, статусу и попаданию в окно
+        :param windows: {login: (начало, конец)} - окна контеста по логинам, None - окна нет (все посылки в окне)
+        :return: [(login, prob, невидимый, статус counted_status, в окне, количество)]
+        """
+        with self.db:
+            self.db.execute('CREATE TEMP TABLE IF NOT EXISTS windows (login TEXT PRIMARY KEY, start, end)')
+            self.db.execute('DELETE FROM windows')
+            if windows:
+                self.db.executemany('INSERT INTO windows VALUES (?, ?, ?)',
+                                    ((login, start, end) for login, (start, end) in windows.items()))
+            in_window = 'r.time BETWEEN w.start AND w.end' if windows is not None else '1'
+            return self.db.execute(f"""
+                SELECT r.login, r.prob, r.user_inv != '' AS inv, r.status = ? AS ok, {in_window} AS in_window,
+                       COUNT(*)
+                FROM runs r LEFT JOIN windows w ON w.login = r.login
+                WHERE r.contest = ?
+                GROUP BY r.login, r.prob, inv, ok, in_window
+            """, (counted_status, contest)).fetchall()
+
+
+def contest_key(department, stage):
+    """
+    Имя контеста в базе
+    """
+    return f'{department}_{stage}'
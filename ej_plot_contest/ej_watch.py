@@ -0,0 +1,139 @@
+import logging
+import os
+import pathlib
+import time
+
+"""
+Ожидание изменений файлов данных для режима --watch.
+
+Изменения ловятся через inotify (если установлен пакет inotify_simple), иначе файлы опрашиваются через stat
+раз в interval секунд. Экспорт dump обычно пишет файл несколькими порциями, поэтому после первого изменения
+ждем, пока файлы не перестанут меняться debounce секунд: серия записей дает одно обновление.
+"""
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+
+def write_if_changed(path, text):
+    """
+    Записывает текст в файл, только если содержимое файла другое.
+    Неизменившиеся таблицы не перезаписываются (не меняется mtime, не перезагружаются открытые страницы).
+    :return: True, если файл записан
+    """
+    path = pathlib.Path(path)
+    try:
+        with open(path, encoding='utf8', newline='') as fh:
+            if fh.read() == text:
+                logging.debug(f'{path} is not changed')
+                return False
+    except (FileNotFoundError, UnicodeDecodeError):
+        pass
+    with open(path, 'w', encoding='utf8', newline='') as fh:
+        fh.write(text)
+    return True
+
+
+class FileWatcher:
+    """
+    watcher = FileWatcher([file1, file2])
+    while True:
+        changed = watcher.wait()    # множество изменившихся файлов
+    """
+    def __init__(self, files, interval=2.0, debounce=2.0, use_inotify=True):
+        """
+        :param files: файлы, за которыми следим
+        :param interval: период опроса в секундах, если нет inotify
+        :param debounce: сколько секунд файлы не должны меняться, чтобы считать запись законченной
+        :param use_inotify: использовать inotify, если он доступен
+        """
+        self.files = [pathlib.Path(f).resolve() for f in files]
+        self.interval = interval
+        self.debounce = debounce
+        self._inotify = None
+        self._watches = {}      # wd: директория
+        if use_inotify and inotify_simple is not None:
+            self._start_inotify()
+        self._stats = {f: self._stat(f) for f in self.files}
+        logging.info(f'watch {[str(f) for f in self.files]} using {"inotify" if self._inotify else "polling"}')
+
+    def __repr__(self):
+        return f'FileWatcher({self.files}, interval={self.interval}, debounce={self.debounce})'
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def wait(self):
+        """
+        Ждет изменения файлов и окончания серии записей
+        :return: множество изменившихся файлов (pathlib.Path)
+        """
+        changed = set()
+        while not changed:
+            self._wait_event(None)
+            changed = self._changed()
+        # дописываются порциями: ждем, пока debounce секунд не будет новых изменений
+        while self._wait_event(self.debounce):
+            changed |= self._changed()
+        changed |= self._changed()
+        logging.info(f'changed: {[str(f) for f in changed]}')
+        return changed
+
+    def _start_inotify(self):
+        flags = inotify_simple.flags
+        mask = flags.CLOSE_WRITE | flags.MODIFY | flags.MOVED_TO | flags.CREATE
+        try:
+            self._inotify = inotify_simple.INotify()
+            # следим за директориями: экспорт может заменить файл новым (rename), а не дописать его
+            for directory in {f.parent for f in self.files}:
+                self._watches[self._inotify.add_watch(directory, mask)] = directory
+        except OSError as e:
+            logging.warning(f'inotify is not available ({e}), poll files')
+            self.close()
+
+    def _wait_event(self, timeout):
+        """
+        Ждет событие об одном из файлов не дольше timeout секунд (None - без ограничения)
+        :return: True, если было событие (при опросе - файл изменился)
+        """
+        if self._inotify is None:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while deadline is None or time.monotonic() < deadline:
+                time.sleep(self.interval if deadline is None else min(self.interval, max(deadline - time.monotonic(), 0)))
+                if any(self._stat(f) != self._stats[f] for f in self.files):
+                    return True
+            return False
+
+        names = {(f.parent, f.name) for f in self.files}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            left = None if deadline is None else max(deadline - time.monotonic(), 0)
+            events = self._inotify.read(timeout=None if left is None else int(left * 1000))
+            if any((self._watches.get(e.wd), e.name) in names for e in events):
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def _changed(self):
+        """
+        Файлы, у которых изменились размер, время изменения или inode с прошлой проверки
+        """
+        changed = set()
+        for f in self.files:
+            st = self._stat(f)
+            if st != self._stats[f]:
+                self._stats[f] = st
+                changed.add(f)
+        return changed
+
+    @staticmethod
+    def _stat(file):
+        try:
+            st = os.stat(file)
+        except FileNotFoundError:
+            return None
+        return st.st_size, st.st_mtime_ns, st.st_ino
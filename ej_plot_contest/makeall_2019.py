@@ -8,7 +8,7 @@ import pathlib
 import sys
 
 sys.path.append(os.path.dirname(__file__))
-from ej_plot_contest import Params, Data
+from ej_plot_contest import add_contest_args, config_overrides, process_contests, LOG_FORMAT
 
 def get_flat_dict(d, department, stage):
     """
@@ -26,8 +26,8 @@ def get_flat_dict(d, department, stage):
             dres['department'] = department
             d1 = d['department'][department]
 
-    print(dres)
-    print(d1)
+    logging.debug(f'config: {dres}')
+    logging.debug(f'department {department}: {d1}')
     # сначала обрабатываем все ключи высших уровней, потом перезаписываем их уровнем stage
     for st in d1:
         if st != 'stage':
@@ -37,47 +37,29 @@ def get_flat_dict(d, department, stage):
     dres.update(d1['stage'][stage])
     return dres
 
-def process_data(cfg:Params):
-    """
-    Обработка данных и вывод результатов
-    :param cfg: конфиг, где указано что брать, как обрабатывать и куда класть результаты
-    :return:
-    """
-    # разбираем файл данных
-    if args.text_only:
-        data = Data(cfg)
-        data.print_table()
-    else:
-        from ej_plotter import DataPlotter
-        data = DataPlotter(cfg)
-        data.print_table()
-        data.plot_all(args.show)
 
+def build_parser(prog=None):
+    parser = argparse.ArgumentParser(
+        description='Calculate statistics for all Ejudge contests described into config json',
+        prog=prog,
+        usage=f'\n\t{prog or sys.argv[0]} cfg_2019.json FRTK dec --text_only',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    # те же ключи, что у ej_plot_contest.py, кроме --show_plots: графики только сохраняются в файлы
+    return add_contest_args(parser, show_plots=False)
 
-if __name__ == '__main__':
 
+def main(argv=None, prog=None):
+    """
+    makeall_2019.py config [department] [stage]
+    :param argv: аргументы командной строки, None - sys.argv[1:]
+    """
     logging.basicConfig(
         level=logging.INFO,
-        format='%(levelname)s:%(lineno)d  \t%(message)s'
+        format=LOG_FORMAT
         )
 
-    parser = argparse.ArgumentParser(
-        description='Calculate statistics for all Ejudge contests described into config json',
-        usage=f'\n\t{sys.argv[0]} cfg_2019.json FRTK dec --text_only',
-        formatter_class=argparse.ArgumentDefaultsHelpFormatter
-    )
-    parser.add_argument("config", help="config in json format")
-    parser.add_argument("department", help="Department name in config dictionary", default=None, nargs='?')
-    parser.add_argument("stage", help="stage name in config dictionary", default=None, nargs='?')
-    parser.add_argument("--config_only", help="prevent any data processing, only print resulted config, for debug only!",
-                        default=False, action="store_true")
-    parser.add_argument("--text_only", help="prevent prot data, use if no matplotlib",
-                        default=False, action="store_true")
-    parser.add_argument('-v', "--verbose", help="increase verbosity",
-                        action="store_true")
-
-    args = parser.parse_args()
-    args.show = False   # никогда не показываем интерактивно графики, только сохраняем их в файлы
+    args = build_parser(prog).parse_args(argv)
 
     if args.verbose:
         print("verbosity turned on")
@@ -89,34 +71,30 @@ if __name__ == '__main__':
 
     with open(config_path, 'r', encoding='utf8') as read_file:
         config = json.load(read_file)
-    json.dump(config, indent=4, fp=sys.stdout)
+    logging.debug(json.dumps(config, indent=4, ensure_ascii=False))
+
+    # параметры командной строки перекрывают поля конфига каждого контеста, как в ej_plot_contest.py
+    overrides = config_overrides(args, base_dir)
 
     logging.info(f'file={args.config} dep={args.department} stage={args.stage}')
 
     departments = config['department'].keys() if args.department is None else [args.department]
     stages = ['test', 'oct', 'dec'] if args.stage is None else [args.stage]
 
+    contests = []
     for dep in departments:
         for st in stages:
-            print(dep, st)
             d = get_flat_dict(config, dep, st)
-            json.dump(d,indent=4, fp=sys.stdout)
+            logging.debug(f'{dep} {st}: {json.dumps(d, indent=4, ensure_ascii=False)}')
             if d is None:
                 logging.warning(f'Config file has not department {dep} and stage {st}')
                 continue
-            cfg = Params.from_dict(config_dir, d)
-            if not args.config_only:
-                process_data(cfg)
-            logging.info(cfg.output_dir)
+            d.update(overrides)
+            contests.append(d)
 
-            # а теперь данные, не отфильтрованные по задачам. Чтобы два раза не запускать с фильтрованным и нефильтрованным конфигом.
-            if d['problems']:
-
-                d['problems'] = ''
-                d['output_dir'] = 'res_unfiltered'
-                cfg = Params.from_dict(config_dir, d)
-                if not args.config_only:
-                    process_data(cfg)
-                logging.info(cfg.output_dir)
+    # фильтрованные и нефильтрованные по задачам результаты считаются по одному разбору файла данных
+    process_contests(args, contests, config_dir)
 
 
+if __name__ == '__main__':
+    main()
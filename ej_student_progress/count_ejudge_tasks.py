@@ -2,28 +2,21 @@ import argparse
 import csv
 import json
 import logging
+import os
+import re
+import string
 import sys
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'ej_common'))
+from ej_profile import StageProfiler
+from ej_reader import open_table, KIND_STANDINGS
+
 """
 Parse dumped runs, get OK statistics: prob_
 Run_Id;Time;Nsec;Time2;Date;Year;Mon;Day;Hour;Min;Sec;Dur;Dur_Day;Dur_Hour;Dur_Min;Dur_Sec;Size;IPV6_Flag;IP;SSL_Flag;Sha1;User_Id;User_Login;User_Name;User_Inv;User_Ban;User_Lock;Prob;Variant;Lang;Content_Type;Stat_Short;Status;Score;Score_Adj;Test;Import_Flag;Hidden_Flag;RO_Flag;Locale_Id;Pages;Judge_Id
 1593;1576160067;253221000;20191212171427;20191212;2019;12;12;17;14;27;10646;0;02;57;26;1076;0;10.55.131.43;0;49563b565fed363984a340b94ab6fdc354c0c202;10089;ed95080609;Григорьевых Илья Дмитриевич   Б04-905;;;;F-DPQE;0;gcc-vg;;PT;Partial solution;4;0;4;1;0;0;0;1;0;0
 """
 
-def read_runs(file, delimeter=';'):
-    """ get scv data from file as list of tuples
-    file with data:
-    A;B;C
-    1;2;3
-    parse as
-    OrderedDict([('A', '1'), ('B', '2'), ('C', '3')])
-    OrderedDict([('A', '10'), ('B', '20'), ('C', '30')])    
-    """
-    with open(file, encoding="utf8") as fh:
-        rd = csv.DictReader(fh, delimiter=';')
-        runs = [dict(row) for row in rd]
-    return runs
-
 def fiter_data(runs, task_fiter, login_list, counted_status='OK'):
     """
     Create table:
@@ -57,6 +50,102 @@ def fiter_data(runs, task_fiter, login_list, counted_status='OK'):
     logging.debug(f'group_numbers={group_numbers}')
     return d1, group_numbers
 
+class LoginRange:
+    """
+    Логины login_format.format(x) для x от first до last включительно, список не хранится:
+    номер разбирается обратно из логина и сравнивается с границами
+    LoginRange('m2020{:02d}', 1, 89): 'm202007' in range, list(range) == ['m202001', ..., 'm202089']
+    Формат - любой, как у str.format: '{}', '{0}', '{:02d}', '{0:>3}', номер может встречаться несколько раз.
+    """
+    def __init__(self, login_format, first, last):
+        self.login_format = login_format
+        self.first = first
+        self.last = last
+        # текст формата как есть, поля - группы: номер берется из первого поля
+        self.pattern = re.compile(''.join(re.escape(text) + ('(.+?)' if field is not None else '')
+                                          for text, field, _, _ in string.Formatter().parse(login_format)))
+
+    def __repr__(self):
+        return f'LoginRange({self.login_format!r}, {self.first}, {self.last})'
+
+    def __contains__(self, login):
+        match = self.pattern.fullmatch(login)
+        if match is None:
+            return False
+        # формат без полей дает один и тот же логин для всех номеров
+        number = match.group(1).strip() if match.groups() else str(self.first)
+        if not number.isdigit() or not self.first <= int(number) <= self.last:
+            return False
+        return self.login_format.format(int(number)) == login     # ширина, нули и повторы как у формата
+
+    def __iter__(self):
+        return (self.login_format.format(x) for x in range(self.first, self.last + 1))
+
+    def __len__(self):
+        return max(self.last - self.first + 1, 0)
+
+
+class LoginMatcher:
+    """
+    Логины конфига: диапазоны LoginRange, отдельные логины (множество) и регулярные выражения.
+    login in matcher - проверка без перебора списка логинов,
+    iter(matcher) - логины диапазонов и отдельные логины в порядке конфига.
+    Логины, подошедшие только под регулярное выражение, заранее не известны, их из данных выбирает extra.
+    """
+    def __init__(self, specs=()):
+        """
+        :param specs: элементы поля login конфига
+        """
+        self.parts = []     # LoginRange или [login] в порядке конфига
+        self.ranges = []
+        self.logins = set()
+        self.patterns = []
+        for spec in specs:
+            self.add(spec)
+
+    def __repr__(self):
+        return f'LoginMatcher({self.parts}, patterns={[p.pattern for p in self.patterns]})'
+
+    def add(self, spec):
+        """
+        Добавляет элемент конфига: {"login": ...}, {"login_format": ..., "login_first": ..., "login_last": ...}
+        или {"login_regex": ...}
+        """
+        if 'login' in spec:
+            self.parts.append([spec['login']])
+            self.logins.add(spec['login'])
+        elif 'login_regex' in spec:
+            self.patterns.append(re.compile(spec['login_regex']))
+        else:
+            login_range = LoginRange(spec['login_format'], spec['login_first'], spec['login_last'])
+            self.parts.append(login_range)
+            self.ranges.append(login_range)
+
+    def listed(self, login):
+        """
+        Логин есть среди отдельных логинов или диапазонов (выводится в порядке конфига)
+        """
+        return login in self.logins or any(login in r for r in self.ranges)
+
+    def __contains__(self, login):
+        return self.listed(login) or any(p.fullmatch(login) for p in self.patterns)
+
+    def __iter__(self):
+        for part in self.parts:
+            yield from part
+
+    def __len__(self):
+        return sum(len(part) for part in self.parts)
+
+    def extra(self, logins):
+        """
+        Логины из logins, подошедшие только под регулярные выражения, по алфавиту
+        """
+        if not self.patterns:
+            return []
+        return sorted(login for login in logins if login in self and not self.listed(login))
+
+
 def parse_config(cfg_file):
     """ parse config file in json format:
     {
@@ -68,26 +157,23 @@ def parse_config(cfg_file):
         }, 
         {
             "login": "ejudge"
+        },
+        {
+            "login_regex": "guest_\\w+"
         }
         ],
         "tasks" : [
             "hello",	"float_2",	"float_3",	"float_4"
         ]
     }
+    :return: login_list - LoginMatcher, task_list - {task: score}
     """
     with open(cfg_file, 'r', encoding='utf8') as read_file:
         cfg = json.load(read_file)
 
-    login_list = []
-    for log in cfg['login']:
-        if 'login' in log:
-            login_list += [log['login']]
-        else:
-            login_format = log['login_format']
-            login_first = log['login_first']
-            login_last = log['login_last']
-            login_list += [login_format.format(x) for x in range(login_first, login_last+1)]
-            
+    login_list = LoginMatcher(cfg['login'])
+    logging.debug(login_list)
+
     task_list = {}
     DEFAULT_SCORE = 10
     for t in cfg['tasks']:
@@ -98,50 +184,29 @@ def parse_config(cfg_file):
     logging.debug(task_list)
     return login_list, task_list
     
-def get_data_from_runs(timestamp, runs, login_list, task_list, olddata_file=None):
-    """ Update data in olddata_file with runs according to login_list and task_list filters
+def get_data_from_runs(timestamp, runs, login_list, task_list):
+    """ Count solved tasks of runs according to login_list and task_list filters
+    output:
+    [['login', timestamp], [login, ok_task_count], ['ejudge', 12]]
+    (к таблице прогресса столбец дописывает append_result_csv)
+    runs - открытая таблица (ej_reader.CsvTable): посылки не OK и не из task_list отбрасываются
+    при чтении, до разбора строки (select с where), читаются только колонки User_Login и Prob
     """
-    '''
-    if olddata_file is None:
-        data = [['login', timestamp]] 
-        data += [[login, 0] for login in login_list]
-    else:
-        with open(olddata_file, newline='') as csvfile:
-            data = csv.reader(csvfile, delimiter=' ', quotechar='|')
-        data[0] = data[0].expand(['d', timestamp])
-    '''
-    data = [['login', timestamp]] 
-    data += [[login, 0] for login in login_list]
-
-    
     d = {}
-    for r in runs:
-        login = r['User_Login']
-        prob = r['Prob']
-        result = r['Stat_Short']
-        if result != 'OK':
-            logging.debug(f'skip result {result}')
-            continue
-        if not prob in task_list:
-            logging.debug(f'skip task {prob}')
-            continue
-        logging.debug(f'count login={login} task={prob}')
-
-        
-        # d[login] = d.get(login, 0) + 1
+    for login, prob in runs.select(('User_Login', 'Prob'), where={'Stat_Short': ('OK',), 'Prob': task_list}):
         if login in d:
             d[login].add(prob)
         else:
             d[login] = {prob}
         
-    
-    for row in data[1:]:
-        row[-1] = len(d.get(row[0], {}))
-        
+
+    data = [['login', timestamp]]
+    data += [[login, len(d.get(login, ()))] for login in login_list]
+    data += [[login, len(d[login])] for login in login_list.extra(d)]
     logging.info(data)
     return data
     
-def get_data_from_standing(timestamp, runs, login_list, task_list, olddata_file=None):
+def get_data_from_standing(timestamp, runs, login_list, task_list):
     """ output:
     [[login, ok_task_count], ['ejudge', 12]]
     """   
@@ -149,7 +214,7 @@ def get_data_from_standing(timestamp, runs, login_list, task_list, olddata_file=
     OrderedDict([('login', 'ejudge'), ('hello', '13'), ('float_1', '27')])
     """
     data = [['login', timestamp]] 
-    d = { login:0 for login in login_list}
+    d = {}
     for r in runs:
         logging.debug(r)
         login = r['User']
@@ -158,6 +223,7 @@ def get_data_from_standing(timestamp, runs, login_list, task_list, olddata_file=
         if not login in login_list:
             logging.debug(f'skip login {login}')
             continue
+        d.setdefault(login, 0)
             
         for task, score in r.items():
             if not task in task_list:
@@ -167,10 +233,18 @@ def get_data_from_standing(timestamp, runs, login_list, task_list, olddata_file=
             else:
                 logging.debug(f'COUNT {login} {task} {d[login]}')
                 d[login] += 1    # count this task as ok
-    data += [[login, d[login]] for login in login_list]
+    data += [[login, d.get(login, 0)] for login in login_list]
+    data += [[login, d[login]] for login in login_list.extra(d)]
     logging.info(data)
     return data
     
+def update_function(runs, standings=False):
+    """ get_data_from_standing or get_data_from_runs for opened table runs (kind is detected by header)
+    """
+    if standings or runs.kind == KIND_STANDINGS:
+        return get_data_from_standing
+    return get_data_from_runs
+
 def save_result_csv(data, res_file):
     """ write data in res_file in csv format
     """
@@ -178,17 +252,52 @@ def save_result_csv(data, res_file):
         csvwriter = csv.writer(csvfile, delimiter=';', quotechar='|', quoting=csv.QUOTE_MINIMAL)
         csvwriter.writerows(data)
 
-    
-if __name__ == '__main__':
-    
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(levelname)s:%(lineno)d  \t%(message)s'
-        )
 
+def append_result_csv(data, res_file, olddata_file):
+    """ append column data[.][1] with header timestamp to progress table olddata_file and write it in res_file
+    (res_file may be the same file):
+    login;20200405        login;20200405;20200412
+    ejudge;12        ->   ejudge;12;15
+    m202001;3             m202001;3;4
+    Строки старой таблицы не разбираются как csv: логин - первая ячейка строки (индекс таблицы),
+    значение приписывается в конец строки. Логины, которых не было в таблице, добавляются в конец
+    с пустыми старыми ячейками. Если последний столбец таблицы - тот же timestamp, он заменяется.
+    Столбец добавляется в каждую строку, поэтому таблица переписывается целиком: время пропорционально числу строк.
+    """
+    timestamp = data[0][1]
+    values = {login: str(n) for login, n in data[1:]}
+    with open(olddata_file, encoding='utf8', newline='') as csvfile:
+        header, *rows = csvfile.read().splitlines()
+
+    if header.rsplit(';', 1)[-1] == timestamp:
+        logging.info(f'{olddata_file}: replace column {timestamp}')
+        header = header.rsplit(';', 1)[0]
+        rows = [row.rsplit(';', 1)[0] for row in rows]
+    logins = [row.split(';', 1)[0] for row in rows]
+    old_columns = header.count(';')     # столбцы снимков, кроме логина
+
+    lines = [f'{header};{timestamp}']
+    lines += [f'{row};{values.get(login, "")}' for row, login in zip(rows, logins)]
+    known = set(logins)
+    lines += [login + ';' * (old_columns + 1) + n for login, n in values.items() if login not in known]
+
+    # пишем во временный файл рядом и подменяем: res_file может быть тем же файлом, что olddata_file
+    tmp_file = f'{res_file}.tmp'
+    try:
+        with open(tmp_file, 'w', encoding='utf8', newline='') as csvfile:
+            csvfile.write('\r\n'.join(lines) + '\r\n')
+        os.replace(tmp_file, res_file)
+    finally:
+        # после ошибки записи недописанный временный файл не остается рядом с таблицей
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def build_parser(prog=None):
     parser = argparse.ArgumentParser(
         description='Calculate statistics per login for one Ejudge contests described into config json',
-        usage=f'\n\t{sys.argv[0]} --standings 20200405 20200405_t1.csv 01_int.json now.csv',
+        prog=prog,
+        usage=f'\n\t{prog or sys.argv[0]} --standings 20200405 20200405_t1.csv 01_int.json now.csv',
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
     )
     parser.add_argument("timestamp", help="Data date as string")
@@ -197,10 +306,26 @@ if __name__ == '__main__':
     parser.add_argument("res_csv", help="output data in csv format", default='now.csv')
     parser.add_argument("--standings", help="csv data from stangings table",
                         default=False, action="store_true")
+    parser.add_argument("--olddata", help="progress table to append the timestamp column to (may be res_csv itself)",
+                        default=None, metavar='OLD_CSV')
+    parser.add_argument("--profile", help="time and trace memory of every stage, save json report <res_csv>.profile.json",
+                        default=False, action="store_true")
     parser.add_argument('-v', "--verbose", help="increase verbosity",
                         default=False, action="store_true")
+    return parser
+
+
+def main(argv=None, prog=None):
+    """
+    count_ejudge_tasks.py timestamp raw_csv config res_csv
+    :param argv: аргументы командной строки, None - sys.argv[1:]
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(levelname)s:%(lineno)d  \t%(message)s'
+        )
 
-    args = parser.parse_args()
+    args = build_parser(prog).parse_args(argv)
 
     if args.verbose:
         logging.info("verbosity turned on")
@@ -209,22 +334,37 @@ if __name__ == '__main__':
     cvs_file = args.raw_csv
     cfg_file = args.config
     res_file = args.res_csv
-    
-    '''
-    olddata_file = sys.argv[4]
-    if len(sys.argv) > 4:
-        olddata_file = sys.argv[4]
-    else:
+    olddata_file = args.olddata
+    if olddata_file is not None and (not os.path.exists(olddata_file) or os.path.getsize(olddata_file) == 0):
+        # пустой файл остается, например, от прерванного первого запуска
+        logging.warning(f'{olddata_file} does not exist or is empty, write new table {res_file}')
         olddata_file = None
-    '''
-    login_list, task_list = parse_config(cfg_file)
-    
-    if args.standings:
-        update_data = get_data_from_standing
-    else:
-        update_data = get_data_from_runs
-    runs = read_runs(cvs_file)
-    res = update_data(timestamp, runs, login_list, task_list)
-    save_result_csv(res, res_file)
-
-    
\ No newline at end of file
+
+    profiler = StageProfiler(cvs_file, args.profile)
+    try:
+        with profiler.stage('config'):
+            login_list, task_list = parse_config(cfg_file)
+
+        # вид файла (dump runs или standings) определяется по заголовку, файл разбирается один раз
+        # строки читаются по одной и сразу считаются, поэтому чтение и подсчет - одна стадия
+        with profiler.stage('read+filter') as st, open_table(cvs_file) as runs:
+            update_data = update_function(runs, args.standings)
+            if update_data is get_data_from_runs:
+                # посылки отбираются при чтении, просмотренные строки считает сама таблица
+                res = update_data(timestamp, runs, login_list, task_list)
+                st['rows'] = runs.rows_read
+            else:
+                res = update_data(timestamp, profiler.counted(runs, st), login_list, task_list)
+
+        with profiler.stage('write', rows=len(res)):
+            if olddata_file is None:
+                save_result_csv(res, res_file)
+            else:
+                append_result_csv(res, res_file, olddata_file)
+        profiler.save(f'{res_file}.profile.json')
+    finally:
+        profiler.stop()
+
+
+if __name__ == '__main__':
+    main()
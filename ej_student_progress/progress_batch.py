@@ -0,0 +1,147 @@
+#! /usr/bin/python3
+
+import argparse
+import concurrent.futures
+import logging
+import os
+import pathlib
+import re
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'ej_common'))
+from ej_reader import open_table
+from count_ejudge_tasks import parse_config, update_function, save_result_csv
+
+"""
+Пакетная обработка снимков standings (или dump runs), собранных за семестр, одним запуском:
+конфиг разбирается один раз, файлы считаются в пуле процессов, результат - одна таблица логины x даты.
+
+login;20200405;20200412;20200419
+ejudge;12;15;17
+m202001;3;4;4
+
+Дата снимка берется из имени файла (20200405_t1.csv -> 20200405), столбцы идут по возрастанию дат.
+
+progress_batch.py snapshots/ 01_int.json progress.csv --jobs 8
+"""
+
+DATE_PATTERN = r'(\d{8})'   # дата в имени файла снимка
+
+
+def snapshot_columns(files, pattern=DATE_PATTERN):
+    """
+    Заголовки столбцов снимков: дата из имени файла (первая скобка pattern, без скобок - все совпадение).
+    Если у нескольких файлов одна дата, столбцы называются по именам файлов.
+    :return: [(заголовок, файл)] по возрастанию заголовков; файлы без даты пропускаются
+    """
+    regex = re.compile(pattern)
+    group = 1 if regex.groups else 0
+    dated = []
+    for file in files:
+        m = regex.search(file.name)
+        if m is None:
+            logging.warning(f'skip {file}: no date {pattern} in file name')
+            continue
+        dated.append((m.group(group), file))
+    dates = [date for date, _ in dated]
+    # имя без суффиксов: 20200412_t1.csv.gz -> 20200412_t1
+    return sorted((date if dates.count(date) == 1 else file.name.split('.', 1)[0], file) for date, file in dated)
+
+
+def count_snapshot(timestamp, file, login_list, task_list, standings=False):
+    """
+    Количество решенных задач каждого логина login_list в одном снимке
+    :return: {login: количество}
+    """
+    with open_table(file) as runs:
+        data = update_function(runs, standings)(timestamp, runs, login_list, task_list)
+    return dict(data[1:])
+
+
+def set_log_level(level):
+    """
+    Уровень логов процесса пула: у процесса, запущенного не fork, уровень родителя не наследуется
+    """
+    if level is not None:
+        logging.getLogger().setLevel(level)
+
+
+def count_snapshots(columns, login_list, task_list, standings=False, jobs=1, log_level=None):
+    """
+    Считает снимки, jobs > 1 - в пуле из jobs процессов
+    :param columns: [(заголовок, файл)]
+    :param log_level: уровень логов на время подсчета (в том числе в процессах пула), None - не менять
+    :return: таблица [['login', заголовок1, ...], [login, количество1, ...], ...]
+    """
+    args = ([timestamp for timestamp, _ in columns], [file for _, file in columns],
+            [login_list] * len(columns), [task_list] * len(columns), [standings] * len(columns))
+    level = logging.getLogger().level
+    if log_level is not None:
+        logging.getLogger().setLevel(log_level)
+    try:
+        if jobs <= 1 or len(columns) <= 1:
+            counts = list(map(count_snapshot, *args))
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=set_log_level,
+                                                        initargs=(log_level,)) as pool:
+                counts = list(pool.map(count_snapshot, *args))
+    finally:
+        logging.getLogger().setLevel(level)
+
+    # логины, подошедшие под login_regex, в разных снимках разные - строка для каждого встреченного
+    logins = list(login_list) + login_list.extra(set().union(*counts))
+    data = [['login'] + [timestamp for timestamp, _ in columns]]
+    data += [[login] + [count.get(login, 0) for count in counts] for login in logins]
+    return data
+
+
+def build_parser(prog=None):
+    parser = argparse.ArgumentParser(
+        description='Count solved tasks per login for a directory of dated snapshots into one logins x dates table',
+        prog=prog,
+        usage=f'\n\t{prog or sys.argv[0]} snapshots/ 01_int.json progress.csv --jobs 8',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("snapshots", help="directory with snapshot csv files named by date (20200405_t1.csv)")
+    parser.add_argument("config", help="config in json format")
+    parser.add_argument("res_csv", help="output logins x dates table in csv format")
+    parser.add_argument("--glob", help="snapshot file names in the directory (.gz, .bz2, .xz are read as well)",
+                        default='*.csv*')
+    parser.add_argument("--date_pattern", help="regex of the date in the file name, the first group (or the whole match) is the date",
+                        default=DATE_PATTERN)
+    parser.add_argument("--standings", help="all snapshots are standings tables (detected by header otherwise)",
+                        default=False, action="store_true")
+    parser.add_argument('-j', "--jobs", help="count snapshots in N parallel processes",
+                        type=int, default=os.cpu_count(), metavar='N')
+    parser.add_argument('-v', "--verbose", help="increase verbosity",
+                        default=False, action="store_true")
+    return parser
+
+
+def main(argv=None, prog=None):
+    """
+    progress_batch.py snapshots config res_csv
+    :param argv: аргументы командной строки, None - sys.argv[1:]
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(levelname)s:%(lineno)d  \t%(message)s'
+        )
+
+    args = build_parser(prog).parse_args(argv)
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    login_list, task_list = parse_config(args.config)
+    columns = snapshot_columns(sorted(pathlib.Path(args.snapshots).glob(args.glob)), args.date_pattern)
+    logging.info(f'{len(columns)} snapshots in {args.snapshots}, {len(login_list)} logins')
+    # count_ejudge_tasks печатает каждую посчитанную таблицу, в пакете это лишнее
+    log_level = None if args.verbose else logging.WARNING
+    data = count_snapshots(columns, login_list, task_list, args.standings, args.jobs, log_level)
+    save_result_csv(data, args.res_csv)
+    logging.info(f'{args.res_csv}: {len(login_list)} logins x {len(columns)} dates')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+#! /usr/bin/python3
+"""
+Единая точка входа для всех утилит:
+    python3 ejtools.py contest cfg_2019.json FRTK dec --text_only
+    python3 ejtools.py makeall cfg_2019.json --jobs 4
+    python3 ejtools.py import cfg_2019.json --db semestr_2019.sqlite
+    python3 ejtools.py progress 20200405 20200405_t1.csv 01_int.json now.csv
+    python3 ejtools.py progress_batch snapshots/ 01_int.json progress.csv --jobs 8
+    python3 ejtools.py semestr data_example.csv res 'осенний семестр 2019 года'
+
+Модуль подкоманды импортируется, только когда она запущена, а тяжелые зависимости (matplotlib, numpy, jinja2)
+импортируются самими утилитами, только когда они действительно нужны: --help и --config_only их не грузят.
+"""
+
+import argparse
+import importlib
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# подкоманда: (директория, модуль, описание)
+COMMANDS = {
+    'contest': ('ej_plot_contest', 'ej_plot_contest', 'tables and plots of ejudge contests (ej_plot_contest.py)'),
+    'makeall': ('ej_plot_contest', 'makeall_2019', 'all stages of all departments of config (makeall_2019.py)'),
+    'import': ('ej_plot_contest', 'ej_import', 'load run dumps and login lists into SQLite warehouse (ej_import.py)'),
+    'progress': ('ej_student_progress', 'count_ejudge_tasks', 'solved tasks per login (count_ejudge_tasks.py)'),
+    'progress_batch': ('ej_student_progress', 'progress_batch',
+                       'logins x dates table of a directory of snapshots (progress_batch.py)'),
+    'semestr': ('semestr', 'plot_semestr_data', 'pie charts of semestr marks (plot_semestr_data.py)'),
+}
+
+
+def load_command(name):
+    """
+    Импортирует модуль подкоманды name
+    """
+    directory, module, _ = COMMANDS[name]
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return importlib.import_module(module)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description='Ejudge tools',
+        usage=f'\n\t{sys.argv[0]} {{{",".join(COMMANDS)}}} ...',
+        epilog=f'"{sys.argv[0]} COMMAND --help" shows arguments of the command',
+    )
+    parser.add_argument("command", help="; ".join(f'{name} - {help}' for name, (_, _, help) in COMMANDS.items()),
+                        choices=list(COMMANDS))
+    parser.add_argument("args", help="arguments of the command", nargs=argparse.REMAINDER)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    module = load_command(args.command)
+    module.main(args.args, prog=f'{os.path.basename(sys.argv[0])} {args.command}')
+
+
+if __name__ == '__main__':
+    main()
@@ -4,18 +4,13 @@ python3 plot_semestr_data.py example_data.csv output_dir 'осенний сем
 """
 
 import argparse
-import datetime
-import csv
-import json
 import logging
 import os
 import pathlib
 import sys
 
-import matplotlib.pyplot as plt
-import numpy as np
-
-MARK = 'Оценка'
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'ej_common'))
+from ej_reader import read_table, KIND_MARKS, MARK
 
 PIE_COLORS = {
     '10':'#127622',
@@ -32,11 +27,11 @@ PIE_COLORS = {
 }
 
 def process_data(csv_path):
-    # читаем cvs файл
-    with open(csv_path, encoding="utf8") as fh:
-        rd = csv.DictReader(fh, delimiter=';')
-        data = [dict(row) for row in rd]
+    # читаем cvs файл, разделитель ; или , определяется по заголовку
+    data = read_table(csv_path, kind=KIND_MARKS)
     logging.debug((data))
+    if not data:
+        return {}
     
     d = {department:{} for department in data[0].keys() if department != MARK}
     for r in data[1:]:
@@ -52,6 +47,7 @@ def plot_pie1(output_dir, department, marks, title, show=True):
     """
     Рисует 1 диаграмму для факультета
     """
+    import matplotlib.pyplot as plt     # matplotlib грузится, только когда действительно рисуем
 
     
     counts = [count for count in marks.values()]
@@ -95,15 +91,11 @@ def plot_pies(output_dir, d, title, show=True):
 
 
 
-def main():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(levelname)s:%(lineno)d  \t%(message)s'
-        )
-
+def build_parser(prog=None):
     parser = argparse.ArgumentParser(
         description='Plot chart for semestr results per departments',
-        usage=f'\n\t{sys.argv[0]} ./data/2019_1.csv ./res/2019',
+        prog=prog,
+        usage=f'\n\t{prog or sys.argv[0]} ./data/2019_1.csv ./res/2019',
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
     )
     parser.add_argument("csv", help="data in csv format")
@@ -113,8 +105,20 @@ def main():
 
     parser.add_argument('-v', "--verbose", help="increase verbosity",
                         action="store_true")
+    return parser
+
+
+def main(argv=None, prog=None):
+    """
+    plot_semestr_data.py csv [output_dir] [title]
+    :param argv: аргументы командной строки, None - sys.argv[1:]
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(levelname)s:%(lineno)d  \t%(message)s'
+        )
 
-    args = parser.parse_args()
+    args = build_parser(prog).parse_args(argv)
 
     if args.verbose:
         print("verbosity turned on")
@@ -0,0 +1,159 @@
+import datetime
+import json
+import os
+import pathlib
+import random
+import subprocess
+import sys
+import tracemalloc
+
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / 'benchmarks'))
+sys.path.append(str(ROOT / 'ej_plot_contest'))
+from gen_ejudge_dump import generate
+from ej_plot_contest import Data, Params
+from ej_matrix import CountMatrix
+from ej_stats import SKIPPED_INVISIBLE, UNKNOWN_GROUP
+
+"""
+Окно контеста (duration, virtual_start) не зависит от порядка посылок в run dump:
+все способы подсчета дают одну и ту же таблицу на перемешанном dump,
+подсчет масками numpy (fiter_runs) совпадает с построчным (fiter_data).
+Построчный подсчет хранит только начала окон, а не посылки: память не растет с размером dump.
+"""
+
+WINDOWS = {
+    'duration': {'duration': '01:30'},
+    'virtual_start': {'duration': '01:30', 'virtual_start': True},
+}
+
+MODES = {
+    'default': [],
+    'stream': ['--stream'],
+    'incremental': ['--incremental'],
+    'warehouse': ['--warehouse', 'runs.sqlite'],
+    'no_cache': ['--no-cache'],
+}
+
+
+def make_shuffled_dump(tmp, n_runs):
+    """
+    Run dump на n_runs посылок, строки которого перемешаны, и конфиг контеста к нему
+    """
+    dump = tmp / f'dump_{n_runs}.csv'
+    config = tmp / f'config_{n_runs}.json'
+    generate(dump, n_runs, logins=120, groups=4, problems=6, config=config, seed=3)
+    header, *rows = dump.read_text(encoding='utf8').splitlines(keepends=True)
+    random.Random(1).shuffle(rows)
+    dump.write_text(header + ''.join(rows), encoding='utf8')
+    with open(config, encoding='utf8') as fh:
+        return dump, json.load(fh)
+
+
+@pytest.fixture(scope='module')
+def shuffled_dump(tmp_path_factory):
+    return make_shuffled_dump(tmp_path_factory.mktemp('dump'), 5000)
+
+
+def run_contest(tmp, dump, config, mode, stdin=None):
+    """
+    Запускает ej_plot_contest.py в режиме mode
+    :param stdin: файл, который подать на stdin (file_data '-'), None - читать dump
+    :return: (subprocess.CompletedProcess, {имя csv таблицы: содержимое})
+    """
+    cfg_file = tmp / 'config.json'
+    file_data = '-' if stdin is not None else str(dump)
+    cfg_file.write_text(json.dumps(dict(config, file_data=file_data, output_dir='out'), ensure_ascii=False),
+                        encoding='utf8')
+    env = dict(os.environ, XDG_CACHE_HOME=str(tmp / 'cache'))
+    with open(stdin if stdin is not None else os.devnull, 'rb') as fh:
+        proc = subprocess.run([sys.executable, str(ROOT / 'ej_plot_contest' / 'ej_plot_contest.py'), str(cfg_file),
+                               '--text_only', '--no_html'] + MODES[mode], cwd=tmp, env=env, stdin=fh,
+                              capture_output=True, text=True)
+    return proc, {str(path.relative_to(tmp)): path.read_text(encoding='utf8') for path in sorted(tmp.rglob('*.csv'))
+                  if path != dump}
+
+
+@pytest.mark.parametrize('window', WINDOWS.values(), ids=WINDOWS.keys())
+def test_same_table_on_shuffled_dump(tmp_path, shuffled_dump, window):
+    dump, config = shuffled_dump
+    config = dict(config, **window)
+    tables = {}
+    for mode in MODES:
+        (tmp_path / mode).mkdir()
+        proc, tables[mode] = run_contest(tmp_path / mode, dump, config, mode)
+        assert proc.returncode == 0, proc.stderr
+    assert tables['default']
+    for mode in MODES:
+        assert tables[mode] == tables['default'], mode
+
+
+@pytest.mark.parametrize('window', WINDOWS.values(), ids=WINDOWS.keys())
+def test_unsorted_stdin_fails(tmp_path, shuffled_dump, window):
+    # stdin второй раз не прочитать: окно из первой посылки, посылка раньше него - ошибка, а не неверная таблица
+    dump, config = shuffled_dump
+    proc, tables = run_contest(tmp_path, dump, dict(config, **window), 'default', stdin=dump)
+    assert proc.returncode != 0
+    assert 'runs are not sorted by Time' in proc.stderr
+    assert not tables
+
+
+def stream_peak(tmp, n_runs, window):
+    """
+    Пиковая память (tracemalloc) построчного подсчета перемешанного dump на n_runs посылок
+    """
+    dump, config = make_shuffled_dump(tmp, n_runs)
+    cfg = Params.from_dict(tmp, dict(config, **window, file_data=str(dump), output_dir='out', stream=True,
+                                     cache=False))
+    tracemalloc.start()
+    try:
+        Data(cfg)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize('window', WINDOWS.values(), ids=WINDOWS.keys())
+def test_stream_memory_is_bounded(tmp_path, window):
+    small = stream_peak(tmp_path, 2000, window)
+    large = stream_peak(tmp_path, 8000, window)
+    # те же логины, группы и задачи: в 4 раза больше посылок - почти та же память
+    assert large < small * 1.1, (small, large)
+
+
+@pytest.mark.parametrize('window', ['none', 'duration', 'contest_start', 'virtual_start'])
+def test_fiter_runs_equals_fiter_data(tmp_path, shuffled_dump, window):
+    dump, config = shuffled_dump
+    # часть посылок от невидимых пользователей и логинов без группы
+    header, *lines = dump.read_text(encoding='utf8').splitlines(keepends=True)
+    fields = [line.split(';') for line in lines]
+    for i, f in enumerate(fields):
+        if i % 50 == 0:
+            f[24] = '1'
+        elif i % 70 == 0:
+            f[22] = 'guest' + f[22]
+    dump = tmp_path / 'mixed.csv'
+    dump.write_text(header + ''.join(';'.join(f) for f in fields), encoding='utf8')
+    if window == 'contest_start':
+        first = min(int(f[1]) for f in fields)
+        start = datetime.datetime.fromtimestamp(first + 1200).strftime('%Y-%m-%d %H:%M')
+        config = dict(config, duration='01:00', contest_start=start)
+    elif window != 'none':
+        config = dict(config, **WINDOWS[window])
+    cfg = Params.from_dict(tmp_path, dict(config, file_data=str(dump), output_dir='out', cache=False))
+    data = Data(cfg)
+    runs = Data.get_data(dump, columns=data.resolver.columns)
+    data.encode_groups(runs)
+
+    matrix, total = data.fiter_runs(runs, cfg.duration)
+    runs_stats = data.filter_stats
+    state = data.window_state(runs.rows(*Data.RUN_FIELDS), cfg.duration)
+    d, total_by_rows = data.fiter_data(runs.rows(*Data.RUN_FIELDS), cfg.duration, state=state)
+
+    assert matrix.to_dict() == CountMatrix.from_dict(d).to_dict()
+    assert total == total_by_rows
+    assert runs_stats.count(SKIPPED_INVISIBLE) and runs_stats.count(UNKNOWN_GROUP)
+    assert runs_stats.counts == data.filter_stats.counts
+    assert runs_stats.invisible_logins == data.filter_stats.invisible_logins
@@ -0,0 +1,92 @@
+import json
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / 'ej_student_progress'))
+from count_ejudge_tasks import LoginMatcher, LoginRange, append_result_csv, main
+
+"""
+Логины конфига: LoginRange и LoginMatcher без перебора списка.
+--olddata: столбец снимка дописывается к таблице прогресса, тот же timestamp заменяется,
+новые логины добавляются с пустыми старыми ячейками, пустая старая таблица считается отсутствующей.
+"""
+
+OLD = 'login;20200405\r\nejudge;12\r\nm202001;3\r\n'
+
+
+def write_old(tmp_path, text=OLD):
+    old = tmp_path / 'progress.csv'
+    old.write_bytes(text.encode('utf8'))
+    return old
+
+
+def read_table(path):
+    return path.read_bytes().decode('utf8')
+
+
+def test_append_column(tmp_path):
+    old = write_old(tmp_path)
+    res = tmp_path / 'now.csv'
+    append_result_csv([['login', '20200412'], ['ejudge', 15], ['m202001', 4]], res, old)
+    assert read_table(res) == 'login;20200405;20200412\r\nejudge;12;15\r\nm202001;3;4\r\n'
+    assert read_table(old) == OLD
+
+
+def test_replace_same_timestamp_in_place(tmp_path):
+    old = write_old(tmp_path, 'login;20200405;20200412\r\nejudge;12;15\r\nm202001;3;4\r\n')
+    append_result_csv([['login', '20200412'], ['ejudge', 16], ['m202001', 5]], old, old)
+    assert read_table(old) == 'login;20200405;20200412\r\nejudge;12;16\r\nm202001;3;5\r\n'
+    assert [p.name for p in tmp_path.iterdir()] == ['progress.csv']     # временный файл не остался
+
+
+def test_new_and_missing_logins(tmp_path):
+    old = write_old(tmp_path)
+    append_result_csv([['login', '20200412'], ['m202001', 4], ['m202002', 1]], old, old)
+    assert read_table(old) == 'login;20200405;20200412\r\nejudge;12;\r\nm202001;3;4\r\nm202002;;1\r\n'
+
+
+def test_empty_olddata_writes_new_table(tmp_path):
+    dump = tmp_path / 'dump.csv'
+    dump.write_text('Run_Id;User_Login;Prob;Stat_Short\n'
+                    '1;m202001;hello;OK\n'
+                    '2;m202001;float_2;WA\n'
+                    '3;ejudge;hello;OK\n', encoding='utf8')
+    config = tmp_path / 'config.json'
+    config.write_text(json.dumps({
+        'login': [{'login_format': 'm2020{:02d}', 'login_first': 1, 'login_last': 2}, {'login': 'ejudge'}],
+        'tasks': ['hello', 'float_2'],
+    }), encoding='utf8')
+    old = write_old(tmp_path, '')
+    res = tmp_path / 'now.csv'
+    main(['20200412', str(dump), str(config), str(res), '--olddata', str(old)])
+    assert read_table(res) == 'login;20200412\r\nm202001;1\r\nm202002;0\r\nejudge;1\r\n'
+
+
+def test_login_range():
+    logins = LoginRange('m2020{:02d}', 1, 89)
+    assert 'm202007' in logins and 'm202089' in logins
+    assert 'm202000' not in logins and 'm202090' not in logins
+    assert 'm20207' not in logins and 'm2020xx' not in logins     # ширина как у формата
+    assert len(logins) == 89 and list(logins)[:2] == ['m202001', 'm202002']
+
+
+def test_login_range_formats():
+    assert 'ed7' in LoginRange('ed{0}', 1, 10)
+    assert '3-3' in LoginRange('{0}-{0}', 1, 5) and '3-4' not in LoginRange('{0}-{0}', 1, 5)
+    assert '  12' in LoginRange('{:>4}', 1, 20) and '12' not in LoginRange('{:>4}', 1, 20)
+    assert 'a.b' in LoginRange('a.b', 1, 3) and 'axb' not in LoginRange('a.b', 1, 3)     # формат без полей
+    assert len(LoginRange('ed{}', 5, 4)) == 0
+
+
+def test_login_matcher():
+    matcher = LoginMatcher([
+        {'login': 'ejudge'},
+        {'login_format': 'm2020{:02d}', 'login_first': 1, 'login_last': 2},
+        {'login_regex': r'guest_\w+'},
+    ])
+    assert list(matcher) == ['ejudge', 'm202001', 'm202002'] and len(matcher) == 3
+    assert 'm202002' in matcher and 'guest_1' in matcher and 'm202003' not in matcher
+    assert not matcher.listed('guest_1')
+    assert matcher.extra(['guest_2', 'm202001', 'guest_1', 'admin']) == ['guest_1', 'guest_2']
+    assert LoginMatcher([{'login': 'ejudge'}]).extra(['guest_1']) == []
@@ -0,0 +1,81 @@
+import os
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / 'ej_plot_contest'))
+from ej_cache import RunCache, SUFFIX
+from ej_runs import RunStore
+
+"""
+RunCache: запись годится, пока файл данных не менялся (размер и mtime или хеш содержимого),
+старые записи вытесняются по размеру кеша.
+"""
+
+ROWS = [
+    {'User_Login': 'ed95070101', 'Prob': 'A-DPQE', 'Stat_Short': 'OK', 'Time': '100'},
+    {'User_Login': 'ed95070102', 'Prob': 'B-DPQE', 'Stat_Short': 'WA', 'Time': '200'},
+]
+
+
+def make_runs(rows=ROWS):
+    return RunStore.from_rows(rows, ('User_Login', 'Prob', 'Stat_Short'), ('Time',))
+
+
+def write_dump(path, text='Run_Id;Time\n1;100\n'):
+    path.write_text(text, encoding='utf8')
+    return path
+
+
+def test_load_saved_runs(tmp_path):
+    dump = write_dump(tmp_path / 'dump.csv')
+    cache = RunCache(tmp_path / 'cache')
+    assert cache.load(dump) is None
+    cache.save(dump, make_runs())
+    runs = cache.load(dump, ('User_Login', 'Time'))
+    assert list(runs.rows('User_Login', 'Prob', 'Stat_Short', 'Time')) == [
+        ('ed95070101', 'A-DPQE', 'OK', 100), ('ed95070102', 'B-DPQE', 'WA', 200)]
+
+
+def test_missing_columns_are_not_loaded(tmp_path):
+    dump = write_dump(tmp_path / 'dump.csv')
+    cache = RunCache(tmp_path / 'cache')
+    cache.save(dump, make_runs())
+    assert cache.load(dump, ('User_Name',)) is None
+
+
+def test_changed_file_is_stale(tmp_path):
+    dump = write_dump(tmp_path / 'dump.csv')
+    cache = RunCache(tmp_path / 'cache')
+    cache.save(dump, make_runs())
+    write_dump(dump, 'Run_Id;Time\n1;100\n2;200\n')
+    assert cache.load(dump) is None
+
+
+def test_same_content_with_new_mtime_is_fresh(tmp_path):
+    dump = write_dump(tmp_path / 'dump.csv')
+    cache = RunCache(tmp_path / 'cache')
+    cache.save(dump, make_runs())
+    st = os.stat(dump)
+    os.utime(dump, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert cache.load(dump) is not None
+    # тот же размер, но другие байты - запись устарела
+    write_dump(dump, 'Run_Id;Time\n1;101\n')
+    assert cache.load(dump) is None
+
+
+def test_evict_oldest_entries(tmp_path):
+    cache = RunCache(tmp_path / 'cache')
+    dumps = [write_dump(tmp_path / f'dump{i}.csv') for i in range(3)]
+    for i, dump in enumerate(dumps):
+        cache.save(dump, make_runs())
+        entry = cache.entry_path(dump)
+        os.utime(entry, (i, i))     # dump0 использовали раньше всех
+    stray = tmp_path / 'cache' / 'notes.txt'
+    stray.write_text('not a cache entry')
+
+    cache.max_size = sum(cache.entry_path(dump).stat().st_size for dump in dumps[1:])
+    cache.evict()
+    assert sorted(p.name for p in cache.cache_dir.glob('*' + SUFFIX)) == \
+        sorted(cache.entry_path(dump).name for dump in dumps[1:])
+    assert stray.exists()
@@ -0,0 +1,115 @@
+import gzip
+import os
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / 'ej_plot_contest'))
+from ej_checkpoint import Checkpoint, DumpTail, FilterState
+
+"""
+Инкрементальная обработка: DumpTail читает только полные дописанные строки, Checkpoint продолжает
+с сохраненного смещения, пока обработанная часть файла и настройки подсчета не менялись
+(сжатый файл - пока не менялся совсем).
+"""
+
+HEADER = 'Run_Id;User_Login;Prob;Stat_Short\n'
+SETTINGS = {'duration': None}
+
+
+def row(run_id):
+    return f'{run_id};ed95070101;A-DPQE;OK\n'
+
+
+def read_tail(dump, offset=0):
+    tail = DumpTail(dump, offset)
+    return tail, [r['Run_Id'] for r in tail]
+
+
+def save_state(checkpoint, dump, tail, last_run_id):
+    state = FilterState()
+    state.data = {'707': {'A-DPQE': 1}}
+    state.total = {'707': {'ed95070101'}}
+    state.last_run_id = last_run_id
+    checkpoint.save(dump, tail, SETTINGS, state)
+
+
+def test_tail_reads_only_complete_lines(tmp_path):
+    dump = tmp_path / 'dump.csv'
+    dump.write_text(HEADER + row(1) + row(2) + '3;ed950', encoding='utf8')
+    tail, run_ids = read_tail(dump)
+    assert run_ids == ['1', '2']
+    assert tail.header == HEADER
+    assert tail.offset == len(HEADER + row(1) + row(2))
+
+    # ejudge дописал строку 3 и добавил 4
+    dump.write_text(HEADER + row(1) + row(2) + row(3) + row(4), encoding='utf8')
+    tail, run_ids = read_tail(dump, tail.offset)
+    assert run_ids == ['3', '4']
+    assert tail.offset == dump.stat().st_size
+
+
+def test_empty_file(tmp_path):
+    dump = tmp_path / 'dump.csv'
+    dump.write_text('', encoding='utf8')
+    tail, run_ids = read_tail(dump)
+    assert run_ids == [] and tail.header is None
+
+
+def test_continue_after_append(tmp_path):
+    dump = tmp_path / 'dump.csv'
+    dump.write_text(HEADER + row(1) + row(2), encoding='utf8')
+    checkpoint = Checkpoint(tmp_path / 'dump.checkpoint.json')
+    assert checkpoint.load(dump, SETTINGS)[1] == 0     # checkpoint еще нет
+
+    tail, _ = read_tail(dump)
+    save_state(checkpoint, dump, tail, 2)
+    with open(dump, 'a', encoding='utf8') as fh:
+        fh.write(row(3))
+    state, offset = checkpoint.load(dump, SETTINGS)
+    assert offset == tail.offset
+    assert state.data == {'707': {'A-DPQE': 1}} and state.total == {'707': {'ed95070101'}}
+    assert state.last_run_id == 2
+    assert read_tail(dump, offset)[1] == ['3']
+
+
+def test_rewritten_file_or_settings(tmp_path):
+    dump = tmp_path / 'dump.csv'
+    dump.write_text(HEADER + row(1) + row(2), encoding='utf8')
+    checkpoint = Checkpoint(tmp_path / 'dump.checkpoint.json')
+    tail, _ = read_tail(dump)
+    save_state(checkpoint, dump, tail, 2)
+
+    assert checkpoint.load(dump, {'duration': 5400})[1] == 0
+    # обработанная строка изменилась, длина та же
+    dump.write_text(HEADER + row(1) + row(2).replace('OK', 'WA'), encoding='utf8')
+    state, offset = checkpoint.load(dump, SETTINGS)
+    assert offset == 0 and state.data == {}
+    # файл стал короче
+    dump.write_text(HEADER + row(1), encoding='utf8')
+    assert checkpoint.load(dump, SETTINGS)[1] == 0
+
+
+def test_broken_checkpoint(tmp_path):
+    dump = tmp_path / 'dump.csv'
+    dump.write_text(HEADER + row(1), encoding='utf8')
+    checkpoint = Checkpoint(tmp_path / 'dump.checkpoint.json')
+    checkpoint.path.write_text('{"version": 1, "sett', encoding='utf8')
+    state, offset = checkpoint.load(dump, SETTINGS)
+    assert offset == 0 and state.last_run_id is None
+
+
+def test_compressed_file_is_not_reread(tmp_path):
+    dump = tmp_path / 'dump.csv.gz'
+    with gzip.open(dump, 'wt', encoding='utf8') as fh:
+        fh.write(HEADER + row(1) + row(2))
+    checkpoint = Checkpoint(tmp_path / 'dump.checkpoint.json')
+    tail, run_ids = read_tail(dump)
+    assert run_ids == ['1', '2']
+    save_state(checkpoint, dump, tail, 2)
+    assert checkpoint.load(dump, SETTINGS)[1] == tail.offset
+
+    # сжатый файл перезаписан: checkpoint не используется, даже если размер тот же
+    st = os.stat(dump)
+    os.utime(dump, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert checkpoint.load(dump, SETTINGS)[1] == 0
@@ -0,0 +1,79 @@
+import csv
+import pathlib
+import sys
+
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / 'ej_common'))
+import ej_dump
+from ej_dump import DumpScanner, to_int
+
+"""
+DumpScanner: те же значения, что у csv.DictReader с r.get(name) or '', для строк с кавычками,
+CRLF, коротких строк и строк на границе блоков; where проверяется до декодирования.
+"""
+
+DUMP = ('Run_Id;Time;User_Login;User_Name;Prob;Stat_Short\r\n'
+        '1;100;ed95070101;Ivanov;A-DPQE;OK\r\n'
+        '2;110;ed95070102;"Petrov; Pavel";A-DPQE;OK\r\n'
+        '3;120;ed95070103;"Line\r\nbreak";B-DPQE;WA\r\n'
+        '4;;ed95070101;Ivanov;B-DPQE;OK\r\n'
+        '\r\n'
+        '5;abc;ed95070104\r\n'
+        '6;150;ed95070102;Петров;C-DPQE;OK')    # последняя строка без перевода строки
+
+COLUMNS = ('User_Login', 'User_Name', 'Prob', 'Group')
+INT_COLUMNS = ('Time',)
+
+
+def expected(path, where=None):
+    with open(path, encoding='utf8', newline='') as fh:
+        rows = [r for r in csv.DictReader(fh, delimiter=';')
+                if all((r.get(name) or '') in values for name, values in (where or {}).items())]
+    return [tuple(r.get(name) or '' for name in COLUMNS) + tuple(to_int(r.get(name)) for name in INT_COLUMNS)
+            for r in rows]
+
+
+@pytest.fixture
+def dump(tmp_path):
+    path = tmp_path / 'dump.csv'
+    path.write_bytes(DUMP.encode('utf8'))
+    return path
+
+
+@pytest.mark.parametrize('block_size', [1, 16, 2**16])
+def test_same_as_dict_reader(dump, monkeypatch, block_size):
+    monkeypatch.setattr(ej_dump, 'BLOCK_SIZE', block_size)
+    scanner = DumpScanner(dump)
+    assert list(scanner.select(COLUMNS, INT_COLUMNS)) == expected(dump)
+    assert scanner.rows_read == 6     # пустая строка не считается
+
+
+def test_where(dump):
+    where = {'Stat_Short': ('OK',), 'Prob': ('A-DPQE', 'C-DPQE')}
+    rows = list(DumpScanner(dump).select(COLUMNS, INT_COLUMNS, where=where))
+    assert rows == expected(dump, where)
+    assert [r[0] for r in rows] == ['ed95070101', 'ed95070102', 'ed95070102']
+    # колонки нет в заголовке: подходят только пустые значения
+    assert list(DumpScanner(dump).select(('Prob',), where={'Group': ('702',)})) == []
+    assert len(list(DumpScanner(dump).select(('Prob',), where={'Group': ('',)}))) == 6
+
+
+def test_select_columns_by_blocks(dump):
+    columns = list(DumpScanner(dump).select_columns(('Prob',), ('Run_Id',)))
+    assert len(columns) == 1 and columns[0][1] == [1, 2, 3, 4, 5, 6]
+
+
+def test_to_int():
+    assert to_int(b'12') == 12 and to_int('7') == 7
+    assert to_int('') == 0 and to_int(None) == 0 and to_int('\xa0') == 0
+
+
+def test_supported(dump, tmp_path):
+    assert DumpScanner.supported(dump)
+    assert not DumpScanner.supported('-')
+    assert not DumpScanner.supported(tmp_path / 'dump.csv.gz')
+    empty = tmp_path / 'empty.csv'
+    empty.write_bytes(b'')
+    assert not DumpScanner.supported(empty) and not DumpScanner.supported(tmp_path / 'missing.csv')
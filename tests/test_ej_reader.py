@@ -0,0 +1,47 @@
+import bz2
+import gzip
+import lzma
+import pathlib
+import sys
+
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / 'ej_common'))
+from ej_reader import KIND_LOGINS, KIND_RUNS, is_compressed, open_table, read_table
+
+"""
+Чтение таблиц: разделитель и вид файла по заголовку, сжатые .gz, .bz2, .xz читаются потоком как обычные.
+"""
+
+RUNS = 'Run_Id;User_Login;Prob;Stat_Short\n1;ed95070101;A-DPQE;OK\n2;ed95070102;B-DPQE;WA\n'
+
+
+def test_is_compressed():
+    assert is_compressed('dump.csv.gz') and is_compressed('dump.csv.BZ2') and is_compressed('dump.xz')
+    assert not is_compressed('dump.csv') and not is_compressed('-')
+
+
+@pytest.mark.parametrize('suffix, opener', [('.gz', gzip.open), ('.bz2', bz2.open), ('.xz', lzma.open)])
+def test_compressed_runs(tmp_path, suffix, opener):
+    plain = tmp_path / 'dump.csv'
+    plain.write_text(RUNS, encoding='utf8')
+    packed = tmp_path / f'dump.csv{suffix}'
+    with opener(packed, 'wt', encoding='utf8') as fh:
+        fh.write(RUNS)
+    assert read_table(packed) == read_table(plain)
+    with open_table(packed) as table:
+        assert table.kind == KIND_RUNS
+        assert list(table.select(('User_Login',), where={'Stat_Short': ('OK',)})) == [('ed95070101',)]
+        assert table.rows_read == 2
+
+
+def test_kind_and_delimiter(tmp_path):
+    logins = tmp_path / 'logins.csv'
+    logins.write_text('Group,Login\n702,ed95070201\n', encoding='utf8')
+    with open_table(logins) as table:
+        assert (table.kind, table.delimiter) == (KIND_LOGINS, ',')
+    empty = tmp_path / 'empty.csv.gz'
+    with gzip.open(empty, 'wt', encoding='utf8'):
+        pass
+    assert read_table(empty) == []
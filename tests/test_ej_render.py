@@ -0,0 +1,118 @@
+import os
+import pathlib
+import sys
+
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / 'ej_plot_contest'))
+from ej_render import PlotCache, Renderer, plot_path, render_plot, spec_digest
+
+"""
+Renderer: графики одного вида рисуются на одном Figure, файл пишется целиком через временный файл,
+профиль fast с svg дает одинаковый файл для одинаковых данных.
+PlotCache: файл графика берется из кеша по хешу описания, вытесняются только записи кеша.
+"""
+
+
+def group_spec(tmp_path, ydata=(20, 12, 7), render=None):
+    spec = {
+        'kind': 'group',
+        'headers': ['students', 'A', 'B'],
+        'ydata': list(ydata),
+        'title': 'group 702',
+        'filename': str(tmp_path / 'group_702'),
+    }
+    if render is not None:
+        spec['render'] = render
+    return spec
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        Renderer('slow')
+
+
+def test_plot_path_from_render_settings(tmp_path):
+    assert plot_path(group_spec(tmp_path)) == tmp_path / 'group_702.png'
+    assert plot_path(group_spec(tmp_path, render={'profile': 'fast', 'fmt': 'svg'})) == tmp_path / 'group_702.svg'
+
+
+def test_figure_is_reused():
+    pytest.importorskip('matplotlib')
+    renderer = Renderer('fast')
+    fig, ax = renderer.figure('group')
+    ax.plot([1, 2], [3, 4])
+    assert renderer.figure('group') == (fig, ax)
+    assert not ax.lines     # оси очищены
+    assert renderer.figure('prob_pie')[0] is not fig
+    assert Renderer('fast', reuse=False).figure('group')[0] is not fig
+
+
+def test_render_svg_is_reproducible(tmp_path):
+    pytest.importorskip('matplotlib')
+    spec = group_spec(tmp_path, render={'profile': 'fast', 'fmt': 'svg'})
+    path = render_plot(spec)
+    assert path == tmp_path / 'group_702.svg'
+    first = path.read_bytes()
+    render_plot(group_spec(tmp_path, ydata=(20, 1, 1), render=spec['render']))
+    assert path.read_bytes() != first
+    render_plot(spec)
+    assert path.read_bytes() == first
+    assert [p.name for p in tmp_path.iterdir()] == ['group_702.svg']     # временных файлов не осталось
+
+
+def draw(spec, content=b'png'):
+    """
+    Файл графика без рисования: кешу важен только файл в plot_path(spec).
+    Как и Renderer, пишет новый файл и подменяет старый: старый может быть жесткой ссылкой на запись кеша
+    """
+    path = plot_path(spec)
+    tmp = path.with_name(path.name + '.new')
+    tmp.write_bytes(content)
+    os.replace(tmp, path)
+    return path
+
+
+def test_spec_digest_ignores_filename(tmp_path):
+    spec = group_spec(tmp_path)
+    assert spec_digest(spec) == spec_digest(dict(spec, filename=str(tmp_path / 'other' / 'group_705')))
+    assert spec_digest(spec) != spec_digest(group_spec(tmp_path, ydata=(20, 12, 8)))
+    assert spec_digest(spec) != spec_digest(group_spec(tmp_path, render={'fmt': 'svg'}))
+
+
+def test_plot_cache_fetch_and_store(tmp_path):
+    cache = PlotCache(tmp_path / 'cache')
+    spec = group_spec(tmp_path)
+    assert not cache.fetch(spec)
+    draw(spec)
+    cache.store(spec)
+    assert cache.entry_path(spec).read_bytes() == b'png'
+
+    # тот же график в другой директории берется из кеша
+    (tmp_path / 'site').mkdir()
+    other = dict(spec, filename=str(tmp_path / 'site' / 'group_702'))
+    assert cache.fetch(other)
+    assert plot_path(other).read_bytes() == b'png'
+    assert cache.fetch(spec)     # файл уже на месте
+    assert (cache.hits, cache.rendered) == (2, 1)
+    assert cache.summary() == '2 plots from cache, 1 rendered'
+    assert not list(tmp_path.rglob('*.tmp'))
+
+
+def test_plot_cache_evict(tmp_path):
+    cache = PlotCache(tmp_path / 'cache')
+    specs = [group_spec(tmp_path, ydata=(20, 12, i)) for i in range(3)]
+    for i, spec in enumerate(specs):
+        draw(spec, b'x' * 100)
+        cache.store(spec)
+        os.utime(cache.entry_path(spec), (i, i))     # specs[0] использовали раньше всех
+    stray = [cache.cache_dir / 'notes.txt', cache.cache_dir / (spec_digest(specs[0]) + '.png.123.tmp')]
+    for path in stray:
+        path.write_bytes(b'x' * 1000)
+
+    cache.max_size = 200
+    cache.evict()
+    assert not cache.entry_path(specs[0]).exists()
+    assert cache.entry_path(specs[1]).exists() and cache.entry_path(specs[2]).exists()
+    assert all(path.exists() for path in stray)
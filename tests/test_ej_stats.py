@@ -0,0 +1,51 @@
+import logging
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / 'ej_plot_contest'))
+from ej_stats import FilterStats, COUNTED, NOT_OK, OUT_OF_WINDOW, SKIPPED_INVISIBLE, UNKNOWN_GROUP
+
+"""
+FilterStats: счетчики посылок по причинам с разбивкой по группам и задачам и одна строка сводки в лог.
+"""
+
+
+def make_stats():
+    stats = FilterStats()
+    stats.add(COUNTED, '702', 'A-DPQE')
+    stats.add(COUNTED, '702', 'A-DPQE')
+    stats.add(COUNTED, '705', 'B-DPQE', 3)
+    stats.add(NOT_OK, '702', 'B-DPQE', 4)
+    stats.add(OUT_OF_WINDOW, '705', 'A-DPQE')
+    stats.add(UNKNOWN_GROUP, None, 'A-DPQE', 2)
+    return stats
+
+
+def test_counts():
+    stats = make_stats()
+    assert stats.count(COUNTED) == 5
+    assert stats.count(COUNTED, group='702') == 2
+    assert stats.count(COUNTED, prob='B-DPQE') == 3
+    assert stats.count(NOT_OK, '705') == 0
+    assert stats.by_group(COUNTED) == {'702': 2, '705': 3}
+    assert stats.by_prob(COUNTED) == {'A-DPQE': 2, 'B-DPQE': 3}
+    assert stats.totals() == {COUNTED: 5, SKIPPED_INVISIBLE: 0, UNKNOWN_GROUP: 2, NOT_OK: 4, OUT_OF_WINDOW: 1}
+
+
+def test_summary_is_one_log_line(caplog):
+    stats = make_stats()
+    stats.invisible_logins.add('ed95070299')
+    with caplog.at_level(logging.INFO):
+        stats.log_summary()
+    assert len(caplog.records) == 1
+    line = caplog.records[0].getMessage()
+    assert line.startswith('runs: counted=5, skipped_invisible=0, unknown_group=2, not_ok=4, out_of_window=1')
+    assert "out_of_window by group {'705': 1}" in line
+    assert "invisible users ['ed95070299']" in line
+
+
+def test_empty():
+    stats = FilterStats()
+    assert stats.totals() == dict.fromkeys(stats.totals(), 0)
+    assert stats.summary() == 'runs: counted=0, skipped_invisible=0, unknown_group=0, not_ok=0, out_of_window=0'
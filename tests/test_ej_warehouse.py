@@ -0,0 +1,115 @@
+import contextlib
+import pathlib
+import sqlite3
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / 'ej_plot_contest'))
+from ej_warehouse import Warehouse, contest_key
+
+"""
+Склад посылок: импорт run dump и списков логинов, свежесть импорта, агрегаты run_counts по окнам контеста.
+"""
+
+DUMP = """Run_Id;Time;User_Login;User_Name;User_Inv;Prob;Stat_Short
+1;100;ed95070201;Ivanov;;A-DPQE;OK
+2;150;ed95070201;Ivanov;;A-DPQE;WA
+3;200;ed95070201;Ivanov;;B-DPQE;OK
+4;120;ed95070202;Petrov;;A-DPQE;OK
+5;900;ed95070202;Petrov;;B-DPQE;OK
+6;130;ed95070299;Guest;I;A-DPQE;OK
+;;;;;;
+"""
+
+
+@contextlib.contextmanager
+def open_warehouse(tmp_path):
+    warehouse = Warehouse(tmp_path / 'runs.sqlite')
+    try:
+        yield warehouse
+    finally:
+        warehouse.close()
+
+
+def import_dump(warehouse, tmp_path, contest='DPQE_dec', text=DUMP):
+    dump = tmp_path / f'{contest}.csv'
+    dump.write_text(text, encoding='utf8')
+    return dump, warehouse.import_runs(contest, dump)
+
+
+def test_import_and_freshness(tmp_path):
+    with open_warehouse(tmp_path) as warehouse:
+        dump = tmp_path / 'DPQE_dec.csv'
+        dump.write_text(DUMP, encoding='utf8')
+        assert not warehouse.is_fresh('DPQE_dec', dump)
+        assert warehouse.import_runs('DPQE_dec', dump) == 6     # строка без Run_Id пропущена
+        assert warehouse.is_fresh('DPQE_dec', dump)
+        with open(dump, 'a', encoding='utf8') as fh:
+            fh.write('7;1000;ed95070202;Petrov;;C-DPQE;OK\n')
+        assert not warehouse.is_fresh('DPQE_dec', dump)
+        assert warehouse.import_runs('DPQE_dec', dump) == 7
+
+
+def test_users_and_first_times(tmp_path):
+    with open_warehouse(tmp_path) as warehouse:
+        import_dump(warehouse, tmp_path)
+        assert sorted(warehouse.users('DPQE_dec')) == [
+            ('ed95070201', 'Ivanov', None, 1), ('ed95070202', 'Petrov', None, 4), ('ed95070299', 'Guest', None, 6)]
+        # невидимые логины не задают начало контеста
+        assert warehouse.first_times('DPQE_dec') == {'ed95070201': 100, 'ed95070202': 120}
+        assert warehouse.first_times('DPQE_dec', 'WA') == {'ed95070201': 150}
+
+
+def test_run_counts(tmp_path):
+    with open_warehouse(tmp_path) as warehouse:
+        import_dump(warehouse, tmp_path)
+        import_dump(warehouse, tmp_path, 'FALT_dec', DUMP.replace('DPQE', 'FALT'))
+
+        counts = {row[:5]: row[5] for row in warehouse.run_counts('DPQE_dec')}
+        assert counts == {
+            ('ed95070201', 'A-DPQE', 0, 1, 1): 1,
+            ('ed95070201', 'A-DPQE', 0, 0, 1): 1,
+            ('ed95070201', 'B-DPQE', 0, 1, 1): 1,
+            ('ed95070202', 'A-DPQE', 0, 1, 1): 1,
+            ('ed95070202', 'B-DPQE', 0, 1, 1): 1,
+            ('ed95070299', 'A-DPQE', 1, 1, 1): 1,
+        }
+
+        # окно только у двух логинов, у остальных посылки вне окна
+        windows = {'ed95070201': (100, 160), 'ed95070202': (100, 1000)}
+        in_window = {row[:2] + row[3:4]: bool(row[4]) for row in warehouse.run_counts('DPQE_dec', 'OK', windows)}
+        assert in_window == {
+            ('ed95070201', 'A-DPQE', 1): True,
+            ('ed95070201', 'A-DPQE', 0): True,
+            ('ed95070201', 'B-DPQE', 1): False,
+            ('ed95070202', 'A-DPQE', 1): True,
+            ('ed95070202', 'B-DPQE', 1): True,
+            ('ed95070299', 'A-DPQE', 1): False,
+        }
+
+
+def test_login_list(tmp_path):
+    logins = tmp_path / 'logins.csv'
+    logins.write_text('Group;Login\n702;ed95070201\n705;ed95070202\n', encoding='utf8')
+    with open_warehouse(tmp_path) as warehouse:
+        assert not warehouse.is_fresh('DPQE_dec', logins, logins=True)
+        assert warehouse.import_logins('DPQE_dec', logins) == 2
+        assert warehouse.is_fresh('DPQE_dec', logins, logins=True)
+        assert warehouse.logins('DPQE_dec') == {'ed95070201': '702', 'ed95070202': '705'}
+        assert warehouse.logins('FALT_dec') == {}
+
+
+def test_old_indexes_are_dropped(tmp_path):
+    # база первой версии с индексом, который запросы не используют
+    with open_warehouse(tmp_path):
+        pass
+    with contextlib.closing(sqlite3.connect(str(tmp_path / 'runs.sqlite'))) as db:
+        db.execute('CREATE INDEX runs_time ON runs (time)')
+        db.commit()
+    with open_warehouse(tmp_path) as warehouse:
+        indexes = [name for name, in warehouse.db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")]
+        assert 'runs_time' not in indexes
+
+
+def test_contest_key():
+    assert contest_key('DPQE', 'dec') == 'DPQE_dec'